@@ -1,3 +1,4 @@
+import sys
 from neuron import h, units, coreneuron
 import matplotlib.pyplot as plt
 import numpy as np
@@ -9,6 +10,13 @@ import random
 from multiprocessing import Pool, cpu_count
 from SynapticaSims import Cell, NetParams, Network, Simulator
 
+sys.path.append("../")  # path to the src with the functions
+from src.SanjayCode import DEFAULT_LAYOUT, print_firing_rate, scatter_plot
+from src.SimRunner import TrialCache, parameter_hash
+
+# Trials shared by all experiments, keyed by the parameter hash of the trial
+trial_cache = TrialCache("../data/trial_cache")
+
 
 h.nrn_load_dll("../Models/Sanjay_model/x86_64/libnrnmech.so")
 
@@ -63,9 +71,9 @@ rng.Random123(global_seed, global_seed, global_seed)
 # h.cvode.cache_efficient(1)
 
 
-ALL_PYR = set(list(range(0, 800)))
-ALL_BWB = set(list(range(800, 1000)))
-ALL_OLM = set(list(range(1000, 1200)))
+ALL_PYR = DEFAULT_LAYOUT.gids("Pyr")
+ALL_BWB = DEFAULT_LAYOUT.gids("Bwb")
+ALL_OLM = DEFAULT_LAYOUT.gids("OLM")
 
 
 def init_network(**kwargs):
@@ -81,26 +89,29 @@ def init_network(**kwargs):
         "global": global_seed,
     }
 
+    # Population sizes and gid ranges, see PopulationLayout.scaled for scaled networks
+    layout = kwargs.get("layout", DEFAULT_LAYOUT)
+
     olm_to_pyr_weight = kwargs.get("olm_to_pyr_weight", 1.0)
     pyr_noise_scale = kwargs.get("pyr_noise_scale", 1.0)
 
     netParams.cellParams["Pyr"] = {
         "Cell": Cell.PyrAdr,
-        "nCells": 800,
+        "nCells": layout.size("Pyr"),
         "xrange": [0, 5],
         "yrange": [0, 5],
         "zrange": [0, 5],
     }
     netParams.cellParams["Bwb"] = {
         "Cell": Cell.Bwb,
-        "nCells": 200,
+        "nCells": layout.size("Bwb"),
         "xrange": [5, 7],
         "yrange": [5, 7],
         "zrange": [5, 7],
     }
     netParams.cellParams["OLM"] = {
         "Cell": Cell.Ow,
-        "nCells": 200,
+        "nCells": layout.size("OLM"),
         "xrange": [5, 7],
         "yrange": [5, 7],
         "zrange": [5, 7],
@@ -216,7 +227,7 @@ def init_network(**kwargs):
     # size = int(rate * (h.tstop/1000))
     netParams.stimParams["Pyr 1"] = {
         "source": "NetStim",
-        "targets": ALL_PYR,
+        "targets": layout.gids("Pyr"),
         "seed": 4000,
         "stim": {
             "interval": 1,
@@ -234,7 +245,7 @@ def init_network(**kwargs):
     }
     netParams.stimParams["Pyr 2"] = {
         "source": "NetStim",
-        "targets": ALL_PYR,
+        "targets": layout.gids("Pyr"),
         "seed": 4001,
         "stim": {
             "interval": 1,
@@ -252,7 +263,7 @@ def init_network(**kwargs):
     }
     netParams.stimParams["Pyr 3"] = {
         "source": "NetStim",
-        "targets": ALL_PYR,
+        "targets": layout.gids("Pyr"),
         "seed": 4002,
         "stim": {
             "interval": 1,
@@ -270,7 +281,7 @@ def init_network(**kwargs):
     }
     netParams.stimParams["Pyr 4"] = {
         "source": "NetStim",
-        "targets": ALL_PYR,
+        "targets": layout.gids("Pyr"),
         "seed": 4003,
         "stim": {
             "interval": 1,
@@ -288,7 +299,7 @@ def init_network(**kwargs):
     }
     netParams.stimParams["Pyr 5"] = {
         "source": "NetStim",
-        "targets": ALL_PYR,
+        "targets": layout.gids("Pyr"),
         "seed": 4004,
         "stim": {
             "interval": 100,
@@ -308,7 +319,7 @@ def init_network(**kwargs):
     # ===================== Noise to OLM ===================
     netParams.stimParams["OLM 1"] = {
         "source": "NetStim",
-        "targets": ALL_OLM,
+        "targets": layout.gids("OLM"),
         "seed": 4005,
         "stim": {
             "interval": 1,
@@ -326,7 +337,7 @@ def init_network(**kwargs):
     }
     netParams.stimParams["OLM 2"] = {
         "source": "NetStim",
-        "targets": ALL_OLM,
+        "targets": layout.gids("OLM"),
         "seed": 4006,
         "stim": {
             "interval": 1,
@@ -346,7 +357,7 @@ def init_network(**kwargs):
     # ===================== Noise to BWB ===================
     netParams.stimParams["Bwb 1"] = {
         "source": "NetStim",
-        "targets": ALL_BWB,
+        "targets": layout.gids("Bwb"),
         "seed": 4007,
         "stim": {
             "interval": 1,
@@ -364,7 +375,7 @@ def init_network(**kwargs):
     }
     netParams.stimParams["Bwb 2"] = {
         "source": "NetStim",
-        "targets": ALL_BWB,
+        "targets": layout.gids("Bwb"),
         "seed": 4008,
         "stim": {
             "interval": 1,
@@ -383,7 +394,7 @@ def init_network(**kwargs):
     # ===================== Noise from MS -> BWB & OLM ===================
     netParams.stimParams["OLM MS"] = {
         "source": "NetStim",
-        "targets": ALL_OLM,
+        "targets": layout.gids("OLM"),
         "seed": 4009,
         "stim": {
             "interval": 150,
@@ -401,7 +412,7 @@ def init_network(**kwargs):
     }
     netParams.stimParams["Bwb MS"] = {
         "source": "NetStim",
-        "targets": ALL_BWB,
+        "targets": layout.gids("Bwb"),
         "seed": 4010,
         "stim": {
             "interval": 150,
@@ -588,38 +599,6 @@ def plot_soma_volt(simData: dict):
             idx += 1
 
 
-def scatter_plot(simData: dict):
-    colors = {"Pyr": "blue", "Olm": "red", "Bwb": "green"}
-
-    plt.figure(figsize=(13, 8))
-    gids = {"Pyr": range(800), "Bwb": range(800, 1000), "Olm": range(1000, 1200)}
-    for k, color in colors.items():
-        xs = []
-        ys = []
-        for gid in gids[k]:
-            st = simData[gid].spike_times
-            xs.extend(st)
-            ys.extend(np.ones_like(st) + gid)
-        plt.scatter(xs, ys, color=color, marker=",", s=1, alpha=1.0)
-    plt.title("Pyr-blue | OLM-red | Bwb-green")
-
-
-def print_firing_rate(simData: dict):
-    pyr = []
-    bwb = []
-    olm = []
-    for gid, cell in simData.items():
-        if cell._gid < 800:
-            pyr.append(cell.compute_firing_rate())
-        elif 800 <= cell._gid < 1000:
-            bwb.append(cell.compute_firing_rate())
-        elif 1000 <= cell._gid < 1200:
-            olm.append(cell.compute_firing_rate())
-    print(f"Pyr :: {np.mean(pyr):.2f} Hz +- {np.std(pyr):.2f} Hz (std)")
-    print(f"Bwb :: {np.mean(bwb):.2f} Hz +- {np.std(bwb):.2f} Hz (std)")
-    print(f"Olm :: {np.mean(olm):.2f} Hz +- {np.std(olm):.2f} Hz (std)")
-
-
 def baseline():
     netParams = init_network(
         cell_seed=404, conn_seed=123, stim_seed=456, scale_conn_weight=1.0
@@ -696,6 +675,22 @@ def createRun(nps):
     )
     netParams.nps = nps
 
+    # The same simulation may already exist from another experiment
+    file_path = f"{data_path}/{trial:02}.pkl"
+    key = parameter_hash(
+        netParams,
+        {
+            "nmda_r": 1,
+            "iclamp": [("Pyr", "soma", 50e-3), ("OLM", "soma", -25e-3)],
+            "scaled": {},  # nacurrent.g *= 1
+            "noise_source": "netstim",
+            "early_stop": None,
+            "coreneuron": False,
+        },
+    )
+    if trial_cache.fetch(key, file_path, nps):
+        return
+
     net = Network.Network(
         netParams,
         rng=rng,
@@ -733,6 +728,7 @@ def createRun(nps):
     with open(f"{data_path}/{file_name}.pkl", "wb") as f:
         pickle.dump(out, f)
         print(f"Data saved to: {f.name}")
+    trial_cache.store(key, file_path)
 
     print_firing_rate(simData)
     scatter_plot(simData)
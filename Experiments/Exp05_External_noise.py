@@ -1,4 +1,5 @@
 import profile
+import sys
 from neuron import h, units, coreneuron
 import matplotlib.pyplot as plt
 import numpy as np
@@ -7,10 +8,71 @@ import os
 import pickle
 import time
 import random
+from functools import partial
 from multiprocessing import Pool, cpu_count
 from SynapticaSims import Cell, NetParams, Network, Simulator
 
-h.nrn_load_dll("../Models/Sanjay_model/x86_64/libnrnmech.so")
+sys.path.append("../")  # path to the src with the functions
+from src.SanjayCode import (
+    DEFAULT_LAYOUT,
+    NO_DPB,
+    PopulationLayout,
+    analyze_trial_depolarization,
+    calc_lfp,
+    compute_dpb_probability,
+    ensure_sidecar,
+    process_data,
+    write_sidecar,
+)
+from src.SimRunner import (
+    EarlyStopMonitor,
+    FAILED,
+    BulkNoise,
+    DISTRIBUTED_STREAMS,
+    DistributedNetwork,
+    BRANCHED_STREAMS,
+    NetworkRecorder,
+    WarmupCheckpoint,
+    check_branchable,
+    NOISE_STREAMS,
+    ReusableNetwork,
+    restart_noise,
+    SpikeRecorder,
+    TimedTask,
+    TrialCache,
+    benchmark_scaling,
+    scale_population,
+    time_setup,
+    verify_reuse,
+    adaptive_sweep,
+    benchmark_batch_throughput,
+    compare_backends,
+    configure_coreneuron,
+    format_variant,
+    print_backend_report,
+    batch_gid_offset,
+    run_batch,
+    init_worker,
+    load_spike_trial,
+    save_spike_trial,
+    parameter_hash,
+    scaled_factors,
+    sequential_trials,
+    spike_raster,
+    summarize_worker_timing,
+    transition_map,
+)
+
+# NEURON is initialized once per process by init_neuron (the initializer of the pools),
+# not at import
+MECHANISMS = "../Models/Sanjay_model/x86_64/libnrnmech.so"
+NEURON_SETTINGS = {
+    "celsius": 6.3,
+    "tstop": 5000,  # 5 seconds of simulation time
+    "dt": 0.1,  # time step of integration
+    "t": 0,  # t0
+    "steps_per_ms": 1 / 0.1,
+}
 
 """
 h("strdef simname, allfiles, simfiles, output_file, datestr, uname, osname, comment")
@@ -43,16 +105,19 @@ pc = h.ParallelContext()
 # if pc.nhost() == 1:
 #     pc.nthread(12)
 
-pc.set_maxstep(10 * units.ms)
 
-# Load std library
-# h.load_file('stdrun.hoc')
-h.celsius = 6.3
+def init_neuron(tstop=None):
+    """
+    Load the mechanisms and set the NEURON globals, once per process.
+
+    Used as the initializer of the pools, call it before running trials in this process.
+    """
+    settings = dict(NEURON_SETTINGS)
+    if tstop is not None:
+        settings["tstop"] = tstop
+    if init_worker(MECHANISMS, settings=settings):
+        pc.set_maxstep(10 * units.ms)
 
-h.tstop = 5000  # 2 seconds of simulation time
-h.dt = 0.1  # time step of integration
-h.t = 0  # t0
-h.steps_per_ms = 1 / h.dt
 
 global_seed = 422
 np.random.seed(global_seed)
@@ -64,9 +129,17 @@ rng.Random123(global_seed, global_seed, global_seed)
 # h.cvode.cache_efficient(1)
 
 
-ALL_PYR = set(list(range(0, 800)))
-ALL_BWB = set(list(range(800, 1000)))
-ALL_OLM = set(list(range(1000, 1200)))
+# Simulation backend, CoreNEURON runs on the CPU. Validate with check_coreneuron_equivalence
+# before switching a sweep. Can be overridden per condition with nps["coreneuron"].
+USE_CORENEURON = False
+
+# Trials shared by all experiments, keyed by the parameter hash of the trial (see trial_key)
+TRIAL_CACHE_DIR = "../data/trial_cache"
+trial_cache = TrialCache(TRIAL_CACHE_DIR)
+
+ALL_PYR = DEFAULT_LAYOUT.gids("Pyr")
+ALL_BWB = DEFAULT_LAYOUT.gids("Bwb")
+ALL_OLM = DEFAULT_LAYOUT.gids("OLM")
 
 
 def init_network(**kwargs):
@@ -82,26 +155,29 @@ def init_network(**kwargs):
         "global": global_seed,
     }
 
+    # Population sizes and gid ranges, see PopulationLayout.scaled for scaled networks
+    layout = kwargs.get("layout", DEFAULT_LAYOUT)
+
     olm_to_pyr_weight = kwargs.get("olm_to_pyr_weight", 1.0)
     pyr_noise_scale = kwargs.get("pyr_noise_scale", 1.0)
 
     netParams.cellParams["Pyr"] = {
         "Cell": Cell.PyrAdr,
-        "nCells": 800,
+        "nCells": layout.size("Pyr"),
         "xrange": [0, 5],
         "yrange": [0, 5],
         "zrange": [0, 5],
     }
     netParams.cellParams["Bwb"] = {
         "Cell": Cell.Bwb,
-        "nCells": 200,
+        "nCells": layout.size("Bwb"),
         "xrange": [5, 7],
         "yrange": [5, 7],
         "zrange": [5, 7],
     }
     netParams.cellParams["OLM"] = {
         "Cell": Cell.Ow,
-        "nCells": 200,
+        "nCells": layout.size("OLM"),
         "xrange": [5, 7],
         "yrange": [5, 7],
         "zrange": [5, 7],
@@ -115,7 +191,7 @@ def init_network(**kwargs):
     scale = kwargs.get("scale_conn_weight", 1.0)
     netParams.connParams["Pyr->Bwb NMDA"] = {
         "method": "many_to_one",
-        "count": 100,
+        "count": layout.scale_count(100, "Pyr"),
         "weight": scale * 1.15 * 1.2e-3,
         "synapse": "somaNMDA",
         "threshold": 0,
@@ -123,7 +199,7 @@ def init_network(**kwargs):
     }
     netParams.connParams["Pyr->OLM NMDA"] = {
         "method": "many_to_one",
-        "count": 10,
+        "count": layout.scale_count(10, "Pyr"),
         "weight": scale * 1.0 * 0.7e-3,
         "synapse": "somaNMDA",
         "threshold": 0,
@@ -131,7 +207,7 @@ def init_network(**kwargs):
     }
     netParams.connParams["Pyr->Pyr NMDA"] = {
         "method": "many_to_one",
-        "count": 25,
+        "count": layout.scale_count(25, "Pyr"),
         "weight": scale * 1.0 * 0.004e-3,
         "synapse": "BdendNMDA",
         "threshold": 0,
@@ -141,7 +217,7 @@ def init_network(**kwargs):
     # Pyr AMPA
     netParams.connParams["Pyr->Bwb AMPA"] = {
         "method": "many_to_one",
-        "count": 100,
+        "count": layout.scale_count(100, "Pyr"),
         "weight": scale * 0.3 * 1.2e-3,
         "synapse": "somaAMPAf",
         "threshold": 0,
@@ -149,7 +225,7 @@ def init_network(**kwargs):
     }
     netParams.connParams["Pyr->OLM AMPA"] = {
         "method": "many_to_one",
-        "count": 10,
+        "count": layout.scale_count(10, "Pyr"),
         "weight": scale * 0.3 * 1.2e-3,
         "synapse": "somaAMPAf",
         "threshold": 0,
@@ -157,7 +233,7 @@ def init_network(**kwargs):
     }
     netParams.connParams["Pyr->Pyr AMPA"] = {
         "method": "many_to_one",
-        "count": 25,
+        "count": layout.scale_count(25, "Pyr"),
         "weight": scale * 0.5 * 0.04e-3,
         "synapse": "BdendAMPA",
         "threshold": 0,
@@ -167,7 +243,7 @@ def init_network(**kwargs):
     # Basket GABA
     netParams.connParams["Bwb->Bwb GABA"] = {
         "method": "many_to_one",
-        "count": 60,
+        "count": layout.scale_count(60, "Bwb"),
         "weight": scale * 3 * 1.5 * 1.0e-3,
         "synapse": "somaGABAf",
         "threshold": 0,
@@ -175,7 +251,7 @@ def init_network(**kwargs):
     }
     netParams.connParams["Bwb->Pyr GABA"] = {
         "method": "many_to_one",
-        "count": 50,
+        "count": layout.scale_count(50, "Bwb"),
         "weight": scale * 2 * 2 * 0.18e-3,
         "synapse": "somaGABAf",
         "threshold": 0,
@@ -183,7 +259,7 @@ def init_network(**kwargs):
     }
     netParams.connParams["Bwb->OLM GABA"] = {
         "method": "many_to_one",
-        "count": 17,
+        "count": layout.scale_count(17, "Bwb"),
         "weight": scale * 0.05 * 2 * 2 * 0.18e-3,
         "synapse": "somaGABAf",
         "threshold": 0,
@@ -193,7 +269,7 @@ def init_network(**kwargs):
     # OLM GABA
     netParams.connParams["OLM->Pyr GABA"] = {
         "method": "many_to_one",
-        "count": 20,
+        "count": layout.scale_count(20, "OLM"),
         "weight": olm_to_pyr_weight * 4 * 3 * 6.0e-3,
         "synapse": "Adend2GABAs",
         "threshold": 0,
@@ -202,7 +278,7 @@ def init_network(**kwargs):
 
     netParams.connParams["OLM->Pyr GABA 2"] = {
         "method": "many_to_one",
-        "count": 10,
+        "count": layout.scale_count(10, "OLM"),
         "weight": olm_to_pyr_weight * 0.08 * 4 * 3 * 6.0e-3,
         "synapse": "Adend2GABAs",
         "threshold": 0,
@@ -216,7 +292,7 @@ def init_network(**kwargs):
     # size = int(rate * (h.tstop/1000))
     netParams.stimParams["Pyr 1"] = {
         "source": "NetStim",
-        "targets": ALL_PYR,
+        "targets": layout.gids("Pyr"),
         "seed": 4000,
         "stim": {
             "interval": 1,
@@ -234,7 +310,7 @@ def init_network(**kwargs):
     }
     netParams.stimParams["Pyr 2"] = {
         "source": "NetStim",
-        "targets": ALL_PYR,
+        "targets": layout.gids("Pyr"),
         "seed": 4001,
         "stim": {
             "interval": 1,
@@ -252,7 +328,7 @@ def init_network(**kwargs):
     }
     netParams.stimParams["Pyr 3"] = {
         "source": "NetStim",
-        "targets": ALL_PYR,
+        "targets": layout.gids("Pyr"),
         "seed": 4002,
         "stim": {
             "interval": 1,
@@ -270,7 +346,7 @@ def init_network(**kwargs):
     }
     netParams.stimParams["Pyr 4"] = {
         "source": "NetStim",
-        "targets": ALL_PYR,
+        "targets": layout.gids("Pyr"),
         "seed": 4003,
         "stim": {
             "interval": 1,
@@ -288,7 +364,7 @@ def init_network(**kwargs):
     }
     netParams.stimParams["Pyr 5"] = {
         "source": "NetStim",
-        "targets": ALL_PYR,
+        "targets": layout.gids("Pyr"),
         "seed": 4004,
         "stim": {
             "interval": 100,
@@ -308,7 +384,7 @@ def init_network(**kwargs):
     # ===================== Noise to OLM ===================
     netParams.stimParams["OLM 1"] = {
         "source": "NetStim",
-        "targets": ALL_OLM,
+        "targets": layout.gids("OLM"),
         "seed": 4005,
         "stim": {
             "interval": 1,
@@ -326,7 +402,7 @@ def init_network(**kwargs):
     }
     netParams.stimParams["OLM 2"] = {
         "source": "NetStim",
-        "targets": ALL_OLM,
+        "targets": layout.gids("OLM"),
         "seed": 4006,
         "stim": {
             "interval": 1,
@@ -346,7 +422,7 @@ def init_network(**kwargs):
     # ===================== Noise to BWB ===================
     netParams.stimParams["Bwb 1"] = {
         "source": "NetStim",
-        "targets": ALL_BWB,
+        "targets": layout.gids("Bwb"),
         "seed": 4007,
         "stim": {
             "interval": 1,
@@ -364,7 +440,7 @@ def init_network(**kwargs):
     }
     netParams.stimParams["Bwb 2"] = {
         "source": "NetStim",
-        "targets": ALL_BWB,
+        "targets": layout.gids("Bwb"),
         "seed": 4008,
         "stim": {
             "interval": 1,
@@ -383,7 +459,7 @@ def init_network(**kwargs):
     # ===================== Noise from MS -> BWB & OLM ===================
     netParams.stimParams["OLM MS"] = {
         "source": "NetStim",
-        "targets": ALL_OLM,
+        "targets": layout.gids("OLM"),
         "seed": 4009,
         "stim": {
             "interval": 150,
@@ -401,7 +477,7 @@ def init_network(**kwargs):
     }
     netParams.stimParams["Bwb MS"] = {
         "source": "NetStim",
-        "targets": ALL_BWB,
+        "targets": layout.gids("Bwb"),
         "seed": 4010,
         "stim": {
             "interval": 150,
@@ -421,6 +497,8 @@ def init_network(**kwargs):
 
 
 def make_spikes(net, po, syn, w, cellN, comp, ISI, eventN, noise, time_limit):
+    # Not used, the external noise comes from the stimParams (NetStims, or BulkNoise with
+    # nps["noise_source"] = "bulk")
     np.random.seed(1)
     events = np.random.exponential(ISI, (cellN, eventN)) * noise + np.repeat(
         ISI, cellN * eventN
@@ -588,11 +666,11 @@ def plot_soma_volt(simData: dict):
             idx += 1
 
 
-def scatter_plot(simData: dict):
+def scatter_plot(simData: dict, layout=DEFAULT_LAYOUT):
     colors = {"Pyr": "blue", "Olm": "red", "Bwb": "green"}
 
     plt.figure(figsize=(13, 8))
-    gids = {"Pyr": range(800), "Bwb": range(800, 1000), "Olm": range(1000, 1200)}
+    gids = {"Pyr": layout.range("Pyr"), "Bwb": layout.range("Bwb"), "Olm": layout.range("OLM")}
     for k, color in colors.items():
         xs = []
         ys = []
@@ -604,17 +682,11 @@ def scatter_plot(simData: dict):
     plt.title("Pyr-blue | OLM-red | Bwb-green")
 
 
-def print_firing_rate(simData: dict):
-    pyr = []
-    bwb = []
-    olm = []
-    for gid, cell in simData.items():
-        if cell._gid < 800:
-            pyr.append(cell.compute_firing_rate())
-        elif 800 <= cell._gid < 1000:
-            bwb.append(cell.compute_firing_rate())
-        elif 1000 <= cell._gid < 1200:
-            olm.append(cell.compute_firing_rate())
+def print_firing_rate(simData: dict, layout=DEFAULT_LAYOUT):
+    cells = layout.split(simData)
+    pyr = [cell.compute_firing_rate() for cell in cells["Pyr"]]
+    bwb = [cell.compute_firing_rate() for cell in cells["Bwb"]]
+    olm = [cell.compute_firing_rate() for cell in cells["OLM"]]
     print(f"Pyr :: {np.mean(pyr):.2f} Hz +- {np.std(pyr):.2f} Hz (std)")
     print(f"Bwb :: {np.mean(bwb):.2f} Hz +- {np.std(bwb):.2f} Hz (std)")
     print(f"Olm :: {np.mean(olm):.2f} Hz +- {np.std(olm):.2f} Hz (std)")
@@ -622,51 +694,67 @@ def print_firing_rate(simData: dict):
 
 def ensure_directory_exists(directory):
     if not os.path.exists(directory):
-        os.makedirs(directory)
+        os.makedirs(directory, exist_ok=True)  # Other MPI ranks may create it at the same time
 
 
-def createRun(nps_tuple):
-    # nps is actually a tuple in run_many_smarter()
-    # unpack tuple
-    nps, seed_tuple, trial = nps_tuple
-    cell_seed, conn_seed, stim_seed = seed_tuple
+# ms, the transient calc_psd discards, the longest warm-up run_branched may share
+PSD_TRANSIENT = 200
 
-    # mod = nps["cell_mod"]
-    # profile = nps["profile"]
-    data_path = nps["data_path"]
+# Conductances that are scaled per condition (see createRun and run_reused)
+SCALED_CONDUCTANCES = {"Pyr": [("nacurrent", "g"), ("kacurrent", "g")]}
 
-    # Construct expected file name
-    file_name = f"{trial:02}.pkl"  # Adjust formatting as needed
-    file_path = os.path.join(data_path, file_name)
 
-    # Check if the trial has already been completed
-    if os.path.exists(file_path):
-        print(f"Skipping trial {trial} as data already exists in: {file_path}")
-        return  # Skip this trial
+def condition_cell_mod(nps):
+    """Multiplicative factors of a condition per (population, mechanism, parameter)."""
+    return {
+        ("Pyr", "nacurrent", "g"): nps["cell_mod"]["gna"],  # Sodium
+        ("Pyr", "kacurrent", "g"): nps["cell_mod"]["gk"],  # Potassium
+    }
 
-    a = nps["olm_pyr_weight"]
-    b = nps["pyr_noise_scale"]
 
+def condition_netParams(nps, seed_tuple):
+    cell_seed, conn_seed, stim_seed = seed_tuple
     netParams = init_network(
         cell_seed=cell_seed,
         conn_seed=conn_seed,
         stim_seed=stim_seed,
-        olm_to_pyr_weight=a,
-        pyr_noise_scale=b,
+        olm_to_pyr_weight=nps["olm_pyr_weight"],
+        pyr_noise_scale=nps["pyr_noise_scale"],
+        layout=PopulationLayout.scaled(nps.get("scale", 1.0)),
     )
     netParams.nps = nps
+    return netParams
+
+
+def build_network(netParams, noise_gid_offset=None):
+    """
+    Create the network and add the condition independent modifications (NMDA, clamps).
+
+    noise_gid_offset is the first virtual gid of the BulkNoise (default above the cells).
+    """
+    stimParams = None
+    if getattr(netParams, "nps", {}).get("noise_source") == "bulk":
+        # The external noise is played by one PatternStim (BulkNoise), not one NetStim per cell
+        stimParams = netParams.stimParams
+        netParams.stimParams = {}
 
     net = Network.Network(
         netParams,
         rng=rng,
     ).create()
 
-    for gid, cell in net.populations["Pyr"].cells.items():  # Pyr cells only
-        for sect in cell.all:
-            for seg in sect:
-                seg.nacurrent.g *= nps["cell_mod"]["gna"]  # Sodium
-                seg.kacurrent.g *= nps["cell_mod"]["gk"]  # Potassium
+    if stimParams is not None:
+        netParams.stimParams = stimParams
+        net.bulk_noise = BulkNoise(
+            net, stimParams, netParams.seeds["stim"], h.tstop, gid_offset=noise_gid_offset
+        )
+
+    configure_network(net)
+    return net
 
+
+def configure_network(net):
+    """NMDA r = 1 and the current clamps, for a created Network or the local part of one."""
     for popname, pop in net.populations.items():
         for gid, cell in pop.cells.items():
             if popname == "OLM":
@@ -693,25 +781,534 @@ def createRun(nps_tuple):
     #         delay=2 * h.dt,  # inject at half total sim time = 0.5 * htstop
     #     )  # inject at half total sim time
 
-    sim = Simulator.Simulator(net, coreneuron=False, verbose=True)
 
-    simData = sim.run(return_pkl=False)
+def scale_conductances(net, nps):
+    # Pyr cells only, all segments in one call (see scale_conductances_per_segment)
+    scale_population(
+        net.populations["Pyr"].cells.values(),
+        {
+            ("nacurrent", "g"): nps["cell_mod"]["gna"],  # Sodium
+            ("kacurrent", "g"): nps["cell_mod"]["gk"],  # Potassium
+        },
+    )
+
+
+def build_trial_network(netParams, nps, noise_gid_offset=None):
+    """
+    Build the network of a trial as every run mode sees it: created, scaled to the condition
+    and with the NetStim streams restarted (restart_noise, as on a reused network), so a fresh
+    build gives the same trial as ReusableNetwork.apply_condition.
+    """
+    net = build_network(netParams, noise_gid_offset)
+    scale_conductances(net, nps)
+    restart_noise(net, netParams)
+    return net
+
+
+def scale_conductances_per_segment(net, nps):
+    # Previous version of scale_conductances, kept for benchmark_conductance_scaling
+    for gid, cell in net.populations["Pyr"].cells.items():  # Pyr cells only
+        for sect in cell.all:
+            for seg in sect:
+                seg.nacurrent.g *= nps["cell_mod"]["gna"]  # Sodium
+                seg.kacurrent.g *= nps["cell_mod"]["gk"]  # Potassium
+
+
+def benchmark_conductance_scaling(repeats=3):
+    """
+    Per-trial conductance scaling time, per-segment loop versus scale_population.
+
+    Also checks that both give identical conductances.
+    """
+    init_neuron()
+    nps = make_condition(1.2, 0.8, 1.0, "../data/Benchmarks", trials=1)
+    seed_tuple = make_seed_tuples(1)[0]
+    nets = {}
+
+    def setup(name, scale):
+        def prepare():
+            nets[name] = build_network(condition_netParams(nps, seed_tuple))
+            return lambda: scale(nets[name], nps)
+
+        return prepare
+
+    results = {}
+    for name, scale in [
+        ("per segment", scale_conductances_per_segment),
+        ("bulk", scale_conductances),
+    ]:
+        results[name] = time_setup(setup(name, scale), repeats)
+        print(f"{name:12s} :: {1e3 * np.mean(results[name]):.1f} ms per trial")
+
+    values = {
+        name: [
+            (seg.nacurrent.g, seg.kacurrent.g)
+            for cell in net.populations["Pyr"].cells.values()
+            for sect in cell.all
+            for seg in sect
+        ]
+        for name, net in nets.items()
+    }
+    print(f"Identical conductances: {values['per segment'] == values['bulk']}")
+    return results
+
+
+def simulate(net, nps):
+    """Run the simulation of a built network, returns simData and the trial metadata."""
+    # Optional early termination, e.g. nps["early_stop"] = {"criteria": ["dpb"]}
+    use_coreneuron = nps.get("coreneuron", USE_CORENEURON)
+    monitor = None
+    if nps.get("early_stop"):
+        if use_coreneuron:
+            raise ValueError("Early stop needs the NEURON backend (no python events in CoreNEURON)")
+        monitor = EarlyStopMonitor(net, nps["early_stop"])
+
+    configure_coreneuron(use_coreneuron)
+    sim = Simulator.Simulator(net, coreneuron=use_coreneuron, verbose=True)
+
+    try:
+        simData = sim.run(return_pkl=False)
+    finally:
+        if monitor is not None:
+            monitor.close()  # Must not stop the next runs of this process
+
+    if monitor is not None:
+        trial_meta = monitor.metadata(h.tstop)
+    else:
+        trial_meta = {"tstop": h.tstop, "t_end": h.tstop, "truncated": False}
+    return simData, trial_meta
+
+
+def simulate_spikes(net, nps):
+    """
+    Spike-only run, nps["output"] = "spikes".
+
+    All spikes are recorded with pc.spike_record into two vectors, no Simulator and no
+    per-cell recordings. Returns the (times, gids) arrays and the trial metadata.
+    """
+    if nps.get("coreneuron", USE_CORENEURON):
+        raise ValueError("The spike-only output runs on the NEURON backend")
+    monitor = None
+    if nps.get("early_stop"):
+        monitor = EarlyStopMonitor(net, nps["early_stop"])
+
+    recorder = SpikeRecorder(net, pc=pc)
+    try:
+        h.finitialize(h.v_init)
+        h.continuerun(h.tstop)
+    finally:
+        if monitor is not None:
+            monitor.close()  # Must not stop the next runs of this process
+    times, gids = recorder.arrays()
+    recorder.clear()
+
+    if monitor is not None:
+        trial_meta = monitor.metadata(h.tstop)
+    else:
+        trial_meta = {"tstop": h.tstop, "t_end": h.tstop, "truncated": False}
+    return (times, gids), trial_meta
+
+
+def trial_file(nps, trial):
+    """Path of the data file of a trial, .npz for spike-only output, .pkl otherwise."""
+    extension = "npz" if nps.get("output") == "spikes" else "pkl"
+    return os.path.join(nps["data_path"], f"{trial:02}.{extension}")  # 1-> 01
+
+
+# trial_meta["format"] of trials whose simData holds RecordedCells instead of the cells of the
+# Simulator (batched runs)
+RECORDED_FORMAT = "recorded"
+
+
+def mode_nps(nps, mode):
+    """
+    nps of a condition with the data folder of a run mode, <sweep>_<mode>/<condition>, so the
+    trials of the run mode are not mixed with the createRun trials of the condition.
+    """
+    data_path = os.path.normpath(nps["data_path"])
+    path = os.path.join(f"{os.path.dirname(data_path)}_{mode}", os.path.basename(data_path))
+    ensure_directory_exists(path)
+    return dict(nps, data_path=path)
+
+
+def noise_meta(trial_meta, nps):
+    """trial_meta with the noise_streams tag of the trials whose NetStim streams are restarted."""
+    if nps.get("noise_source", "netstim") == "bulk" or "noise_streams" in trial_meta:
+        return trial_meta  # BulkNoise and DistributedNetwork have their own streams
+    return dict(trial_meta, noise_streams=NOISE_STREAMS)
+
+
+def save_spikes(netParams, spikes, trial_meta, nps, trial):
+    times, gids = spikes
+    meta = {
+        "trial_meta": noise_meta(trial_meta, nps),
+        "population_sizes": PopulationLayout.from_netParams(netParams).sizes,
+        "nps": nps,
+    }
+    save_spike_trial(trial_file(nps, trial), times, gids, meta)
+    print(f"Data saved to: {trial_file(nps, trial)}")
+
+
+def save_trial(netParams, simData, trial_meta, nps, trial, lfp=None):
+    if nps.get("output") == "spikes":
+        # Run modes that record simData (reuse, batching, MPI) with spike-only output
+        gids, times = spike_raster(simData)
+        save_spikes(netParams, (times, gids), trial_meta, nps, trial)
+        return
 
     # Saving data of run
     netParams.nps = nps
-    out = {"netParams": netParams, "simData": simData}
+    out = {
+        "netParams": netParams,
+        "simData": simData,
+        "trial_meta": noise_meta(trial_meta, nps),
+    }
+    if lfp is not None:
+        out["lfp"] = lfp  # MPI runs, the dendritic traces are not gathered
     file_name = f"{trial:02}"  # 1-> 01
 
-    with open(f"{data_path}/{file_name}.pkl", "wb") as f:
+    with open(f"{nps['data_path']}/{file_name}.pkl", "wb") as f:
         pickle.dump(out, f)
         print(f"Data saved to: {f.name}")
 
+    # Spectral sidecar (PSD, theta/gamma power and peaks), read by the spectral analyses
+    if lfp is None:
+        layout = PopulationLayout.from_netParams(netParams)
+        lfp = calc_lfp(layout.split(simData)["Pyr"])
+    write_sidecar(f.name, lfp)
+
+
+def trial_key(netParams, nps):
+    """Parameter hash of a trial: the netParams plus what build_network and createRun change."""
+    modifications = {
+        "nmda_r": 1,
+        "iclamp": [("Pyr", "soma", 50e-3), ("OLM", "soma", -25e-3)],
+        "scaled": scaled_factors(
+            {
+                "Pyr.nacurrent.g": nps["cell_mod"]["gna"],
+                "Pyr.kacurrent.g": nps["cell_mod"]["gk"],
+            }
+        ),
+        "noise_source": nps.get("noise_source", "netstim"),
+        "noise_streams": NOISE_STREAMS,  # Trials of the build streams are not served
+        "early_stop": nps.get("early_stop"),
+        "coreneuron": nps.get("coreneuron", USE_CORENEURON),
+    }
+    return parameter_hash(netParams, modifications)
+
+
+def trial_exists(nps, trial):
+    # Construct expected file name
+    file_path = trial_file(nps, trial)
+
+    # Check if the trial has already been completed
+    if os.path.exists(file_path):
+        print(f"Skipping trial {trial} as data already exists in: {file_path}")
+        return True
+    return False
+
+
+def createRun(nps_tuple):
+    # nps is actually a tuple in run_many_smarter()
+    # unpack tuple
+    nps, seed_tuple, trial = nps_tuple
+
+    if trial_exists(nps, trial):
+        return  # Skip this trial
+
+    netParams = condition_netParams(nps, seed_tuple)
+
+    # The same simulation may already exist from another condition or experiment
+    key = trial_key(netParams, nps)
+    if trial_cache.fetch(key, trial_file(nps, trial), nps):
+        if nps.get("output") != "spikes":
+            ensure_sidecar(trial_file(nps, trial))  # The cache holds only the trial file
+        return
+
+    net = build_trial_network(netParams, nps)
+
+    if nps.get("output") == "spikes":
+        # Fast path for sweeps that only analyse spikes (DPB, bursts)
+        spikes, trial_meta = simulate_spikes(net, nps)
+        save_spikes(netParams, spikes, trial_meta, nps, trial)
+    else:
+        simData, trial_meta = simulate(net, nps)
+        save_trial(netParams, simData, trial_meta, nps, trial)
+    trial_cache.store(key, trial_file(nps, trial))
+
     # print_firing_rate(simData)
     # scatter_plot(simData)
     # print("simulation done")
     return
 
 
+def run_batched(nps_seed_trials):
+    """
+    Run a list of (nps, seeds, trial) tuples as one batch of networks in this process.
+
+    All networks are simulated together by run_batch, every network in its own gid range
+    (batch_gid_offset, also for the virtual gids of the BulkNoise). The trials hold RecordedCells
+    (trial_meta["format"] = RECORDED_FORMAT) and are written to <sweep>_batched/<condition>
+    (mode_nps). The networks share one run, so early stopping cannot be batched, and all
+    conditions of a batch have to use the same backend.
+    """
+    if any(nps.get("early_stop") for nps, _, _ in nps_seed_trials):
+        raise ValueError("Batched runs do not support early_stop, the networks share one run")
+    backends = {bool(nps.get("coreneuron", USE_CORENEURON)) for nps, _, _ in nps_seed_trials}
+    if len(backends) > 1:
+        raise ValueError("All trials of a batch have to use the same backend")
+
+    todo = []
+    for nps, seed_tuple, trial in nps_seed_trials:
+        nps = mode_nps(nps, "batched")
+        if not trial_exists(nps, trial):
+            todo.append((nps, seed_tuple, trial))
+    if not todo:
+        return
+
+    networks = []
+    all_netParams = []
+    for k, (nps, seed_tuple, trial) in enumerate(todo):
+        netParams = condition_netParams(nps, seed_tuple)
+        n_cells = PopulationLayout.from_netParams(netParams).n_cells
+        networks.append(
+            build_trial_network(netParams, nps, noise_gid_offset=batch_gid_offset(k) + n_cells)
+        )
+        all_netParams.append(netParams)
+
+    simDatas = run_batch(networks, h.tstop, v_init=-65, coreneuron=backends.pop())
+
+    for (nps, seed_tuple, trial), netParams, simData in zip(
+        todo, all_netParams, simDatas
+    ):
+        trial_meta = {
+            "tstop": h.tstop,
+            "t_end": h.tstop,
+            "truncated": False,
+            "batch_size": len(todo),
+            "format": RECORDED_FORMAT,
+        }
+        save_trial(netParams, simData, trial_meta, nps, trial)
+
+
+def run_distributed(nps_seed_trials):
+    """
+    Run the trials one after another, every trial distributed over all MPI ranks.
+
+    Start with e.g. `mpirun -n 4 python Exp05_External_noise.py`. Every rank creates only its
+    own cells (DistributedNetwork) and rank 0 gathers the spikes and the LFP and writes the
+    trial file. The connectivity and the noise are drawn per gid (DISTRIBUTED_STREAMS), the
+    trial does not depend on the number of ranks but is not the realization of a serial build,
+    so the trials are marked (RECORDED_FORMAT, DISTRIBUTED_STREAMS) and written to
+    <sweep>_distributed/<condition>.
+    """
+    init_neuron()
+    rank = int(pc.id())
+    for nps, seed_tuple, trial in nps_seed_trials:
+        if nps.get("noise_source") == "bulk":
+            raise ValueError("run_distributed creates one NetStim per cell, not the BulkNoise")
+        nps = mode_nps(nps, "distributed")
+        # Rank 0 decides, so all ranks skip the same trials
+        if pc.py_broadcast(trial_exists(nps, trial) if rank == 0 else None, 0):
+            continue
+
+        netParams = condition_netParams(nps, seed_tuple)
+        distributed = DistributedNetwork(netParams, pc=pc)
+        configure_network(distributed.net)
+        scale_conductances(distributed.net, nps)
+
+        simData, lfp = distributed.run(h.tstop, v_init=-65)
+        distributed.clear()
+
+        if rank == 0:
+            trial_meta = {
+                "tstop": h.tstop,
+                "t_end": h.tstop,
+                "truncated": False,
+                "nhost": int(pc.nhost()),
+                "format": RECORDED_FORMAT,
+                "noise_streams": DISTRIBUTED_STREAMS,
+            }
+            save_trial(netParams, simData, trial_meta, nps, trial, lfp=lfp)
+
+
+def benchmark_batching(Ks=(1, 2, 4, 8), tstop=1000):
+    """Throughput per core of run_batch for increasing batch sizes K (baseline condition)."""
+    init_neuron()
+    nps = make_condition(1.0, 1.0, 1.0, "../data/Benchmarks", trials=max(Ks))
+    seeds = make_seed_tuples(max(Ks))
+
+    def run_k(K):
+        networks = []
+        for seed_tuple in seeds[:K]:
+            networks.append(build_trial_network(condition_netParams(nps, seed_tuple), nps))
+        run_batch(networks, tstop, v_init=-65)
+
+    return benchmark_batch_throughput(run_k, Ks)
+
+
+def backend_trial(use_coreneuron, nps, trial=0):
+    """Build one trial of a condition and simulate it with the chosen backend, returns simData."""
+    seed_tuple = make_seed_tuples(trial + 1)[trial]
+    netParams = condition_netParams(nps, seed_tuple)
+    net = build_trial_network(netParams, nps)
+    simData, _ = simulate(net, dict(nps, coreneuron=use_coreneuron, early_stop=None))
+    return simData
+
+
+def check_coreneuron_equivalence(nps, trial=0):
+    """
+    Run one trial of a condition with NEURON and CoreNEURON (same seeds) and print the
+    comparison of the spike rasters, the LFP and the wall-clock times.
+
+    Every backend builds and runs the trial in its own worker process.
+    """
+    init_neuron()
+
+    def lfp_from_simData(simData):
+        return calc_lfp(PopulationLayout.scaled(nps.get("scale", 1.0)).split(simData)["Pyr"])
+
+    report = compare_backends(
+        partial(backend_trial, nps=nps, trial=trial),
+        lfp_from_simData,
+        initializer=init_neuron,
+    )
+    print_backend_report(report)
+    return report
+
+
+def run_reused(seed_group):
+    """
+    Run all conditions of one seed tuple on a single network build.
+
+    seed_group is (seed_tuple, trial, [nps, ...]). The network is created once with the first
+    condition and switched to every next condition with ReusableNetwork.apply_condition.
+    simulate and simulate_spikes close the early stop monitor of a condition after its run,
+    so it cannot stop the runs of the next conditions. The NetStim streams are restarted for
+    every condition (ReusableNetwork.apply_condition) as in createRun (build_trial_network), so
+    every trial is bit-identical to the createRun trial (see verify_reused_network).
+    """
+    seed_tuple, trial, nps_list = seed_group
+    nps_list = [nps for nps in nps_list if not trial_exists(nps, trial)]
+    if not nps_list:
+        return
+
+    netParams = condition_netParams(nps_list[0], seed_tuple)
+    net = build_network(netParams)
+    reusable = ReusableNetwork(net, netParams, SCALED_CONDUCTANCES)
+
+    for nps in nps_list:
+        netParams = condition_netParams(nps, seed_tuple)
+        reusable.apply_condition(netParams, condition_cell_mod(nps))
+        if nps.get("output") == "spikes":
+            spikes, trial_meta = simulate_spikes(net, nps)
+            save_spikes(netParams, spikes, trial_meta, nps, trial)
+            continue
+        simData, trial_meta = simulate(net, nps)
+        save_trial(netParams, simData, trial_meta, nps, trial)
+
+
+def run_branched(seed_group, t_warmup=200):
+    """
+    Run all conditions of one seed tuple as branches of one shared warm-up.
+
+    seed_group is (seed_tuple, trial, [nps, ...]) as for run_reused. The warm-up (t_warmup ms,
+    at most the transient calc_psd discards) is simulated once with the first condition and
+    saved. Every condition restores it, applies its conductances and weights (which restarts
+    the NetStim streams) and runs until tstop. The conditions may only differ in
+    BRANCHABLE_PARAMETERS.
+
+    The warm-up is not simulated with the parameters of the condition, so the branched trials
+    start at t_warmup: the warm-up spikes are not saved (RecordedCell.t_start), the trials are
+    tagged (RECORDED_FORMAT, BRANCHED_STREAMS, branched_at) and written to
+    <sweep>_branched/<condition>, apart from the createRun trials.
+    """
+    if t_warmup > PSD_TRANSIENT:
+        raise ValueError(
+            f"t_warmup {t_warmup} ms is longer than the {PSD_TRANSIENT} ms calc_psd discards, "
+            "the LFP would contain the warm-up of another condition"
+        )
+    seed_tuple, trial, nps_list = seed_group
+    nps_list = [mode_nps(nps, "branched") for nps in nps_list]
+    nps_list = [nps for nps in nps_list if not trial_exists(nps, trial)]
+    if not nps_list:
+        return
+    for nps in nps_list[1:]:
+        check_branchable(nps_list[0], nps)
+    if nps_list[0].get("early_stop"):
+        raise ValueError("Early stop cannot be combined with branched runs")
+
+    netParams = condition_netParams(nps_list[0], seed_tuple)
+    net = build_network(netParams)
+    reusable = ReusableNetwork(net, netParams, SCALED_CONDUCTANCES)
+    reusable.apply_condition(netParams, condition_cell_mod(nps_list[0]))
+
+    recorder = NetworkRecorder(net)
+    checkpoint = WarmupCheckpoint(t_warmup, recorder)
+    checkpoint.run_warmup(v_init=-65)
+
+    for nps in nps_list:
+        checkpoint.branch()
+        netParams = condition_netParams(nps, seed_tuple)
+        reusable.apply_condition(netParams, condition_cell_mod(nps))  # Restarts the streams
+        h.continuerun(h.tstop)
+
+        trial_meta = {
+            "tstop": h.tstop,
+            "t_end": h.tstop,
+            "truncated": False,
+            "format": RECORDED_FORMAT,
+            "noise_streams": BRANCHED_STREAMS,
+            "branched_at": t_warmup,  # The condition and the saved spikes start here
+            "warmup_profile": nps_list[0]["profile"],
+        }
+        save_trial(netParams, checkpoint.collect(h.tstop), trial_meta, nps, trial)
+
+
+def group_by_seeds(all_nps_seed_trials, max_conditions=100):
+    """
+    Group the (nps, seeds, trial) tuples of a sweep per seed tuple.
+
+    Groups are split in chunks of max_conditions, so that there are enough groups to keep
+    all processes of the pool busy.
+    """
+    groups = {}
+    for nps, seed_tuple, trial in all_nps_seed_trials:
+        key = (tuple(int(seed) for seed in seed_tuple), trial)
+        groups.setdefault(key, []).append(nps)
+    return [
+        (seeds, trial, nps_list[i : i + max_conditions])
+        for (seeds, trial), nps_list in groups.items()
+        for i in range(0, len(nps_list), max_conditions)
+    ]
+
+
+def verify_reused_network(nps_a, nps_b, trial=0):
+    """
+    Compare the spikes of condition nps_b on a network reused from nps_a with the createRun
+    trial of nps_b (the same build and simulation as createRun, without writing a file).
+    """
+    init_neuron()
+    seed_tuple = make_seed_tuples(trial + 1)[trial]
+
+    netParams = condition_netParams(nps_b, seed_tuple)
+    net = build_trial_network(netParams, nps_b)
+    simData_fresh, _ = simulate(net, nps_b)
+    del net
+
+    netParams = condition_netParams(nps_a, seed_tuple)
+    net = build_network(netParams)
+    reusable = ReusableNetwork(net, netParams, SCALED_CONDUCTANCES)
+    reusable.apply_condition(netParams, condition_cell_mod(nps_a))
+    simulate(net, nps_a)
+    reusable.apply_condition(
+        condition_netParams(nps_b, seed_tuple), condition_cell_mod(nps_b)
+    )
+    simData_reused, _ = simulate(net, nps_b)
+
+    return verify_reuse(simData_fresh, simData_reused)
+
+
 # def run_many(variant: str, pyr_noise_factor: float):
 def run_many(gna: float, gk: float, pyr_noise_factor: float):
     # sodium = variant
@@ -759,7 +1356,7 @@ def run_many(gna: float, gk: float, pyr_noise_factor: float):
 
     # # For many models, few runs (less reproducible results, more noise)
     n_processes = 60  # min(12, cpu_count())
-    with Pool(processes=n_processes) as pool:
+    with Pool(processes=n_processes, initializer=init_neuron) as pool:
         pool.map(createRun, nps_seeds_trials)
 
     # For a single model, many runs
@@ -767,9 +1364,134 @@ def run_many(gna: float, gk: float, pyr_noise_factor: float):
     #     createRun(nps_tuple)
 
 
-def run_many_smarter():
-    base_data_path = "/mnt/internserver1_1tb/Data/MarcData/Data14_Current_Burst"  # If running from internserver2, will write to internserver1 ssd
+def benchmark_worker_startup(n_processes=4, n_tasks=8, tstop=1000):
+    """
+    Startup cost of a worker (init_neuron) versus the time per task (createRun).
+
+    Runs n_tasks trials of the baseline condition with tstop ms in a fresh pool.
+    """
+    nps = make_condition(1.0, 1.0, 1.0, "../data/Benchmarks/Startup", trials=n_tasks)
+    nps_seed_trials = make_nps_seeds_trials(nps)
+    for trial in range(n_tasks):
+        file_path = os.path.join(nps["data_path"], f"{trial:02}.pkl")
+        if os.path.exists(file_path):
+            os.remove(file_path)  # Every task has to run
+
+    with Pool(processes=n_processes, initializer=init_neuron, initargs=(tstop,)) as pool:
+        results = pool.map(TimedTask(createRun), nps_seed_trials)
+    return summarize_worker_timing([record for _, record in results])
+
+
+def scaling_trial(scale, tstop=1000):
+    """Build, simulate and analyse one baseline trial of a network of the given scale."""
+    nps = make_condition(
+        1.0, 1.0, 1.0, "../data/Benchmarks/Scaling", trials=1, scale=scale
+    )
+    seed_tuple = make_seed_tuples(1)[0]
+
+    t0 = time.time()
+    netParams = condition_netParams(nps, seed_tuple)
+    net = build_trial_network(netParams, nps)
+    build_time = time.time() - t0
+
+    t0 = time.time()
+    simData, _ = simulate(net, dict(nps, early_stop=None))
+    sim_time = time.time() - t0
+
+    t0 = time.time()
+    layout = PopulationLayout.from_netParams(netParams)
+    process_data(simData, tstop, layout=layout)
+    analyze_trial_depolarization(
+        {"netParams": netParams, "simData": simData}, total_duration=int(tstop)
+    )
+    analysis_time = time.time() - t0
+
+    return {
+        "n_cells": layout.n_cells,
+        "build_time": build_time,
+        "sim_time": sim_time,
+        "analysis_time": analysis_time,
+    }
+
+
+def benchmark_network_scaling(scales=(0.25, 1, 4), tstop=1000):
+    """Simulation time, memory and analysis time against the cell count (see scaling_trial)."""
+    return benchmark_scaling(
+        partial(scaling_trial, tstop=tstop),
+        scales,
+        initializer=init_neuron,
+        initargs=(tstop,),
+    )
+
+
+def make_seed_tuples(n_runs):
+    """Seeds per trial, identical for every condition (trial e -> same network and stimulus)."""
+    seed_gen = np.random.default_rng(global_seed)
+    seeds = []
+    for e in range(n_runs):
+        cell_seed = 404
+        conn_seed = seed_gen.integers(0, 1_000_000, dtype=np.int32)
+        stim_seed = seed_gen.integers(0, 1_000_000, dtype=np.int32)
+        seeds.append((cell_seed, conn_seed, stim_seed))
+    return seeds
+
+
+def make_condition(
+    gna,
+    gk,
+    noise_factor,
+    base_data_path,
+    trials=15,
+    early_stop=None,
+    scale=1.0,
+    output="full",
+    noise_source="netstim",
+):
+    """
+    Create the nps of a single (gna, gk, noise) condition and its data folder.
+
+    scale sets the size of the network relative to 800 Pyr / 200 Bwb / 200 OLM cells.
+    output is "full" (simData pickle) or "spikes" (only the spikes, as .npz).
+    noise_source is "netstim" (one NetStim per cell and stimulus) or "bulk" (BulkNoise).
+    """
+    olm_pyr_weight = 0.1  # fig. 7 Sanjay, reduced olm to pyr connections, 15x external input
+    pyr_noise_scale = (
+        20 * noise_factor
+    )  # fig. 7 increased pyr noise (we set it at 20), excitatory input. scale * noise factor
+
+    variant = format_variant(gna, gk, noise_factor)
+    if scale != 1.0:
+        variant = f"{variant}_x{scale:g}"  # Scaled networks get their own folder
 
+    data_path = os.path.join(base_data_path, variant)  # Include the variant in the path
+
+    # Ensure the directory for this variant exists
+    ensure_directory_exists(data_path)
+
+    nps = {}
+    nps["olm_pyr_weight"] = olm_pyr_weight
+    nps["pyr_noise_scale"] = pyr_noise_scale
+    nps["cell_mod"] = {"gna": gna, "gk": gk}
+    nps["data_path"] = data_path
+    nps["trials"] = trials
+    nps["profile"] = variant
+    nps["start_seed"] = global_seed
+    nps["early_stop"] = early_stop
+    nps["scale"] = scale
+    nps["output"] = output
+    nps["noise_source"] = noise_source
+    return nps
+
+
+def make_nps_seeds_trials(nps):
+    """Combine the parameters, seeds and epochs into tuples. This is the input for the parallel pool."""
+    seeds = make_seed_tuples(nps["trials"])
+    epochs = list(range(nps["trials"]))
+    return list(zip([dict(nps) for _ in range(len(seeds))], seeds, epochs))
+
+
+def make_sweep(base_data_path):
+    """All (nps, seeds, trial) tuples of the gna x gk x noise sweep."""
     pyr_noise_factors = np.array(
         [0.65, 0.70, 0.75, 0.80, 0.85, 0.90, 0.95, 1.00, 1.10, 1.20, 1.30]
     )
@@ -778,54 +1500,218 @@ def run_many_smarter():
     for gk in np.arange(0.50, 1.60, 0.1):  # Potassium conductance range (11x)
         for gna in np.arange(0.50, 1.60, 0.1):  # Sodium conductance range (11x)
             for noise_factor in pyr_noise_factors:
-                olm_pyr_weight = 0.1  # fig. 7 Sanjay, reduced olm to pyr connections, 15x external input
-                pyr_noise_scale = (
-                    20 * noise_factor
-                )  # fig. 7 increased pyr noise (we set it at 20), excitatory input. scale * noise factor
-
-                variant = f"gna_{gna:.2f}_gk_{gk:.2f}_noise_{noise_factor:.2f}"
-
-                data_path = os.path.join(
-                    base_data_path, variant
-                )  # Include the variant in the path
-
-                # Ensure the directory for this variant exists
-                ensure_directory_exists(data_path)
-
-                nps = {}
-                nps["olm_pyr_weight"] = olm_pyr_weight
-                nps["pyr_noise_scale"] = pyr_noise_scale
-                nps["cell_mod"] = {"gna": gna, "gk": gk}
-                nps["data_path"] = data_path
-                nps["trials"] = 15
-                nps["profile"] = variant
-                nps["start_seed"] = global_seed
-
-                n_runs = nps["trials"]
-                trials = list(range(0, n_runs))
-
-                # Generate seeds and epochs for trials
-                seed_gen = np.random.default_rng(global_seed)
-                seeds = []
-                epochs = []
-
-                # Combine the parameters, seeds and epochs into a tuple. This is the input for the parallel pool.
-                for e in range(n_runs):
-                    cell_seed = 404
-                    conn_seed = seed_gen.integers(0, 1_000_000, dtype=np.int32)
-                    stim_seed = seed_gen.integers(0, 1_000_000, dtype=np.int32)
-                    seeds.append((cell_seed, conn_seed, stim_seed))
-                    epochs.append(e)
-
-                nps_seeds_trials = list(
-                    zip([dict(nps) for _ in range(len(seeds))], seeds, epochs)
-                )
-                all_nps_seed_trials.extend(nps_seeds_trials)
+                nps = make_condition(gna, gk, noise_factor, base_data_path, trials=15)
+                all_nps_seed_trials.extend(make_nps_seeds_trials(nps))
+    return all_nps_seed_trials
+
+
+def run_many_smarter(reuse_networks=False, batch_size=1, branch_warmup=None):
+    base_data_path = "/mnt/internserver1_1tb/Data/MarcData/Data14_Current_Burst"  # If running from internserver2, will write to internserver1 ssd
+
+    all_nps_seed_trials = make_sweep(base_data_path)
 
     # Run the sim in parallel
     n_processes = 60  # min(12, cpu_count())
-    with Pool(processes=n_processes) as pool:
-        pool.map(createRun, all_nps_seed_trials)
+    with Pool(processes=n_processes, initializer=init_neuron) as pool:
+        if branch_warmup is not None:
+            # One shared warm-up of branch_warmup ms per seed tuple, the conditions branch off it
+            pool.map(
+                partial(run_branched, t_warmup=branch_warmup),
+                group_by_seeds(all_nps_seed_trials),
+            )
+        elif reuse_networks:
+            # One network build per seed tuple, the conditions run on the same network
+            pool.map(run_reused, group_by_seeds(all_nps_seed_trials))
+        elif batch_size > 1:
+            # batch_size networks per task, simulated together in one NEURON instance
+            batches = [
+                all_nps_seed_trials[i : i + batch_size]
+                for i in range(0, len(all_nps_seed_trials), batch_size)
+            ]
+            pool.map(run_batched, batches)
+        else:
+            pool.map(createRun, all_nps_seed_trials)
+
+
+def analyze_trial_file(file_path):
+    """
+    DPB analysis of a single trial file.
+
+    Returns NO_DPB if the trial has no block, and None if the file is missing or cannot be
+    loaded (the trial has no results and is left out of the DPB probability).
+    """
+    try:
+        if file_path.endswith(".npz"):
+            data = load_spike_trial(file_path)
+        else:
+            with open(file_path, "rb") as f:
+                data = pickle.load(f)
+    except Exception as e:
+        print(f"Error loading the file {file_path}: {e}")
+        return None
+    result = analyze_trial_depolarization(
+        data, total_duration=int(NEURON_SETTINGS["tstop"])
+    )
+    return NO_DPB if result is None else result
+
+
+def run_adaptive_sweep(levels=2, trials=15, output="spikes"):
+    """
+    Adaptive version of run_many_smarter.
+
+    Only the DPB of the Basket cells is analysed, so the trials are written spike-only by
+    default (output="full" for the simData pickles).
+
+    Simulates the coarse 0.1 step grid first and then only refines the (gna, gk) squares
+    around the depolarization block boundary, halving the conductance step every level.
+    """
+    base_data_path = "/mnt/internserver1_1tb/Data/MarcData/Data15_Adaptive_Sweep"
+
+    gna_values = np.round(np.arange(0.50, 1.60, 0.1), 2)
+    gk_values = np.round(np.arange(0.50, 1.60, 0.1), 2)
+    pyr_noise_factors = np.array(
+        [0.65, 0.70, 0.75, 0.80, 0.85, 0.90, 0.95, 1.00, 1.10, 1.20, 1.30]
+    )
+
+    n_processes = 60  # min(12, cpu_count())
+
+    def evaluate(points):
+        conditions = {
+            point: make_condition(*point, base_data_path, trials=trials, output=output)
+            for point in points
+        }
+        all_nps_seed_trials = []
+        for nps in conditions.values():
+            all_nps_seed_trials.extend(make_nps_seeds_trials(nps))
+
+        with Pool(processes=n_processes, initializer=init_neuron) as pool:
+            pool.map(createRun, all_nps_seed_trials)
+
+            probabilities = {}
+            for point, nps in conditions.items():
+                file_paths = [
+                    trial_file(nps, trial)
+                    for trial in range(trials)
+                ]
+                trial_results = dict(
+                    zip(file_paths, pool.map(analyze_trial_file, file_paths))
+                )
+                probabilities[point] = compute_dpb_probability(trial_results)
+                skipped[point] = sum(
+                    1 for result in trial_results.values() if result is None
+                )
+        return probabilities
+
+    skipped = {}  # (gna, gk, noise) -> number of trials without results
+
+    probabilities, step = adaptive_sweep(
+        evaluate, gna_values, gk_values, pyr_noise_factors, levels=levels
+    )
+
+    # Save the transition maps at the finest resolution
+    results_dir = "../Results/Adaptive_sweep"
+    ensure_directory_exists(results_dir)
+    maps = {
+        noise: transition_map(probabilities, noise, step)
+        for noise in pyr_noise_factors
+    }
+    with open(os.path.join(results_dir, "transition_maps.pkl"), "wb") as f:
+        pickle.dump(
+            {
+                "probabilities": probabilities,
+                "skipped": skipped,
+                "step": step,
+                "maps": maps,
+            },
+            f,
+        )
+        print(f"Transition maps saved to: {f.name}")
+    n_skipped = sum(skipped.values())
+    if n_skipped:
+        print(f"{n_skipped} trials without results were left out of the probabilities")
+
+    return probabilities, maps
+
+
+def run_sequential_sweep(
+    min_trials=5,
+    max_trials=50,
+    batch=5,
+    max_width=0.3,
+    max_delay_width=None,
+    output="spikes",
+):
+    """
+    Version of run_many_smarter with sequential trial allocation.
+
+    Every condition starts with min_trials and gets batch more trials while the 95% CI of its
+    DPB probability is wider than max_width (or the CI of the mean DPB delay wider than
+    max_delay_width ms), up to max_trials. Trial e has the same seeds as in the fixed sweeps.
+    """
+    base_data_path = "/mnt/internserver1_1tb/Data/MarcData/Data16_Sequential_Sweep"
+
+    pyr_noise_factors = np.array(
+        [0.65, 0.70, 0.75, 0.80, 0.85, 0.90, 0.95, 1.00, 1.10, 1.20, 1.30]
+    )
+    conditions = {
+        (gna, gk, noise_factor): make_condition(
+            gna, gk, noise_factor, base_data_path, trials=max_trials, output=output
+        )
+        for gk in np.round(np.arange(0.50, 1.60, 0.1), 2)
+        for gna in np.round(np.arange(0.50, 1.60, 0.1), 2)
+        for noise_factor in pyr_noise_factors
+    }
+    seeds = make_seed_tuples(max_trials)
+
+    n_processes = 60  # min(12, cpu_count())
+
+    def evaluate(requests):
+        nps_seed_trials = [
+            (dict(conditions[point]), seeds[trial], trial)
+            for point, trials in requests.items()
+            for trial in trials
+        ]
+        file_paths = {
+            point: [trial_file(conditions[point], trial) for trial in trials]
+            for point, trials in requests.items()
+        }
+        with Pool(processes=n_processes, initializer=init_neuron) as pool:
+            pool.map(createRun, nps_seed_trials)
+            results = {}
+            for point, paths in file_paths.items():
+                blocks = pool.map(analyze_trial_file, paths)
+                # DPB delay: onset of the first block, None without a block
+                results[point] = [
+                    FAILED
+                    if block is None
+                    else None
+                    if block == NO_DPB
+                    else block[0][0]
+                    for block in blocks
+                ]
+        return results
+
+    summary = sequential_trials(
+        evaluate,
+        list(conditions),
+        min_trials=min_trials,
+        max_trials=max_trials,
+        batch=batch,
+        max_width=max_width,
+        max_delay_width=max_delay_width,
+    )
+
+    results_dir = "../Results/Sequential_sweep"
+    ensure_directory_exists(results_dir)
+    with open(os.path.join(results_dir, "summary.pkl"), "wb") as f:
+        pickle.dump(summary, f)
+        print(f"Summary saved to: {f.name}")
+
+    n_total = sum(
+        condition["n_trials"] + condition["n_failed"] for condition in summary.values()
+    )
+    print(f"{n_total} trials instead of {15 * len(summary)} for 15 trials per condition")
+    return summary
 
 
 def na_k_noise_experiment():
@@ -840,7 +1726,13 @@ def na_k_noise_experiment():
 if __name__ == "__main__":
     # run_variants()
     # na_k_noise_experiment()
-    run_many_smarter()
+    if pc.nhost() > 1:
+        # Started with mpirun: every trial is distributed over the ranks
+        run_distributed(
+            make_sweep("/mnt/internserver1_1tb/Data/MarcData/Data14_Current_Burst")
+        )
+    else:
+        run_many_smarter()
 
 
 # plt.show()
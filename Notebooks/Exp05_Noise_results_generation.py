@@ -6,11 +6,7 @@ import pickle
 import numpy as np
 import os
 import gc
-from src.SanjayCode import (
-    get_spike_times_for_basket_cells,
-    get_convolved_signal_per_neuron,
-    detect_depolarization_blocks,
-)
+from src.SanjayCode import analyze_trial_depolarization
 
 # Base directory for data
 base_data_path = "../data/Data05_External_noise"
@@ -35,31 +31,9 @@ def process_noise_file(file_path):
         with open(file_path, "rb") as file:
             data = pickle.load(file)
 
-            # Process data
-            basket_spike_times = get_spike_times_for_basket_cells(data, 800, 999)
-            total_duration = int(5000)  # Assuming each time step is 1ms
-            convolved_signal = get_convolved_signal_per_neuron(
-                basket_spike_times, total_duration
-            )
-            (
-                depolarization_starts,
-                depolarization_ends,
-                threshold,
-                total_depolarization_duration,
-            ) = detect_depolarization_blocks(convolved_signal, total_duration)
-
-        if (
-            len(depolarization_starts) > 0
-        ):  # Check if any depolarization events were detected
-            # Convert numpy arrays to lists for serialization
-            return (
-                depolarization_starts.tolist(),
-                depolarization_ends.tolist(),
-                float(threshold),
-                total_depolarization_duration,
-            )
-        else:
-            return None
+        # Process data, handles trials that were stopped early
+        # Returns None if no depolarization events were detected
+        return analyze_trial_depolarization(data, total_duration=5000)
 
     except Exception as e:
         print(f"Error loading the file {file_path}: {e}")
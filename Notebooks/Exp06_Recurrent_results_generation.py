@@ -11,6 +11,7 @@ from src.SanjayCode import (
     get_spike_times_for_basket_cells,
     get_convolved_signal_per_neuron,
     detect_depolarization_blocks,
+    PopulationLayout,
 )
 
 # Updated base directory for data
@@ -37,7 +38,10 @@ def process_noise_file(file_path):
             data = pickle.load(file)
 
             # Process data
-            basket_spike_times = get_spike_times_for_basket_cells(data, 800, 999)
+            layout = PopulationLayout.from_data(data)
+            basket_spike_times = get_spike_times_for_basket_cells(
+                data, layout.start("Bwb"), layout.end("Bwb")
+            )
             total_duration = int(5000)  # Assuming each time step is 1ms
             convolved_signal = get_convolved_signal_per_neuron(
                 basket_spike_times, total_duration
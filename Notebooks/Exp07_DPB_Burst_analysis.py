@@ -10,6 +10,7 @@ import pickle
 # import matplotlib.pyplot as plt
 import numpy as np
 from scipy.ndimage import gaussian_filter1d
+from src.SanjayCode import get_trial_duration, PopulationLayout, DEFAULT_LAYOUT
 
 
 #################################################################
@@ -17,7 +18,9 @@ from scipy.ndimage import gaussian_filter1d
 #################################################################
 
 
-def find_depolarization_block(simData, cell_range, window=100, timestep=0.1):
+def find_depolarization_block(
+    simData, cell_range, window=100, timestep=0.1, duration=5000
+):
     """
     Find the onset time of the depolarization block across the Basket cell population.
 
@@ -26,13 +29,14 @@ def find_depolarization_block(simData, cell_range, window=100, timestep=0.1):
     cell_range (range): The range of GIDs for the Basket cell type to analyze.
     window (int): The window size (in ms) to consider for depolarization block detection.
     timestep (float): The timestep of the simulation in ms.
+    duration (float): The simulated duration of the trial in ms (shorter if stopped early).
 
     Returns:
     float: The onset time of the depolarization block, if found. None otherwise.
     """
 
     # Create a timeline with all possible time points given the timestep
-    timeline = np.arange(0, 5000, timestep)
+    timeline = np.arange(0, duration, timestep)
 
     # Initialize an array to track the spiking activity at each time point
     spike_activity = np.zeros_like(timeline, dtype=int)
@@ -83,9 +87,15 @@ def detect_bursts(activity, threshold):
 
 
 def convolve_spike_activity_DPB_with_bursts(
-    simData, depolarization_onset, window=200, resolution=1, sigma=1, fixed_threshold=1
+    simData,
+    depolarization_onset,
+    window=200,
+    resolution=1,
+    sigma=1,
+    fixed_threshold=1,
+    layout=DEFAULT_LAYOUT,
 ):
-    gids = {"Pyr": range(800), "Bwb": range(800, 1000)}
+    gids = {"Pyr": layout.range("Pyr"), "Bwb": layout.range("Bwb")}
     time_bins = np.arange(
         depolarization_onset - window,
         depolarization_onset + window + resolution,
@@ -165,10 +175,11 @@ def process_trial(pkl_path):
         return None
 
     simData = data["simData"]
-    cell_range = range(800, 1000)  # Basket Cell range
+    layout = PopulationLayout.from_data(data)
+    cell_range = layout.range("Bwb")  # Basket Cell range
 
     depolarization_onset = find_depolarization_block(
-        simData, cell_range, window=100, timestep=0.1
+        simData, cell_range, window=100, timestep=0.1, duration=get_trial_duration(data)
     )
     convolved_activities, burst_info = convolve_spike_activity_DPB_with_bursts(
         simData,
@@ -177,6 +188,7 @@ def process_trial(pkl_path):
         resolution=0.5,
         sigma=2,
         fixed_threshold=1,
+        layout=layout,
     )
 
     return {
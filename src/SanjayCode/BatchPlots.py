@@ -1,6 +1,7 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from .BatchVariants import extract_variant_type
+from .SpectralSummary import condition_means, spectral_table
 
 
 def plot_variant_firing_rates(variant_results, variant_type, x_tick_labels):
@@ -133,6 +134,9 @@ def plot_frequencies_for_variants(variant_results, variant_type, x_tick_labels):
     """
     Plot the theta and gamma frequencies for all datasets within a variant type.
     """
+    # Band powers and peak frequencies of all trials, one table per dataset
+    tables = {name: spectral_table(dataset) for name, dataset in variant_results.items()}
+
     # Set up the color map
     colors = plt.cm.tab10(np.linspace(0, 1, len(variant_results)))
 
@@ -142,13 +146,7 @@ def plot_frequencies_for_variants(variant_results, variant_type, x_tick_labels):
     # Plot for Theta Frequencies
     fig, ax_theta = plt.subplots(figsize=(10, 6))
     for dataset_idx, (dataset_name, dataset) in enumerate(variant_results.items()):
-        mean_theta_freq = []
-        for condition in dataset:
-            condition_theta_freq = [
-                np.mean(run_data["theta_frequencies"])
-                for run_data in dataset[condition].values()
-            ]
-            mean_theta_freq.append(np.mean(condition_theta_freq))
+        mean_theta_freq = condition_means(tables[dataset_name], "peak_frequency", "theta")
         color = colors[dataset_idx]
         # Using extract_variant_type for legend labels
         variant_label = extract_variant_type(dataset_name)
@@ -173,13 +171,7 @@ def plot_frequencies_for_variants(variant_results, variant_type, x_tick_labels):
     # Plot for Gamma Frequencies
     fig, ax_gamma = plt.subplots(figsize=(10, 6))
     for dataset_idx, (dataset_name, dataset) in enumerate(variant_results.items()):
-        mean_gamma_freq = []
-        for condition in dataset:
-            condition_gamma_freq = [
-                np.mean(run_data["gamma_frequencies"])
-                for run_data in dataset[condition].values()
-            ]
-            mean_gamma_freq.append(np.mean(condition_gamma_freq))
+        mean_gamma_freq = condition_means(tables[dataset_name], "peak_frequency", "gamma")
         color = colors[dataset_idx]
         # Using extract_variant_type for legend labels
         variant_label = extract_variant_type(dataset_name)
@@ -206,6 +198,9 @@ def plot_power_for_variants(variant_results, variant_type, x_tick_labels):
     """
     Plot the theta and gamma power for all datasets within a variant type.
     """
+    # Band powers and peak frequencies of all trials, one table per dataset
+    tables = {name: spectral_table(dataset) for name, dataset in variant_results.items()}
+
     # Set up the color map
     colors = plt.cm.tab10(np.linspace(0, 1, len(variant_results)))
 
@@ -215,13 +210,7 @@ def plot_power_for_variants(variant_results, variant_type, x_tick_labels):
     # Plot for Theta Power
     fig, ax_theta = plt.subplots(figsize=(10, 6))
     for dataset_idx, (dataset_name, dataset) in enumerate(variant_results.items()):
-        mean_theta_power = []
-        for condition in dataset:
-            condition_theta_power = [
-                np.mean(run_data["mean_theta_power"])
-                for run_data in dataset[condition].values()
-            ]
-            mean_theta_power.append(np.mean(condition_theta_power))
+        mean_theta_power = condition_means(tables[dataset_name], "power", "theta")
         color = colors[dataset_idx]
         # Using extract_variant_type for legend labels
         variant_label = extract_variant_type(dataset_name)
@@ -246,13 +235,7 @@ def plot_power_for_variants(variant_results, variant_type, x_tick_labels):
     # Plot for Gamma Power
     fig, ax_gamma = plt.subplots(figsize=(10, 6))
     for dataset_idx, (dataset_name, dataset) in enumerate(variant_results.items()):
-        mean_gamma_power = []
-        for condition in dataset:
-            condition_gamma_power = [
-                np.mean(run_data["mean_gamma_power"])
-                for run_data in dataset[condition].values()
-            ]
-            mean_gamma_power.append(np.mean(condition_gamma_power))
+        mean_gamma_power = condition_means(tables[dataset_name], "power", "gamma")
         color = colors[dataset_idx]
         # Using extract_variant_type for legend labels
         variant_label = extract_variant_type(dataset_name)
@@ -4,6 +4,8 @@ import glob
 import re
 from src.SanjayCode import (
     process_data,
+    get_trial_duration,
+    PopulationLayout,
 )
 import gc  # Garbage collection module
 
@@ -79,7 +81,12 @@ def process_dataset(dataset_data):
         condition_results = {}
         for run, run_data in runs.items():
             print(f"Processing {condition}, run {run}")  # Debugging statement
-            processed_data = process_data(run_data["simData"])
+            processed_data = process_data(
+                run_data["simData"],
+                get_trial_duration(run_data),
+                lfp=run_data.get("lfp"),
+                layout=PopulationLayout.from_data(run_data),
+            )
             condition_results[run] = processed_data
         dataset_results[condition] = condition_results
     return dataset_results
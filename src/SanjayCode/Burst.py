@@ -1,12 +1,19 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.lines as mlines
+from .Layout import PopulationLayout
 
 
-def get_sorted_spike_times_for_pyr_cells(data, gid_start=0, gid_end=799):
+def get_sorted_spike_times_for_pyr_cells(data, gid_start=None, gid_end=None):
     """
     Collects the spike times for Pyr cells and sorts them for each cell.
+
+    The GID range defaults to the Pyr population of the layout of the trial.
     """
+    layout = PopulationLayout.from_data(data)
+    gid_start = layout.start("Pyr") if gid_start is None else gid_start
+    gid_end = layout.end("Pyr") if gid_end is None else gid_end
+
     # Initialize a dictionary to hold sorted spike times for each Pyr cell
     sorted_spike_times_per_cell = {}
 
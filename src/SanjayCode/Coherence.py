@@ -0,0 +1,167 @@
+####################################################################################################
+# Batched cross-spectral coherence between the LFP and the population rates.
+#
+# Per trial the Pyr LFP and the binned firing rates of the populations (Pyr, Bwb, OLM) are put on
+# the same time base (the LFP is downsampled anti-aliased to the bin rate). The signals of all
+# trials of a condition are stacked into a (trials x signals x samples) array, and the cross
+# spectra of all signal pairs of all trials come from one scipy.signal.csd call (Welch) over
+# (trials x pairs x samples) arrays, the auto spectra from one welch call.
+#
+# The condition coherence averages the spectra over the trials before normalizing, the trial
+# coherence normalizes per trial. Trials that are much shorter than the others (e.g. early
+# stopped) are left out instead of cutting every trial of the condition to their length.
+####################################################################################################
+
+from itertools import combinations
+
+import matplotlib.pyplot as plt
+import numpy as np
+from scipy.signal import csd, welch
+
+from .Layout import DEFAULT_LAYOUT, PopulationLayout
+from .LfpPyramid import anti_aliased_decimate
+from .Plots import calc_lfp
+from .SanjayVariants import get_trial_duration, stackable_trials
+
+
+def population_rates(simData, layout=DEFAULT_LAYOUT, duration=5000, bin_ms=1):
+    """
+    Binned firing rate (Hz per cell) of every population.
+
+    Returns:
+    - dict, pop -> array (duration / bin_ms,)
+    """
+    edges = np.arange(0, duration + bin_ms / 2, bin_ms)
+    rates = {}
+    for pop, cells in layout.split(simData).items():
+        spikes = [np.asarray(cell.spike_times, dtype=float) for cell in cells]
+        spikes = np.concatenate(spikes) if spikes else np.array([])
+        counts, _ = np.histogram(spikes, bins=edges)
+        rates[pop] = counts / max(len(cells), 1) / (bin_ms / 1000)
+    return rates
+
+
+def trial_signals(data, duration=None, bin_ms=1, t0=200, dt=0.1):
+    """
+    LFP and population rates of a trial on the same time base.
+
+    Parameters:
+    - data: dict, a loaded trial ("simData", optionally "lfp" and "netParams")
+    - duration: float, ms, default the simulated duration of the trial (get_trial_duration,
+      shorter for early stopped trials)
+    - bin_ms: float, bin width of the rates, the signals are sampled at 1000 / bin_ms Hz
+    - t0: float, ms, the transient that is discarded (as calc_psd)
+    - dt: float, ms, time step of the LFP
+
+    Returns:
+    - names: list, ["LFP", "Pyr", "Bwb", "OLM"]
+    - signals: array (signals x samples)
+    """
+    layout = PopulationLayout.from_data(data)
+    lfp = data.get("lfp")
+    if lfp is None:
+        lfp = calc_lfp(layout.split(data["simData"])["Pyr"])
+    lfp = anti_aliased_decimate(lfp, int(round(bin_ms / dt)))
+    if duration is None:
+        duration = get_trial_duration(data)
+    rates = population_rates(data["simData"], layout, duration, bin_ms)
+
+    names = ["LFP"] + list(rates)
+    n_samples = min(lfp.size, *(rate.size for rate in rates.values()))
+    first = int(t0 / bin_ms)
+    signals = np.array([lfp[first:n_samples]] + [rate[first:n_samples] for rate in rates.values()])
+    return names, signals
+
+
+def batched_coherence(signals, names, sampling_rate=1000, nperseg=1024, pairs=None):
+    """
+    Cross spectra and coherence of all signal pairs of all trials.
+
+    Parameters:
+    - signals: array (trials x signals x samples)
+    - names: list, names of the signals
+    - sampling_rate: float, Hz
+    - nperseg: int, Welch segment length in samples
+    - pairs: list of (name, name), default all pairs
+
+    Returns:
+    - dict with "frequencies", "pairs", "csd" (trials x pairs x freqs, complex),
+      "trial_coherence" (trials x pairs x freqs) and "coherence" (pairs x freqs, from the
+      spectra averaged over the trials)
+    """
+    signals = np.asarray(signals, dtype=float)
+    if pairs is None:
+        pairs = list(combinations(names, 2))
+    first = np.array([names.index(a) for a, _ in pairs])
+    second = np.array([names.index(b) for _, b in pairs])
+    nperseg = min(nperseg, signals.shape[-1])
+
+    frequencies, Pxy = csd(
+        signals[:, first, :], signals[:, second, :], fs=sampling_rate, nperseg=nperseg, axis=-1
+    )
+    _, Pxx = welch(signals, fs=sampling_rate, nperseg=nperseg, axis=-1)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        trial_coherence = np.abs(Pxy) ** 2 / (Pxx[:, first, :] * Pxx[:, second, :])
+        mean_Pxx = Pxx.mean(axis=0)
+        coherence = np.abs(Pxy.mean(axis=0)) ** 2 / (mean_Pxx[first] * mean_Pxx[second])
+    return {
+        "frequencies": frequencies,
+        "pairs": pairs,
+        "csd": Pxy,
+        "trial_coherence": trial_coherence,
+        "coherence": coherence,
+    }
+
+
+def condition_coherence(trials, duration=None, bin_ms=1, t0=200, nperseg=1024, min_duration=None):
+    """
+    Coherence between the LFP and the population rates for all trials of a condition.
+
+    Parameters:
+    - trials: iterable of loaded trials (dicts with "simData"), e.g. data[condition].values()
+    - duration: float, ms, default the duration of every trial
+    - min_duration: float, ms, trials that are shorter are left out, default
+      MIN_TRIAL_FRACTION of the longest trial (see stackable_trials). The signals of the kept
+      trials are cut to the shortest kept trial.
+
+    Returns:
+    - see batched_coherence, with the signal names under "names" and the indices of the used
+      trials (in the order of trials) under "trials"
+    """
+    trials = list(trials)
+    if not trials:
+        raise ValueError("condition_coherence needs at least one trial")
+    names = None
+    stacked = []
+    for data in trials:
+        names, signals = trial_signals(data, duration, bin_ms, t0)
+        stacked.append(signals)
+
+    min_length = None if min_duration is None else (min_duration - t0) / bin_ms
+    keep = stackable_trials([signals.shape[-1] for signals in stacked], min_length)
+    n_samples = min(stacked[i].shape[-1] for i in keep)
+    stacked = np.array([stacked[i][:, :n_samples] for i in keep])
+
+    result = batched_coherence(stacked, names, 1000 / bin_ms, nperseg)
+    result["names"] = names
+    result["trials"] = keep
+    return result
+
+
+def plot_coherence(result, pairs=None, fmax=100, title="Coherence"):
+    """Condition coherence of the pairs (default the pairs with the LFP) up to fmax."""
+    if pairs is None:
+        pairs = [pair for pair in result["pairs"] if "LFP" in pair]
+    keep = result["frequencies"] <= fmax
+    plt.figure(figsize=(10, 6))
+    for pair in pairs:
+        coherence = result["coherence"][result["pairs"].index(pair)]
+        plt.plot(result["frequencies"][keep], coherence[keep], label=f"{pair[0]} - {pair[1]}")
+    plt.xlabel("Frequency (Hz)")
+    plt.ylabel("Coherence")
+    plt.ylim(0, 1)
+    plt.title(title)
+    plt.grid(True)
+    plt.legend()
+    plt.show()
@@ -0,0 +1,121 @@
+####################################################################################################
+# Event-locked time-frequency analysis around the depolarization block (DPB) onset.
+#
+# Only the LFP in [onset - window, onset + window] of every trial with a detected onset is
+# analysed: the segments are cut out, stacked into an (events x samples) matrix, downsampled
+# once (anti-aliased) and go through one batched spectrogram, instead of a full spectrogram per
+# trial. The onsets come from analyze_trial_depolarization (first block start, ms).
+####################################################################################################
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+from .LfpPyramid import anti_aliased_decimate
+from .TimeFrequency import BANDS, batched_spectrogram
+
+
+def dpb_onsets(depolarizations):
+    """
+    Onset (ms) of the first depolarization block of every trial, None for trials without DPB.
+
+    Parameters:
+    - depolarizations: list, per trial the result of analyze_trial_depolarization
+    """
+    return [None if result is None else result[0][0] for result in depolarizations]
+
+
+def event_segments(lfps, onsets, window=1000, sampling_rate=10000):
+    """
+    Stack the LFP around every onset.
+
+    Parameters:
+    - lfps: list of LFP arrays (one per trial)
+    - onsets: list, onset in ms per trial or None
+    - window: float, ms before and after the onset
+    - sampling_rate: float, Hz of the LFPs
+
+    Returns:
+    - segments: array (events x samples), the trials whose window lies inside the recording
+    - trial_index: array (events,), the trial of every segment
+    """
+    half = int(round(window * sampling_rate / 1000))
+    segments = []
+    trial_index = []
+    for trial, (lfp, onset) in enumerate(zip(lfps, onsets)):
+        if onset is None:
+            continue
+        centre = int(round(onset * sampling_rate / 1000))
+        if centre - half < 0 or centre + half > len(lfp):
+            continue  # Onset too close to the start or the end of the trial
+        segments.append(np.asarray(lfp[centre - half : centre + half], dtype=float))
+        trial_index.append(trial)
+    return np.array(segments).reshape(len(segments), 2 * half), np.array(trial_index, dtype=int)
+
+
+def event_locked_spectrogram(
+    lfps,
+    onsets,
+    window=1000,
+    sampling_rate=10000,
+    analysis_rate=1000,
+    nperseg=256,
+    noverlap=224,
+    fmax=200,
+    bands=BANDS,
+):
+    """
+    Spectrogram and band power time courses around the DPB onset of every trial.
+
+    Parameters:
+    - lfps, onsets, window, sampling_rate: see event_segments
+    - analysis_rate: float, Hz, the segments are downsampled to this rate before the FFT
+    - nperseg, noverlap: window and overlap of the spectrogram in samples at analysis_rate
+    - fmax: float, highest frequency that is kept (Hz)
+    - bands: dict, name -> (low, high)
+
+    Returns:
+    - dict with "frequencies", "times" (ms relative to the onset), "Sxx"
+      (events x freqs x windows), "powers" (name -> events x windows) and "trial_index"
+    """
+    segments, trial_index = event_segments(lfps, onsets, window, sampling_rate)
+    if len(segments) == 0:
+        return {
+            "frequencies": None,
+            "times": None,
+            "Sxx": None,
+            "powers": {},
+            "trial_index": trial_index,
+        }
+
+    factor = int(sampling_rate // analysis_rate)
+    if factor > 1:
+        segments = anti_aliased_decimate(segments, factor)  # Along the time axis of all events
+    rate = sampling_rate / max(factor, 1)
+
+    frequencies, times, Sxx, powers = batched_spectrogram(
+        segments, rate, nperseg=nperseg, noverlap=noverlap, fmax=fmax, bands=bands
+    )
+    return {
+        "frequencies": frequencies,
+        "times": 1000 * times - window,
+        "Sxx": Sxx,
+        "powers": powers,
+        "trial_index": trial_index,
+    }
+
+
+def plot_event_locked_power(result, title="Band power around DPB onset"):
+    """Mean and SEM over the events of every band power of event_locked_spectrogram."""
+    fig, ax = plt.subplots(figsize=(10, 6))
+    for name, power in result["powers"].items():
+        mean = power.mean(axis=0)
+        sem = power.std(axis=0) / np.sqrt(power.shape[0])
+        ax.plot(result["times"], mean, label=name)
+        ax.fill_between(result["times"], mean - sem, mean + sem, alpha=0.3)
+    ax.axvline(0, color="black", linestyle="--", label="DPB onset")
+    ax.set_xlabel("Time relative to DPB onset (ms)")
+    ax.set_ylabel("Power (mV^2/Hz)")
+    ax.set_title(f"{title} (n = {len(result['trial_index'])})")
+    ax.legend()
+    plt.tight_layout()
+    plt.show()
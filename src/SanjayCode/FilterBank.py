@@ -0,0 +1,73 @@
+####################################################################################################
+# Zero-phase filter bank for stacked trials.
+#
+# The band-pass filters are designed once per (band, sampling rate, order) as second-order
+# sections and cached. Every band is applied with one sosfiltfilt call along the time axis of a
+# (trials x samples) matrix, the envelopes come from one Hilbert transform per band.
+####################################################################################################
+
+from functools import lru_cache
+
+import numpy as np
+from scipy.signal import butter, hilbert, sosfiltfilt
+
+from .TimeFrequency import BANDS, stack_lfps
+
+# Bands of the filter bank in Hz (ripple needs a sampling rate above 500 Hz)
+FILTER_BANDS = {**BANDS, "ripple": (150, 250)}
+
+
+@lru_cache(maxsize=64)
+def band_sos(low, high, sampling_rate, order=4):
+    """Butterworth band-pass (low-pass if low is 0) as second-order sections, cached."""
+    nyquist = sampling_rate / 2
+    if high >= nyquist:
+        raise ValueError(f"Band ({low}, {high}) Hz needs a sampling rate above {2 * high} Hz")
+    if low <= 0:
+        sos = butter(order, high, btype="lowpass", fs=sampling_rate, output="sos")
+    else:
+        sos = butter(order, (low, high), btype="bandpass", fs=sampling_rate, output="sos")
+    return sos  # Shared by all callers, do not modify
+
+
+class FilterBank:
+    """
+    Band-limited signals and envelopes of stacked trials.
+
+    Parameters:
+    - sampling_rate: float, Hz of the signals
+    - bands: dict, name -> (low, high) in Hz
+    - order: int, Butterworth order (the zero-phase response has twice the order)
+    """
+
+    def __init__(self, sampling_rate, bands=FILTER_BANDS, order=4):
+        self.sampling_rate = sampling_rate
+        self.bands = dict(bands)
+        self.order = order
+
+    def sos(self, band):
+        low, high = self.bands[band]
+        return band_sos(float(low), float(high), float(self.sampling_rate), self.order)
+
+    def filter(self, lfps, bands=None):
+        """Zero-phase band-passed signals, dict name -> array (trials x samples)."""
+        lfps = stack_lfps(lfps)
+        return {
+            band: sosfiltfilt(self.sos(band), lfps, axis=-1)
+            for band in (self.bands if bands is None else bands)
+        }
+
+    def analytic(self, lfps, bands=None):
+        """Analytic signals of the band-passed signals, dict name -> complex array."""
+        return {
+            band: hilbert(filtered, axis=-1)
+            for band, filtered in self.filter(lfps, bands).items()
+        }
+
+    def envelope(self, lfps, bands=None):
+        """Amplitude envelopes (|analytic signal|), dict name -> array (trials x samples)."""
+        return {band: np.abs(signal) for band, signal in self.analytic(lfps, bands).items()}
+
+    def phase(self, lfps, bands=None):
+        """Instantaneous phases (rad), dict name -> array (trials x samples)."""
+        return {band: np.angle(signal) for band, signal in self.analytic(lfps, bands).items()}
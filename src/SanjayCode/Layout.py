@@ -0,0 +1,85 @@
+# Populations of the network in creation order, the gids are assigned contiguously in this order
+BASE_SIZES = {"Pyr": 800, "Bwb": 200, "OLM": 200}
+
+
+class PopulationLayout:
+    """
+    The gid ranges of the populations of a network.
+
+    Parameters:
+    - sizes: dict, population -> number of cells, in creation order (default is the
+      800 Pyr / 200 Bwb / 200 OLM network: Pyr 0-799, Bwb 800-999, OLM 1000-1199)
+    """
+
+    def __init__(self, sizes=None):
+        self.sizes = dict(BASE_SIZES if sizes is None else sizes)
+        self.starts = {}
+        start = 0
+        for pop, size in self.sizes.items():
+            self.starts[pop] = start
+            start += size
+        self.n_cells = start
+
+    @classmethod
+    def scaled(cls, scale, sizes=None):
+        """Layout with every population scaled by scale (e.g. 0.25, 1, 4)."""
+        sizes = BASE_SIZES if sizes is None else sizes
+        return cls({pop: max(1, int(round(size * scale))) for pop, size in sizes.items()})
+
+    @classmethod
+    def from_netParams(cls, netParams):
+        """Layout of the network created from netParams (nCells of the cellParams)."""
+        return cls({pop: params["nCells"] for pop, params in netParams.cellParams.items()})
+
+    @classmethod
+    def from_data(cls, data):
+        """Layout of a loaded trial, the default layout for trials without netParams."""
+        if isinstance(data, dict) and "population_sizes" in data:
+            return cls(data["population_sizes"])  # Spike-only trials (.npz)
+        netParams = data.get("netParams") if isinstance(data, dict) else None
+        if netParams is None:
+            return cls()
+        return cls.from_netParams(netParams)
+
+    def size(self, pop):
+        return self.sizes[pop]
+
+    def start(self, pop):
+        """First gid of the population."""
+        return self.starts[pop]
+
+    def end(self, pop):
+        """Last gid of the population (inclusive, as gid_end in the analysis functions)."""
+        return self.starts[pop] + self.sizes[pop] - 1
+
+    def range(self, pop):
+        return range(self.starts[pop], self.starts[pop] + self.sizes[pop])
+
+    def gids(self, pop):
+        return set(self.range(pop))
+
+    def population_of(self, gid):
+        for pop in self.sizes:
+            if self.starts[pop] <= gid <= self.end(pop):
+                return pop
+        return None
+
+    def split(self, simData):
+        """Cells of simData per population, pop -> list of cells."""
+        cells = {pop: [] for pop in self.sizes}
+        for gid, cell in simData.items():
+            pop = self.population_of(cell._gid)
+            if pop is not None:
+                cells[pop].append(cell)
+        return cells
+
+    def scale_count(self, count, source):
+        """In-degree of a connection from source, limited to the size of the source population."""
+        return min(count, self.sizes[source])
+
+    def __repr__(self):
+        ranges = ", ".join(f"{pop} {self.start(pop)}-{self.end(pop)}" for pop in self.sizes)
+        return f"PopulationLayout({ranges})"
+
+
+DEFAULT_LAYOUT = PopulationLayout()
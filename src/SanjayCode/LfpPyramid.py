@@ -0,0 +1,99 @@
+####################################################################################################
+# Anti-aliased multi-resolution LFP pyramid.
+#
+# The LFP of a trial is kept at a few sampling rates (10 kHz, 2 kHz and 400 Hz by default), every
+# level is low-pass filtered before it is decimated (scipy.signal.decimate, zero phase). Spectral
+# analysis takes the coarsest level whose Nyquist frequency covers its fmax (calc_psd: 400 Hz for
+# fmax = 200 Hz), plots take the coarsest level that still has a sample per pixel.
+#
+# Plain slicing (lfp[::div]) folds everything above the new Nyquist frequency back into the
+# spectrum, anti_aliased_decimate is the filtered replacement.
+####################################################################################################
+
+import matplotlib.pyplot as plt
+import numpy as np
+from scipy.signal import decimate
+
+# Sampling rates of the levels in Hz, the first one is the rate of the simulation (dt = 0.1 ms)
+DEFAULT_RATES = (10000, 2000, 400)
+
+
+def _stages(factor):
+    # scipy recommends an IIR decimation factor of at most 13, split larger factors
+    stages = []
+    while factor > 1:
+        for q in range(10, 1, -1):
+            if factor % q == 0:
+                break
+        else:
+            q = factor  # Prime factor > 10, one stage
+        stages.append(q)
+        factor //= q
+    return stages
+
+
+def anti_aliased_decimate(signal, factor):
+    """Low-pass filter (zero phase) and keep every factor-th sample, in stages of at most 10."""
+    signal = np.asarray(signal, dtype=float)
+    for q in _stages(int(factor)):
+        signal = decimate(signal, q, ftype="iir" if q <= 13 else "fir", zero_phase=True)
+    return signal
+
+
+class LfpPyramid:
+    """
+    LFP of a trial at several sampling rates.
+
+    Parameters:
+    - lfp: array, the LFP at the rate rates[0]
+    - rates: tuple of int, decreasing sampling rates (Hz), each one an integer divisor of the
+      previous one
+    """
+
+    def __init__(self, lfp, rates=DEFAULT_RATES):
+        self.rates = tuple(int(rate) for rate in rates)
+        self.levels = {self.rates[0]: np.asarray(lfp, dtype=float)}
+        for previous, rate in zip(self.rates[:-1], self.rates[1:]):
+            if previous % rate:
+                raise ValueError(f"{rate} Hz is not an integer divisor of {previous} Hz")
+            self.levels[rate] = anti_aliased_decimate(self.levels[previous], previous // rate)
+
+    @property
+    def duration(self):
+        """Duration in ms."""
+        return 1000 * self.levels[self.rates[0]].size / self.rates[0]
+
+    def level(self, rate):
+        return self.levels[rate]
+
+    def level_for_fmax(self, fmax):
+        """(rate, signal) of the coarsest level with a Nyquist frequency of at least fmax."""
+        for rate in reversed(self.rates):
+            if rate >= 2 * fmax:
+                return rate, self.levels[rate]
+        return self.rates[0], self.levels[self.rates[0]]
+
+    def level_for_width(self, t_start, t_end, width_px):
+        """(rate, signal) of the coarsest level with at least one sample per pixel in [t_start, t_end] ms."""
+        for rate in reversed(self.rates):
+            if (t_end - t_start) * rate / 1000 >= width_px:
+                return rate, self.levels[rate]
+        return self.rates[0], self.levels[self.rates[0]]
+
+
+def plot_lfp(pyramid, t_start=0, t_end=None, width_px=1500, ax=None, **kwargs):
+    """
+    Plot the LFP between t_start and t_end (ms) from the level that fits width_px pixels.
+    """
+    if t_end is None:
+        t_end = pyramid.duration
+    rate, signal = pyramid.level_for_width(t_start, t_end, width_px)
+    i0, i1 = int(t_start * rate / 1000), int(np.ceil(t_end * rate / 1000))
+    times = np.arange(i0, min(i1, signal.size)) * 1000 / rate
+
+    if ax is None:
+        _, ax = plt.subplots(figsize=(15, 4))
+    ax.plot(times, signal[i0 : i0 + times.size], **kwargs)
+    ax.set_xlabel("Time (ms)")
+    ax.set_ylabel("LFP (mV)")
+    return ax
@@ -168,3 +168,119 @@ def plot_depolarization_delay_matrix(
             ax.text(j, i, text_str, ha="center", va="center", color="w", fontsize=8)
 
     plt.show()
+
+
+def analyze_trial_depolarization(data, gid_start=None, gid_end=None, total_duration=5000):
+    """
+    Detect the depolarization blocks of the Basket cell population in a single trial.
+
+    Parameters:
+    - data: dict, the loaded trial pickle containing "simData"
+    - gid_start: int, first gid of the Basket cell population (default from the layout of the trial)
+    - gid_end: int, last gid of the Basket cell population (default from the layout of the trial)
+    - total_duration: int, nominal duration of the trial in ms
+
+    Trials that were stopped early are analysed up to the time the run ended, unless the
+    run was stopped because the Basket cells went silent (DPB), then the block is taken to
+    last until the nominal end of the trial.
+
+    Returns:
+    - (starts, ends, threshold, total_duration) in the format of the noise results files,
+      or None if no depolarization block was detected
+    """
+    from .Convolutions import (
+        get_spike_times_for_basket_cells,
+        get_convolved_signal_per_neuron,
+        detect_depolarization_blocks,
+    )
+    from .Layout import PopulationLayout
+    from .SanjayVariants import get_trial_duration
+
+    layout = PopulationLayout.from_data(data)
+    gid_start = layout.start("Bwb") if gid_start is None else gid_start
+    gid_end = layout.end("Bwb") if gid_end is None else gid_end
+
+    if data.get("trial_meta") is not None:
+        # Same rule as the firing rates: silent early stops count until tstop
+        total_duration = int(get_trial_duration(data, total_duration))
+
+    basket_spike_times = get_spike_times_for_basket_cells(data, gid_start, gid_end)
+    convolved_signal = get_convolved_signal_per_neuron(
+        basket_spike_times, total_duration
+    )
+    (
+        depolarization_starts,
+        depolarization_ends,
+        threshold,
+        total_depolarization_duration,
+    ) = detect_depolarization_blocks(convolved_signal, total_duration)
+
+    if len(depolarization_starts) == 0:
+        return None
+
+    return (
+        depolarization_starts.tolist(),
+        depolarization_ends.tolist(),
+        float(threshold),
+        total_depolarization_duration,
+    )
+
+
+# Result of a trial that was analysed and has no depolarization block (format of the results files)
+NO_DPB = "No depolarization events"
+
+
+def compute_dpb_probability(trials, total_trials=None):
+    """
+    Fraction of trials of a single variant that contain at least one depolarization block.
+
+    Parameters:
+    - trials: dict, trial name -> result of analyze_trial_depolarization, NO_DPB for a trial
+      without block, or None for a trial without results (missing or unreadable file)
+    - total_trials: int, number of trials that were run (defaults to len(trials)),
+      trials without a block are often left out of the noise results files
+
+    Trials without results are left out of the probability (numerator and denominator), the
+    number of skipped trials is printed.
+
+    Returns:
+    - float, probability of a depolarization block in [0, 1], nan if no trial has results
+    """
+    if total_trials is None:
+        total_trials = len(trials)
+    skipped = sum(1 for trial_results in trials.values() if trial_results is None)
+    if skipped:
+        print(f"Skipped {skipped} of {total_trials} trials without results")
+    total_trials -= skipped
+    if total_trials <= 0:
+        return np.nan
+
+    trials_with_block = sum(
+        1
+        for trial_results in trials.values()
+        if trial_results is not None and trial_results != NO_DPB and trial_results[0]
+    )
+    return trials_with_block / total_trials
+
+
+def plot_transition_map(gna_values, gk_values, probability_matrix, noise_level):
+    """
+    Plot a (gk x gna) map of the depolarization block probability, e.g. the output of an adaptive sweep.
+    """
+    fig, ax = plt.subplots(figsize=(10, 8))
+    cax = ax.pcolormesh(
+        gna_values,
+        gk_values,
+        probability_matrix * 100,
+        cmap="viridis",
+        vmin=0,
+        vmax=100,
+        shading="nearest",
+    )
+    fig.colorbar(cax, label="Percentage of Trials", ticks=range(0, 101, 10))
+    ax.set_xlabel("gNa (times baseline)")
+    ax.set_ylabel("gK (times baseline)")
+    ax.set_title(
+        f"Depolarization block probability (gNa vs gK) - Noise Level: {noise_level:.2f}"
+    )
+    plt.show()
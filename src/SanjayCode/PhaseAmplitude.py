@@ -0,0 +1,200 @@
+####################################################################################################
+# Phase-amplitude coupling (theta-gamma) with batched Hilbert transforms.
+#
+# The LFPs of all trials (from calc_lfp) are downsampled once and transformed with one FFT. The
+# analytic signal of every phase and amplitude band is computed in the frequency domain: the
+# spectrum is multiplied by the zero-phase gain of the band filter of the FilterBank (|H|^2,
+# as sosfiltfilt) and by the Hilbert weights (0 for negative, 2 for positive frequencies), and
+# one inverse FFT over a (trials x bands x samples) array gives all analytic signals.
+#
+# The coupling is the modulation index of Tort et al. (2010): the mean amplitude per phase bin,
+# normalized to a distribution P, MI = (log(N) - H(P)) / log(N). The binning is vectorized, one
+# batched matrix product per phase bin gives the amplitude sums of all trials and band pairs.
+#
+# After the transient (t0) and the filter edges (2 x edge) at least one cycle of the slowest
+# phase band has to remain, shorter LFPs raise an error instead of giving NaN MIs. condition_pac
+# leaves trials out that are much shorter than the others (stackable_trials).
+####################################################################################################
+
+import matplotlib.pyplot as plt
+import numpy as np
+from scipy.signal import sosfreqz
+
+from .FilterBank import band_sos
+from .LfpPyramid import anti_aliased_decimate
+from .Layout import PopulationLayout
+from .Plots import calc_lfp
+from .SanjayVariants import stackable_trials
+from .TimeFrequency import stack_lfps
+
+# Phase bands of 2 Hz (3 - 12 Hz) and amplitude bands of 20 Hz (30 - 200 Hz)
+PHASE_BANDS = [(f - 1, f + 1) for f in range(3, 13)]
+AMPLITUDE_BANDS = [(f - 10, f + 10) for f in range(30, 201, 10)]
+
+
+def _analytic_signals(spectrum, frequencies, bands, sampling_rate, order):
+    # Zero-phase band gain times the Hilbert weights, one row per band
+    weights = np.zeros(frequencies.size)
+    weights[frequencies > 0] = 2
+    weights[frequencies == 0] = 1
+    if frequencies.size % 2 == 0:
+        weights[frequencies.size // 2] = 1  # Nyquist
+    gains = np.array(
+        [
+            np.abs(
+                sosfreqz(
+                    band_sos(float(low), float(high), float(sampling_rate), order),
+                    worN=np.abs(frequencies),
+                    fs=sampling_rate,
+                )[1]
+            )
+            ** 2
+            for low, high in bands
+        ]
+    )
+    return np.fft.ifft(spectrum[:, np.newaxis, :] * (gains * weights), axis=-1)
+
+
+def modulation_index(phase, amplitude, n_bins=18):
+    """
+    Tort modulation index of every (phase band, amplitude band) pair of every trial.
+
+    Parameters:
+    - phase: array (trials x phase bands x samples), rad
+    - amplitude: array (trials x amplitude bands x samples)
+    - n_bins: int, number of phase bins
+
+    Returns:
+    - mi: array (trials x phase bands x amplitude bands)
+    - mean_amplitude: array (trials x phase bands x amplitude bands x bins), the normalized
+      amplitude distribution P over the phase bins
+    """
+    bins = np.floor((phase + np.pi) / (2 * np.pi) * n_bins).astype(int) % n_bins
+    sums = []
+    counts = []
+    for b in range(n_bins):
+        in_bin = (bins == b).astype(float)  # trials x phase bands x samples
+        sums.append(in_bin @ np.swapaxes(amplitude, -1, -2))  # trials x phase x amplitude
+        counts.append(in_bin.sum(axis=-1))
+    sums = np.stack(sums, axis=-1)
+    counts = np.stack(counts, axis=-1)[:, :, np.newaxis, :]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_amplitude = sums / counts
+        P = mean_amplitude / mean_amplitude.sum(axis=-1, keepdims=True)
+        entropy = -np.nansum(P * np.log(P), axis=-1)
+    mi = (np.log(n_bins) - entropy) / np.log(n_bins)
+    return mi, P
+
+
+def phase_amplitude_coupling(
+    lfps,
+    sampling_rate=10000,
+    phase_bands=PHASE_BANDS,
+    amplitude_bands=AMPLITUDE_BANDS,
+    analysis_rate=1000,
+    t0=200,
+    edge=500,
+    n_bins=18,
+    order=4,
+):
+    """
+    Comodulogram (Tort MI) of every trial.
+
+    Parameters:
+    - lfps: array (trials x samples) or list of equally long LFPs
+    - sampling_rate: float, Hz of the LFPs
+    - phase_bands, amplitude_bands: lists of (low, high) in Hz
+    - analysis_rate: float, Hz, the LFPs are downsampled (anti-aliased) to this rate
+    - t0: float, ms, transient at the start that is discarded (as calc_psd)
+    - edge: float, ms, discarded at both ends after filtering (edge effects of the filters)
+    - n_bins: int, number of phase bins
+    - order: int, Butterworth order of the band filters
+
+    Returns:
+    - dict with "phase_frequencies", "amplitude_frequencies" (band centres), "mi"
+      (trials x phase bands x amplitude bands) and "distribution" (... x bins)
+    """
+    lfps = stack_lfps(lfps)
+    duration = 1000 * lfps.shape[-1] / sampling_rate
+    cycle = 1000 / min(low for low, _ in phase_bands)  # ms, slowest phase cycle
+    if duration < t0 + 2 * edge + cycle:
+        raise ValueError(
+            f"LFPs of {duration:.0f} ms are too short: the transient ({t0} ms), both filter "
+            f"edges ({edge} ms) and one cycle of the slowest phase band ({cycle:.0f} ms) need "
+            f"{t0 + 2 * edge + cycle:.0f} ms"
+        )
+    factor = int(sampling_rate // analysis_rate)
+    if factor > 1:
+        lfps = anti_aliased_decimate(lfps, factor)
+    rate = sampling_rate / max(factor, 1)
+    lfps = lfps[:, int(t0 * rate / 1000) :]
+    lfps = lfps - lfps.mean(axis=-1, keepdims=True)
+
+    # One FFT of all trials, one inverse FFT per set of bands
+    spectrum = np.fft.fft(lfps, axis=-1)
+    frequencies = np.fft.fftfreq(lfps.shape[-1], 1 / rate)
+    phase = np.angle(_analytic_signals(spectrum, frequencies, phase_bands, rate, order))
+    amplitude = np.abs(_analytic_signals(spectrum, frequencies, amplitude_bands, rate, order))
+
+    n_edge = int(edge * rate / 1000)
+    if n_edge > 0:
+        phase, amplitude = phase[..., n_edge:-n_edge], amplitude[..., n_edge:-n_edge]
+
+    mi, distribution = modulation_index(phase, amplitude, n_bins)
+    return {
+        "phase_frequencies": np.array([(low + high) / 2 for low, high in phase_bands]),
+        "amplitude_frequencies": np.array([(low + high) / 2 for low, high in amplitude_bands]),
+        "mi": mi,
+        "distribution": distribution,
+    }
+
+
+def condition_pac(trials, min_duration=None, **kwargs):
+    """
+    Comodulograms of all trials of a condition, from the LFP of the pyramidal cells.
+
+    Parameters:
+    - trials: iterable of loaded trials (dicts with "simData"), e.g. data[condition].values()
+    - min_duration: float, ms, trials with a shorter LFP are left out, default
+      MIN_TRIAL_FRACTION of the longest trial (see stackable_trials). The LFPs of the kept
+      trials are cut to the shortest kept trial.
+    - kwargs: see phase_amplitude_coupling
+
+    Returns:
+    - see phase_amplitude_coupling, with the indices of the used trials (in the order of
+      trials) under "trials"
+    """
+    lfps = []
+    for data in trials:
+        lfp = data.get("lfp")
+        if lfp is None:
+            layout = PopulationLayout.from_data(data)
+            lfp = calc_lfp(layout.split(data["simData"])["Pyr"])
+        lfps.append(lfp)
+    if not lfps:
+        raise ValueError("condition_pac needs at least one trial")
+
+    sampling_rate = kwargs.get("sampling_rate", 10000)
+    min_length = None if min_duration is None else min_duration * sampling_rate / 1000
+    keep = stackable_trials([len(lfp) for lfp in lfps], min_length)
+    n_samples = min(len(lfps[i]) for i in keep)
+    result = phase_amplitude_coupling([lfps[i][:n_samples] for i in keep], **kwargs)
+    result["trials"] = keep
+    return result
+
+
+def plot_comodulogram(result, title="Phase-amplitude coupling"):
+    """Mean modulation index over the trials."""
+    plt.figure(figsize=(8, 6))
+    plt.pcolormesh(
+        result["phase_frequencies"],
+        result["amplitude_frequencies"],
+        result["mi"].mean(axis=0).T,
+        shading="auto",
+    )
+    plt.xlabel("Phase frequency (Hz)")
+    plt.ylabel("Amplitude frequency (Hz)")
+    plt.title(f"{title} (n = {result['mi'].shape[0]})")
+    plt.colorbar(label="Modulation index")
+    plt.show()
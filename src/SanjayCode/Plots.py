@@ -1,6 +1,8 @@
 import numpy as np
 from neuron import h
 import pylab
+from .Multitaper import multitaper_psd
+from .LfpPyramid import LfpPyramid, anti_aliased_decimate, plot_lfp
 
 
 def compute_manual_firing_rate(spike_times, stim_duration, dt):
@@ -36,12 +38,36 @@ def calc_lfp(pyr_cells):
     return vlfp
 
 
-def calc_psd(lfp):
+def plot_lfp_trace(lfp, t_start=0, t_end=None, width_px=1500, ax=None, **kwargs):
+    """
+    Plot the LFP of a trial over time.
+
+    Parameters:
+    - lfp: numpy array, LFP signal (dt = 0.1 ms), or its LfpPyramid
+    - t_start, t_end: float, ms, the plotted window (default the whole trial)
+    - width_px: int, width of the plot, the coarsest pyramid level with a sample per pixel is
+      drawn instead of every sample
+    - ax: matplotlib Axes, a new figure if None
+
+    Returns:
+    - ax: the Axes of the plot
+    """
+    pyramid = lfp if isinstance(lfp, LfpPyramid) else LfpPyramid(lfp)
+    ax = plot_lfp(pyramid, t_start, t_end, width_px=width_px, ax=ax, label="LFP", **kwargs)
+    ax.set_title("Local Field Potential (LFP)")
+    ax.grid(True)
+    return ax
+
+
+def calc_psd(lfp, method="psd", NW=4, return_frequencies=False):
     """
     Calculate the mean theta and gamma power of the LFP signal.
 
     Parameters:
-    - lfp: numpy array, LFP signal
+    - lfp: numpy array, LFP signal (dt = h.dt), or its LfpPyramid
+    - method: str, "psd" (pylab.psd, Welch) or "multitaper" (DPSS tapers, lower variance)
+    - NW: float, time-half-bandwidth product of the multitaper estimate
+    - return_frequencies: bool, also return the frequencies of Pxx
     - fs: int, sampling frequency (default is 1000 Hz)
     - tr: tuple, theta frequency range (default is (3, 12) Hz)
     - gr: tuple, gamma frequency range (default is (30, 80) Hz)
@@ -52,6 +78,7 @@ def calc_psd(lfp):
     - theta_freq: float, dominant frequency in the theta range (Hz)
     - gamma_freq: float, dominant frequency in the gamma range (Hz)
     - Pxx: numpy array, power spectral density of the LFP signal
+    - f: numpy array, frequencies of Pxx (Hz), only if return_frequencies
     """
 
     tr = [3, 12]  # Theta frequency range
@@ -65,20 +92,34 @@ def calc_psd(lfp):
     # Set the upper limit for the periodogram frequency
     fmax = 200  # Adjust as needed
 
+    # Sampling rate of the signal, a pyramid gives the coarsest level that covers fmax
+    if isinstance(lfp, LfpPyramid):
+        rate, lfp = lfp.level_for_fmax(fmax)
+    else:
+        rate = 1000 / h.dt
+
     # Downsample the signal based on the chosen fmax
-    div = int(1000 / h.dt / (2 * fmax))
+    div = max(int(rate / (2 * fmax)), 1)
 
-    t0i = int(t0 / h.dt)  # Convert t0 to an index
+    t0i = int(t0 * rate / 1000)  # Convert t0 to an index
 
     # Check if the length of the LFP signal is sufficient
     if t0i > len(lfp):  # You can adjust this value based on your preference
         print("LFP is too short! (<200 ms)")
-        return 0, 0, 0, 0
+        empty = np.array([])  # No spectrum, same number of values as a computed one
+        if return_frequencies:
+            return 0, 0, 0, 0, empty, empty
+        return 0, 0, 0, 0, empty
 
-    data = lfp[t0i::div]
+    # Low-pass filter before downsampling, plain slicing aliases the power above fmax
+    data = anti_aliased_decimate(lfp[t0i:], div)
+    fs = rate / div
 
     # Calculate the FFT power spectrum
-    Pxx, f = pylab.psd(data - data.mean(), Fs=1000 / h.dt / div)
+    if method == "multitaper":
+        f, Pxx = multitaper_psd(data, fs, NW=NW)
+    else:
+        Pxx, f = pylab.psd(data - data.mean(), Fs=fs)
 
     # Find indices corresponding to theta and gamma frequency ranges
     tr = np.array(tr)  # Convert tr to numpy array
@@ -104,4 +145,6 @@ def calc_psd(lfp):
     # print(f"Dominant Theta Frequency: {theta_freq:.2f} Hz")
     # print(f"Dominant Gamma Frequency: {gamma_freq:.2f} Hz")
 
+    if return_frequencies:
+        return mean_theta_power, mean_gamma_power, theta_freq, gamma_freq, Pxx, f
     return mean_theta_power, mean_gamma_power, theta_freq, gamma_freq, Pxx
@@ -2,29 +2,25 @@
 # Data contains 20 trials per run (connection strength).
 import numpy as np
 from .Plots import calc_lfp
+from .Layout import PopulationLayout
 import matplotlib.pyplot as plt
 import seaborn as sns
-from numpy.fft import rfft, rfftfreq
+from .SpectralStream import SpectralAccumulator
+from .SpectralSummary import band_table
 
 
 def my_psd(data, run):
-    """Compute PSD across all trials"""
-    psds = []
-    for trial in range(20):
-        t = f"{trial:02}"
+    """Compute PSD across all trials of the run (running mean, one trial spectrum at a time)"""
+    SAMPLE_RATE = 1000 / 0.1
+    accumulator = SpectralAccumulator(SAMPLE_RATE, scaling="raw")
+    for t in sorted(data[run]):
         # Extracting pyramidal cells for each trial
         simData = data[run][t]["simData"]
-        pyr_cells = [cell for _, cell in simData.items() if cell._gid < 800]
-        g = calc_lfp(pyr_cells)
-        N = 50_001
-        SAMPLE_RATE = 1000 / 0.1
-        yf = rfft(g - np.mean(g))
-        xf = rfftfreq(N, 1 / SAMPLE_RATE)
+        layout = PopulationLayout.from_data(data[run][t])
+        pyr_cells = layout.split(simData)["Pyr"]
+        accumulator.add(calc_lfp(pyr_cells))
 
-        psd = np.abs(yf) ** 2
-        psds.append(psd)
-
-    return np.mean(psds, axis=0), xf
+    return accumulator.mean, accumulator.frequencies
 
 
 def plot_psd(data, my_runs):
@@ -45,21 +41,11 @@ def plot_psd(data, my_runs):
 
 
 def get_theta_gamma_power(psds, xfs, my_runs):
-    tfs = []
-    gfs = []
-    for run in my_runs:
-        psd = psds[run]
-        xf = xfs[run]
-        tr = [3, 12]  # [2.5, 7.5]
-        gr = [30, 80]  # [20, 60]
-
-        theta_band_indices = np.where((xf >= tr[0]) & (xf <= tr[1]))
-        filtered_psd = psd[theta_band_indices]
-        total_power = np.sum(filtered_psd)
-        tfs.append(total_power)
-
-        gamma_band_indices = np.where((xf >= gr[0]) & (xf <= gr[1]))
-        filtered_psd = psd[gamma_band_indices]
-        total_power = np.sum(filtered_psd)
-        gfs.append(total_power)
+    # All runs in one (run x freqs) array, summed power in theta [3, 12] and gamma [30, 80]
+    stacked = np.array([psds[run] for run in my_runs])
+    power, _ = band_table(
+        stacked, xfs[my_runs[0]], {"theta": (3, 12), "gamma": (30, 80)}, reduce="sum"
+    )
+    tfs = list(power[:, 0])
+    gfs = list(power[:, 1])
     return tfs, gfs
@@ -2,7 +2,7 @@ import numpy as np
 from neuron import h
 import matplotlib.pyplot as plt
 import seaborn as sns
-from scipy.signal import spectrogram
+from .TimeFrequency import batched_spectrogram
 
 
 def extract_voltage_data(population):
@@ -238,16 +238,13 @@ def create_spectrogram(lfp_signal, sampling_rate):
     # Set the desired frequency range (adjust as needed)
     freq_range = (0, 1000)  # Example: Plot frequencies up to 100 Hz
 
-    # Create spectrogram using scipy.signal.spectrogram
-    frequencies, times, Sxx = spectrogram(lfp_signal, fs=sampling_rate, nperseg=256)
-
-    # Find indices corresponding to the specified frequency range
-    freq_indices = np.where(
-        (frequencies >= freq_range[0]) & (frequencies <= freq_range[1])
-    )[0]
+    # Single trial of the batched engine, use batched_spectrogram directly for stacked trials
+    frequencies, times, Sxx = batched_spectrogram(
+        lfp_signal, sampling_rate, nperseg=256, fmax=freq_range[1]
+    )
 
     # Return relevant data for future use
-    return frequencies[freq_indices], times, 10 * np.log10(Sxx[freq_indices, :])
+    return frequencies, times, 10 * np.log10(Sxx[0])
 
 
 def plot_spectrogram(frequencies, times, spectrogram_data):
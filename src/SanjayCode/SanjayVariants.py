@@ -22,12 +22,83 @@ def load(data_path):
     return data
 
 
-def process_data(simData):
-    """Process the data from the simulation containing variants in experiment 04+"""
+# Early stop reasons after which the Basket cells stay silent (see SimRunner.EarlyStop), the
+# trial counts with its nominal duration and a silent tail
+SILENT_STOP_REASONS = ("dpb", "quiescent")
+
+
+def get_trial_duration(data, default=5000):
+    """
+    Duration of a trial in ms for the analyses.
+
+    Trials that were stopped early (see SimRunner.EarlyStop) carry a "trial_meta" entry with
+    the time at which the run ended, all other trials ran until tstop. Trials stopped because
+    the Basket cells went silent (SILENT_STOP_REASONS) count until tstop, as in
+    analyze_trial_depolarization, so their rates include the silent tail.
+    """
+    trial_meta = data.get("trial_meta")
+    if trial_meta is not None:
+        if trial_meta.get("truncated") and trial_meta.get("reason") in SILENT_STOP_REASONS:
+            return trial_meta["tstop"]
+        return trial_meta["t_end"]
+    netParams = data.get("netParams")
+    if netParams is not None:
+        return netParams.simParams.get("tstop", default)
+    return default
+
+
+# Trials shorter than this fraction of the longest trial of a condition are left out of the
+# analyses that stack the trials of a condition (condition_coherence, condition_pac)
+MIN_TRIAL_FRACTION = 0.9
+
+
+def stackable_trials(lengths, min_length=None):
+    """
+    Indices of the trials that are long enough to be stacked with the other trials.
+
+    Stacking cuts all trials to the shortest one, a single truncated trial would shorten the
+    whole condition. Trials shorter than min_length are left out (and reported).
+
+    Parameters:
+    - lengths: list of int, length of every trial in samples
+    - min_length: int, samples, default MIN_TRIAL_FRACTION of the longest trial
+
+    Returns:
+    - list of int, indices of the kept trials
+    """
+    lengths = np.asarray(lengths)
+    if lengths.size == 0:
+        raise ValueError("There are no trials to stack")
+    if min_length is None:
+        min_length = MIN_TRIAL_FRACTION * lengths.max()
+    keep = np.flatnonzero(lengths >= min_length)
+    if keep.size == 0:
+        raise ValueError(f"All {lengths.size} trials are shorter than {min_length:.0f} samples")
+    if keep.size < lengths.size:
+        print(
+            f"{lengths.size - keep.size} of {lengths.size} trials are shorter than "
+            f"{min_length:.0f} samples and are left out"
+        )
+    return keep.tolist()
+
+
+def process_data(
+    simData, simulation_duration=5000, lfp=None, layout=None, psd_method="psd"
+):
+    """Process the data from the simulation containing variants in experiment 04+
+
+    simulation_duration is the simulated time in ms, use get_trial_duration for trials that
+    may have been stopped early. lfp is the LFP stored with the trial (MPI runs, which do not
+    keep the dendritic traces), if None it is computed from the pyramidal cells. layout is the
+    PopulationLayout of the network (default 800 Pyr / 200 Bwb / 200 OLM). psd_method is the
+    estimator of calc_psd ("psd" or "multitaper").
+    """
     from src.SanjayCode import (
         compute_population_firing_rates,
         calc_lfp,
         calc_psd,
+        DEFAULT_LAYOUT,
+        LfpPyramid,
     )
 
     # Define lists to store calculated information
@@ -58,12 +129,12 @@ def process_data(simData):
     mean_theta_power_list = []
 
     # Define cell populations using list comprehensions
-    pyr_cells = [cell for gid, cell in simData.items() if cell._gid < 800]
-    bwb_cells = [cell for gid, cell in simData.items() if 800 <= cell._gid < 1000]
-    olm_cells = [cell for gid, cell in simData.items() if 1000 <= cell._gid < 1200]
+    cells = (layout or DEFAULT_LAYOUT).split(simData)
+    pyr_cells = cells["Pyr"]
+    bwb_cells = cells["Bwb"]
+    olm_cells = cells["OLM"]
 
     # Compute firing rates for each population
-    simulation_duration = 5000  # in milliseconds
     dt = 0.1  # time step in milliseconds
     num_trials = 20  # The number of trials for each condition, number of pickle files in the condition folder
 
@@ -97,11 +168,15 @@ def process_data(simData):
     olm_sem_firing_rates_list.append(olm_sem)
 
     # Compute LFP
-    lfp = calc_lfp(pyr_cells)
+    if lfp is None:
+        lfp = calc_lfp(pyr_cells)
     lfps_list.append(lfp)
+    lfp_pyramid = LfpPyramid(lfp)  # Filtered 10 kHz / 2 kHz / 400 Hz levels
 
     # Compute PSD
-    mean_theta_power, mean_gamma_power, theta_freq, gamma_freq, Pxx = calc_psd(lfp)
+    mean_theta_power, mean_gamma_power, theta_freq, gamma_freq, Pxx, f = calc_psd(
+        lfp_pyramid, method=psd_method, return_frequencies=True
+    )
 
     # Store the calculated information for PSD
     theta_frequencies_list.append(theta_freq)
@@ -121,11 +196,13 @@ def process_data(simData):
         "bwb_sem": bwb_sem_firing_rates_list,
         "olm_sem": olm_sem_firing_rates_list,
         "lfps": lfps_list,
+        "lfp_pyramid": lfp_pyramid,
         "gamma_frequencies": gamma_frequencies_list,
         "theta_frequencies": theta_frequencies_list,
         "mean_gamma_power": mean_gamma_power_list,
         "mean_theta_power": mean_theta_power_list,
         "Pxx": Pxx,
+        "psd_frequencies": f,
     }
 
 
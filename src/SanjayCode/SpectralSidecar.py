@@ -0,0 +1,101 @@
+####################################################################################################
+# Per-trial spectral sidecar.
+#
+# Next to every trial file (01.pkl) a small 01.spectral.npz holds the spectral summary of the
+# trial: the PSD of calc_psd at its fixed frequency bins (0 - 200 Hz), the theta and gamma
+# power and the peak frequencies. The sidecar is written by the runner when the trial is saved
+# or served from the trial cache, or by the first analysis pass (ensure_sidecar) for older
+# trials. Spectral averages and plots
+# read the sidecars (a few kB) instead of loading the traces and recomputing the LFP and PSD.
+#
+# A sidecar uses the keys of the process_data results ("Pxx", "psd_frequencies",
+# "mean_theta_power", ...), so a dataset of sidecars can be passed to the functions that take
+# processed results (calculate_average_psd_per_condition, spectral_table, plot_power_for_variants).
+####################################################################################################
+
+import glob
+import os
+import pickle
+import re
+
+import numpy as np
+
+from .Layout import PopulationLayout
+from .LfpPyramid import LfpPyramid
+from .Plots import calc_lfp, calc_psd
+
+SIDECAR_SUFFIX = ".spectral.npz"
+
+
+def sidecar_path(trial_path):
+    """Path of the sidecar of a trial file, e.g. 01.pkl -> 01.spectral.npz."""
+    return os.path.splitext(trial_path)[0] + SIDECAR_SUFFIX
+
+
+def spectral_summary(lfp):
+    """Spectral summary of an LFP (dt = 0.1 ms) with the keys of process_data."""
+    # From the pyramid as process_data, so the sidecars match the processed results
+    mean_theta_power, mean_gamma_power, theta_freq, gamma_freq, Pxx, f = calc_psd(
+        LfpPyramid(lfp), return_frequencies=True
+    )
+    return {
+        "Pxx": np.asarray(Pxx, dtype=float),
+        "psd_frequencies": np.asarray(f, dtype=float),
+        "mean_theta_power": float(np.squeeze(mean_theta_power)),
+        "mean_gamma_power": float(np.squeeze(mean_gamma_power)),
+        "theta_frequencies": float(theta_freq),
+        "gamma_frequencies": float(gamma_freq),
+    }
+
+
+def write_sidecar(trial_path, lfp):
+    """Compute the spectral summary of the LFP of a trial and write it next to the trial file."""
+    summary = spectral_summary(lfp)
+    path = sidecar_path(trial_path)
+    tmp = f"{path}.{os.getpid()}.tmp.npz"
+    np.savez(tmp, **summary)
+    os.replace(tmp, path)  # Readers never see a partial file
+    return summary
+
+
+def load_sidecar(trial_path):
+    """The spectral summary of a trial, None if it has no sidecar."""
+    path = sidecar_path(trial_path)
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as f:
+        return {key: f[key] if f[key].ndim else f[key].item() for key in f.files}
+
+
+def ensure_sidecar(trial_path):
+    """Load the sidecar of a trial, compute and write it from the trial file if it is missing."""
+    summary = load_sidecar(trial_path)
+    if summary is not None:
+        return summary
+    with open(trial_path, "rb") as f:
+        data = pickle.load(f)
+    lfp = data.get("lfp")
+    if lfp is None:
+        layout = PopulationLayout.from_data(data)
+        lfp = calc_lfp(layout.split(data["simData"])["Pyr"])
+    del data
+    return write_sidecar(trial_path, lfp)
+
+
+def load_sidecar_dataset(data_path, pattern="*.pkl"):
+    """
+    Spectral summaries of all trials of a data folder, condition -> run -> summary.
+
+    Same structure as SanjayVariants.load, but only the sidecars are read (trials without a
+    sidecar are processed once and get one).
+    """
+    dataset = {}
+    for folder in sorted(glob.glob(f"{data_path}/*/")):
+        condition = folder.split("/")[-2]
+        runs = {}
+        for file in sorted(glob.glob(os.path.join(folder, pattern))):
+            match = re.search(r"(\d+)", os.path.basename(file))
+            if match:
+                runs[match.group(1)] = ensure_sidecar(file)
+        dataset[condition] = runs
+    return dataset
@@ -0,0 +1,133 @@
+####################################################################################################
+# Streaming spectral averages over trials.
+#
+# SpectralAccumulator takes the LFPs of a condition one trial at a time (from any loader) and
+# keeps only running sums: the mean LFP and the Welford mean and variance of the rFFT power.
+# The memory does not grow with the number of trials and the source arrays are never modified
+# (the mean is removed in a copy). With power=False only the mean LFP is kept and no FFT is
+# computed per trial (for the spectrum of the average LFP).
+####################################################################################################
+
+import glob
+import os
+import pickle
+
+import numpy as np
+
+from .Layout import PopulationLayout
+from .Plots import calc_lfp
+
+
+class SpectralAccumulator:
+    """
+    Running mean and variance of the power spectrum of equally long trials.
+
+    Parameters:
+    - sampling_rate: float, Hz
+    - scaling: "density" (one-sided PSD, units**2 / Hz) or "raw" (|rfft|**2, as my_psd)
+    - detrend: bool, remove the mean of every trial before the FFT
+    - power: bool, accumulate the power spectra, False keeps only the mean LFP
+    """
+
+    def __init__(self, sampling_rate, scaling="density", detrend=True, power=True):
+        self.sampling_rate = sampling_rate
+        self.scaling = scaling
+        self.detrend = detrend
+        self.power = power
+        self.n = 0
+        self.n_samples = None
+        self._mean_power = None
+        self._m2_power = None
+        self._sum_signal = None
+
+    def _power(self, signal):
+        if self.detrend:
+            signal = signal - signal.mean()  # New array, the trial is not modified
+        power = np.abs(np.fft.rfft(signal)) ** 2
+        if self.scaling == "density":
+            power /= self.sampling_rate * self.n_samples
+            power[1 : (self.n_samples + 1) // 2] *= 2  # One-sided
+        return power
+
+    def add(self, lfp):
+        """Add one trial."""
+        signal = np.asarray(lfp, dtype=float)
+        if self.n_samples is None:
+            self.n_samples = signal.size
+            if self.power:
+                self._mean_power = np.zeros(self.n_samples // 2 + 1)
+                self._m2_power = np.zeros(self.n_samples // 2 + 1)
+            self._sum_signal = np.zeros(self.n_samples)
+        elif signal.size != self.n_samples:
+            raise ValueError(f"Trial has {signal.size} samples, expected {self.n_samples}")
+
+        self.n += 1
+        self._sum_signal += signal
+        if self.power:
+            # Welford update of the mean and the sum of squared deviations
+            power = self._power(signal)
+            delta = power - self._mean_power
+            self._mean_power += delta / self.n
+            self._m2_power += delta * (power - self._mean_power)
+        return self
+
+    def add_all(self, lfps):
+        """Add the trials of an iterable (e.g. a generator that loads one trial at a time)."""
+        for lfp in lfps:
+            self.add(lfp)
+        return self
+
+    @property
+    def frequencies(self):
+        return np.fft.rfftfreq(self.n_samples, 1 / self.sampling_rate)
+
+    def _check_power(self):
+        if not self.power:
+            raise ValueError("The power spectra are not accumulated (power=False)")
+
+    @property
+    def mean(self):
+        """Mean power spectrum over the trials."""
+        self._check_power()
+        return self._mean_power.copy()
+
+    @property
+    def variance(self):
+        """Sample variance of the power spectrum over the trials (nan for one trial)."""
+        self._check_power()
+        if self.n < 2:
+            return np.full_like(self._mean_power, np.nan)
+        return self._m2_power / (self.n - 1)
+
+    @property
+    def sem(self):
+        return np.sqrt(self.variance / self.n)
+
+    @property
+    def mean_signal(self):
+        """Average LFP over the trials."""
+        return self._sum_signal / self.n
+
+    def mean_signal_spectrum(self):
+        """Positive frequencies and the magnitude of the rFFT of the average LFP."""
+        magnitude = np.abs(np.fft.rfft(self.mean_signal))
+        mask = self.frequencies > 0
+        return self.frequencies[mask], magnitude[mask]
+
+
+def iter_trial_lfps(data_path, pattern="*.pkl"):
+    """
+    Yield the LFP of every trial file in a folder, one file in memory at a time.
+
+    The LFP stored with the trial is used if there is one (MPI runs), otherwise it is computed
+    from the pyramidal cells.
+    """
+    for file_path in sorted(glob.glob(os.path.join(data_path, pattern))):
+        with open(file_path, "rb") as f:
+            data = pickle.load(f)
+        lfp = data.get("lfp")
+        if lfp is None:
+            layout = PopulationLayout.from_data(data)
+            lfp = calc_lfp(layout.split(data["simData"])["Pyr"])
+        del data
+        yield lfp
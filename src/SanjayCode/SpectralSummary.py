@@ -0,0 +1,142 @@
+####################################################################################################
+# Vectorized band powers, peak frequencies and power ratios for a whole sweep.
+#
+# The PSDs of all trials of all conditions are stacked into one (condition x trial x freqs)
+# array (missing trials are nan, PSDs with other frequencies are refused or interpolated onto a
+# given grid), the band masks into a (band x freqs) array, and every summary is one masked
+# reduction over the frequency axis, giving (condition x trial x band) tables.
+#
+# The band power follows calc_psd (mean PSD in the band times the band width, sq-mV) and the
+# peak frequency is the frequency of the largest PSD value in the band.
+####################################################################################################
+
+import numpy as np
+
+from .TimeFrequency import BANDS
+
+def stack_psds(dataset, key="Pxx", frequencies=None):
+    """
+    Stack the PSDs of a processed dataset (condition -> run -> process_data results).
+
+    Every trial needs its "psd_frequencies" (stored by process_data and the sidecars). Trials
+    whose PSDs have other frequencies than the first trial (e.g. multitaper PSDs of early stopped
+    trials) raise a ValueError, unless a common grid is given.
+
+    Parameters:
+    - dataset: dict, condition -> run -> results with key and "psd_frequencies"
+    - key: str, the PSD entry of the results
+    - frequencies: array (freqs,), common grid the PSDs are interpolated onto (nan outside the
+      frequencies of a trial), default the frequencies of the first trial (no interpolation)
+
+    Returns:
+    - conditions: list of the condition keys
+    - frequencies: array (freqs,)
+    - psds: array (condition x trial x freqs), nan where a condition has fewer trials
+    """
+    conditions = list(dataset)
+    n_trials = max((len(dataset[condition]) for condition in conditions), default=0)
+    interpolate = frequencies is not None
+    common = np.asarray(frequencies, dtype=float) if interpolate else None
+    psds = None
+    for i, condition in enumerate(conditions):
+        for j, (run, run_data) in enumerate(dataset[condition].items()):
+            psd = np.asarray(run_data[key], dtype=float)
+            trial_frequencies = run_data.get("psd_frequencies")
+            if trial_frequencies is None:
+                raise ValueError(
+                    f"Trial {condition}/{run} has no psd_frequencies, process it again"
+                )
+            trial_frequencies = np.asarray(trial_frequencies, dtype=float)
+            if trial_frequencies.size != psd.size:
+                raise ValueError(
+                    f"Trial {condition}/{run} has {psd.size} PSD values "
+                    f"and {trial_frequencies.size} frequencies"
+                )
+            if psds is None:
+                if not interpolate:
+                    common = trial_frequencies
+                psds = np.full((len(conditions), n_trials, common.size), np.nan)
+            if interpolate:
+                psd = np.interp(common, trial_frequencies, psd, left=np.nan, right=np.nan)
+            elif not np.array_equal(trial_frequencies, common):
+                raise ValueError(
+                    f"Trial {condition}/{run} has a PSD of {psd.size} frequencies, the first "
+                    f"trial of {common.size}, pass a common grid (frequencies)"
+                )
+            psds[i, j] = psd
+    if psds is None:
+        return conditions, np.array([]), np.empty((len(conditions), 0, 0))
+    return conditions, common, psds
+
+
+def band_masks(frequencies, bands=BANDS):
+    """(band x freqs) boolean array, the bands in the order of the dict."""
+    return np.array(
+        [(frequencies >= low) & (frequencies <= high) for low, high in bands.values()]
+    )
+
+
+def band_table(psds, frequencies, bands=BANDS, reduce="integral"):
+    """
+    Band power and peak frequency of every PSD.
+
+    Parameters:
+    - psds: array (... x freqs)
+    - frequencies: array (freqs,)
+    - bands: dict, name -> (low, high) in Hz
+    - reduce: "integral" (mean x band width, as calc_psd) or "sum" (as get_theta_gamma_power)
+
+    Returns:
+    - power: array (... x band)
+    - peak_frequency: array (... x band), nan for all-nan PSDs (missing trials)
+    """
+    masks = band_masks(frequencies, bands)  # band x freqs
+    masked = np.where(masks, psds[..., np.newaxis, :], np.nan)  # ... x band x freqs
+
+    # Missing trials are all nan and stay nan, the frequencies outside a band count as 0
+    power = np.sum(np.where(masks, psds[..., np.newaxis, :], 0), axis=-1)
+    if reduce != "sum":
+        widths = np.array([high - low for low, high in bands.values()])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            power = power / masks.sum(axis=-1) * widths
+
+    valid = ~np.isnan(masked).all(axis=-1)
+    peak_index = np.argmax(np.where(np.isnan(masked), -np.inf, masked), axis=-1)
+    peak_frequency = np.where(valid, frequencies[peak_index], np.nan)
+    return power, peak_frequency
+
+
+def spectral_table(dataset, bands=BANDS, reduce="integral", frequencies=None):
+    """
+    Spectral summary of every trial of a processed dataset.
+
+    frequencies is the common grid of trials with different PSD frequencies (see stack_psds).
+
+    Returns:
+    - dict with "conditions", "bands" (names), "frequencies", "power" and "peak_frequency"
+      (condition x trial x band)
+    """
+    conditions, frequencies, psds = stack_psds(dataset, frequencies=frequencies)
+    power, peak_frequency = band_table(psds, frequencies, bands, reduce)
+    return {
+        "conditions": conditions,
+        "bands": list(bands),
+        "frequencies": frequencies,
+        "power": power,
+        "peak_frequency": peak_frequency,
+    }
+
+
+def band_column(table, quantity, band):
+    """(condition x trial) array of one band, e.g. band_column(table, "power", "theta")."""
+    return table[quantity][..., table["bands"].index(band)]
+
+
+def power_ratio(table, numerator="theta", denominator="gamma"):
+    """(condition x trial) ratio of two band powers."""
+    return band_column(table, "power", numerator) / band_column(table, "power", denominator)
+
+
+def condition_means(table, quantity, band):
+    """Mean over the trials of every condition (nan trials ignored), array (condition,)."""
+    return np.nanmean(band_column(table, quantity, band), axis=1)
@@ -7,6 +7,7 @@
 import matplotlib.pyplot as plt
 import numpy as np
 import seaborn as sns
+from .SpectralStream import SpectralAccumulator
 
 
 def plot_fft_lfp(lfps, sampling_rate):
@@ -85,33 +86,10 @@ def plot_average_fft_lfp(datasets, variant_key, condition_key, sampling_rate):
     - None, this function will plot the Fourier Transform
     """
 
-    sum_lfps = None
-    num_trials = 0
-
-    # Loop through each trial in the specified condition and sum the LFP data
-    for trial_key in datasets[variant_key][condition_key].keys():
-        lfps = datasets[variant_key][condition_key][trial_key]["lfps"][0]
-
-        if sum_lfps is None:
-            sum_lfps = lfps
-        else:
-            sum_lfps += lfps
-
-        num_trials += 1
-
-    # Compute the average LFP
-    avg_lfps = sum_lfps / num_trials
-
-    # Perform FFT on the average LFP
-    avg_fft_values = np.fft.fft(avg_lfps)
-
-    # Generate frequency values
-    frequencies = np.fft.fftfreq(len(avg_fft_values), d=1 / sampling_rate)
-
-    # Only positive frequencies
-    mask = frequencies > 0
-    positive_frequencies = frequencies[mask]
-    positive_magnitude = np.abs(avg_fft_values[mask])
+    # FFT of the average LFP (the stored LFPs are not modified)
+    positive_frequencies, positive_magnitude = calculate_average_fft_lfp(
+        datasets, variant_key, condition_key, sampling_rate
+    )
 
     # Plot
     frequency_range = 80
@@ -131,25 +109,13 @@ def plot_average_fft_lfp(datasets, variant_key, condition_key, sampling_rate):
 
 
 def calculate_average_fft_lfp(datasets, variant_key, condition_key, sampling_rate):
-    sum_lfps = None
-    num_trials = 0
-
-    for trial_key in datasets[variant_key][condition_key].keys():
-        lfps = datasets[variant_key][condition_key][trial_key]["lfps"][0]
-
-        if sum_lfps is None:
-            sum_lfps = lfps
-        else:
-            sum_lfps += lfps
-
-        num_trials += 1
-
-    avg_lfps = sum_lfps / num_trials
-    avg_fft_values = np.fft.fft(avg_lfps)
-    frequencies = np.fft.fftfreq(len(avg_fft_values), d=1 / sampling_rate)
-    mask = frequencies > 0
-
-    return frequencies[mask], np.abs(avg_fft_values[mask])
+    # Running sum in the accumulator, the LFP of the first trial is no longer summed in place.
+    # Only the average LFP is transformed, no power spectrum per trial
+    accumulator = SpectralAccumulator(sampling_rate, power=False)
+    accumulator.add_all(
+        trial["lfps"][0] for trial in datasets[variant_key][condition_key].values()
+    )
+    return accumulator.mean_signal_spectrum()
 
 
 def plot_comparative_ffts(
@@ -194,6 +160,7 @@ def plot_comparative_ffts(
 
 
 def calculate_average_psd_per_condition(dataset):
+    # dataset: condition -> trial -> process_data results or spectral sidecars (load_sidecar_dataset)
     average_psds = {}
     for condition, trials in dataset.items():
         psd_sum = None
@@ -1,16 +1,22 @@
 import matplotlib.pyplot as plt
 import numpy as np
 from scipy.ndimage import gaussian_filter1d
+from .Layout import DEFAULT_LAYOUT
 
 
-def scatter_plot(simData: dict):
+def _plot_gid_ranges(layout):
+    """GID ranges of the populations, with the labels used in the plots."""
+    return {"Pyr": layout.range("Pyr"), "Bwb": layout.range("Bwb"), "Olm": layout.range("OLM")}
+
+
+def scatter_plot(simData: dict, layout=DEFAULT_LAYOUT):
     """
     Scatter plot of spike times for each cell type.
     """
     colors = {"Pyr": "blue", "Olm": "red", "Bwb": "green"}
 
     plt.figure(figsize=(13, 8))
-    gids = {"Pyr": range(800), "Bwb": range(800, 1000), "Olm": range(1000, 1200)}
+    gids = _plot_gid_ranges(layout)
     for k, color in colors.items():
         xs = []
         ys = []
@@ -24,26 +30,22 @@ def scatter_plot(simData: dict):
     plt.title("Pyr-blue | OLM-red | Bwb-green")
 
 
-def print_firing_rate(simData: dict):
+def print_firing_rate(simData: dict, layout=DEFAULT_LAYOUT):
     """
     Print the mean and standard deviation of the firing rates for each cell type.
     """
-    pyr = []
-    bwb = []
-    olm = []
-    for gid, cell in simData.items():
-        if cell._gid < 800:
-            pyr.append(cell.compute_firing_rate())
-        elif 800 <= cell._gid < 1000:
-            bwb.append(cell.compute_firing_rate())
-        elif 1000 <= cell._gid < 1200:
-            olm.append(cell.compute_firing_rate())
+    cells = layout.split(simData)
+    pyr = [cell.compute_firing_rate() for cell in cells["Pyr"]]
+    bwb = [cell.compute_firing_rate() for cell in cells["Bwb"]]
+    olm = [cell.compute_firing_rate() for cell in cells["OLM"]]
     print(f"Pyr :: {np.mean(pyr):.2f} Hz +- {np.std(pyr):.2f} Hz (std)")
     print(f"Bwb :: {np.mean(bwb):.2f} Hz +- {np.std(bwb):.2f} Hz (std)")
     print(f"Olm :: {np.mean(olm):.2f} Hz +- {np.std(olm):.2f} Hz (std)")
 
 
-def find_depolarization_block(simData, cell_range, window=100, timestep=0.1):
+def find_depolarization_block(
+    simData, cell_range, window=100, timestep=0.1, duration=5000
+):
     """
     Find the onset time of the depolarization block across the Basket cell population.
 
@@ -52,13 +54,14 @@ def find_depolarization_block(simData, cell_range, window=100, timestep=0.1):
     cell_range (range): The range of GIDs for the Basket cell type to analyze.
     window (int): The window size (in ms) to consider for depolarization block detection.
     timestep (float): The timestep of the simulation in ms.
+    duration (float): The simulated duration of the trial in ms (shorter if stopped early).
 
     Returns:
     float: The onset time of the depolarization block, if found. None otherwise.
     """
 
     # Create a timeline with all possible time points given the timestep
-    timeline = np.arange(0, 5000, timestep)
+    timeline = np.arange(0, duration, timestep)
 
     # Initialize an array to track the spiking activity at each time point
     spike_activity = np.zeros_like(timeline, dtype=int)
@@ -82,7 +85,7 @@ def find_depolarization_block(simData, cell_range, window=100, timestep=0.1):
 
 
 def plot_spike_activity_DPB(
-    simData, depolarization_onset, window=100, show_ms_input=False
+    simData, depolarization_onset, window=100, show_ms_input=False, layout=DEFAULT_LAYOUT
 ):
     """
     Plots the spike activity of all cell types around the depolarization onset time.
@@ -93,7 +96,7 @@ def plot_spike_activity_DPB(
     window (int): The window size (in ms) around the depolarization onset to plot.
     """
     # Define the GID ranges for each cell type
-    gids = {"Pyr": range(800), "Bwb": range(800, 1000), "Olm": range(1000, 1200)}
+    gids = _plot_gid_ranges(layout)
     colors = {"Pyr": "blue", "Bwb": "green", "Olm": "red"}
 
     # Set up the plot
@@ -173,7 +176,7 @@ def plot_spike_activity_DPB(
 
 
 def convolve_spike_activity_DPB(
-    simData, depolarization_onset, window=100, resolution=1, sigma=1
+    simData, depolarization_onset, window=100, resolution=1, sigma=1, layout=DEFAULT_LAYOUT
 ):
     """
     Calculates and plots the convolved spike activity for each cell population around the depolarization onset.
@@ -185,7 +188,7 @@ def convolve_spike_activity_DPB(
     resolution (int): Temporal resolution (in ms) for spike rate calculation.
     sigma (float): Standard deviation for Gaussian filter used in convolution.
     """
-    gids = {"Pyr": range(800), "Bwb": range(800, 1000), "Olm": range(1000, 1200)}
+    gids = _plot_gid_ranges(layout)
     colors = {"Pyr": "blue", "Bwb": "green", "Olm": "red"}
     time_bins = np.arange(
         depolarization_onset - window,
@@ -228,7 +231,7 @@ def convolve_spike_activity_DPB(
 
 
 def plot_spike_activity_around_block_subset(
-    simData, depolarization_onset, window=30, subset_size=10
+    simData, depolarization_onset, window=30, subset_size=10, layout=DEFAULT_LAYOUT
 ):
     """
     Plots the spike activity of a subset of cells from each type around the depolarization onset time.
@@ -240,11 +243,10 @@ def plot_spike_activity_around_block_subset(
     subset_size (int): The number of cells to plot from each cell type.
     """
     # Define the GID ranges for each cell type and select a subset for each
-    total_cells = {"Pyr": 800, "Bwb": 200, "Olm": 200}  # Total cells in each population
     start_gids = {
-        "Pyr": 700,
-        "Bwb": 800,
-        "Olm": 1000,
+        "Pyr": max(layout.start("Pyr"), layout.end("Pyr") + 1 - 100),  # 700 in the 1x network
+        "Bwb": layout.start("Bwb"),
+        "Olm": layout.start("OLM"),
     }  # Starting GID for each cell type
     gids = {
         cell_type: range(start_gid, start_gid + subset_size)
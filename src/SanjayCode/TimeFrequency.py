@@ -0,0 +1,141 @@
+####################################################################################################
+# Batched time-frequency analysis of stacked LFPs.
+#
+# All trials of a condition are stacked into a (trials x samples) matrix and go through one
+# scipy.signal.spectrogram call along the last axis, which returns a (trials x freqs x windows)
+# tensor. The band powers (theta, gamma, ...) are taken from the same tensor with frequency
+# indices that are computed once per call instead of once per band and trial.
+#
+# For long recordings the windows can be streamed: the signal is cut into chunks that contain a
+# whole number of windows (with the overlap), so the result is the same as the full spectrogram
+# but only one chunk of the tensor is in memory.
+#
+# The window settings follow create_spectrogram (scipy defaults, nperseg = 256).
+####################################################################################################
+
+import numpy as np
+from scipy.signal import spectrogram
+
+# Frequency bands in Hz, theta and gamma as in calc_psd. A band needs windows that are long
+# enough to resolve it (frequency step sampling_rate / nperseg), e.g. nperseg >= 4096 for theta
+# at 10 kHz, a band without frequencies gets nan
+BANDS = {"theta": (3, 12), "gamma": (30, 80)}
+
+
+def stack_lfps(lfps):
+    """(trials x samples) float array of a list of equally long LFPs (or a single LFP)."""
+    lfps = np.asarray(lfps, dtype=float)
+    return lfps[np.newaxis, :] if lfps.ndim == 1 else lfps
+
+
+def band_indices(frequencies, bands):
+    """Indices of the frequencies in every band, dict name -> index array (inclusive ranges)."""
+    return {
+        name: np.where((frequencies >= low) & (frequencies <= high))[0]
+        for name, (low, high) in bands.items()
+    }
+
+
+def band_power(Sxx, frequencies, bands=BANDS, reduce="mean"):
+    """
+    Power time course of every band.
+
+    Parameters:
+    - Sxx: array (... x freqs x windows), power spectral density
+    - frequencies: array, frequencies of the freqs axis
+    - bands: dict, name -> (low, high) in Hz
+    - reduce: "mean" (as mean_power_in_range) or "sum" (as power_in_range)
+
+    Returns:
+    - dict, name -> array (... x windows)
+    """
+    reducer = np.mean if reduce == "mean" else np.sum
+    return {
+        name: reducer(Sxx[..., indices, :], axis=-2)
+        for name, indices in band_indices(frequencies, bands).items()
+    }
+
+
+def batched_spectrogram(
+    lfps, sampling_rate, nperseg=256, noverlap=None, fmax=1000, bands=None, reduce="mean"
+):
+    """
+    Spectrogram of all trials in one call.
+
+    Parameters:
+    - lfps: array (trials x samples) or list of LFPs of equal length
+    - sampling_rate: float, Hz
+    - nperseg, noverlap: window length and overlap in samples (scipy defaults if None)
+    - fmax: float, highest frequency that is kept (Hz)
+    - bands: dict, name -> (low, high), also return the band power time courses
+    - reduce: "mean" or "sum", see band_power
+
+    Returns:
+    - frequencies: array (freqs,)
+    - times: array (windows,), s
+    - Sxx: array (trials x freqs x windows), power spectral density
+    - powers: dict, name -> array (trials x windows), only if bands is given
+    """
+    lfps = stack_lfps(lfps)
+    frequencies, times, Sxx = spectrogram(
+        lfps, fs=sampling_rate, nperseg=nperseg, noverlap=noverlap, axis=-1
+    )
+    keep = frequencies <= fmax
+    frequencies, Sxx = frequencies[keep], Sxx[:, keep, :]
+    if bands is None:
+        return frequencies, times, Sxx
+    return frequencies, times, Sxx, band_power(Sxx, frequencies, bands, reduce)
+
+
+def stream_band_power(
+    lfps,
+    sampling_rate,
+    bands=BANDS,
+    nperseg=256,
+    noverlap=None,
+    windows_per_chunk=512,
+    reduce="mean",
+):
+    """
+    Band power time courses of all trials, computed chunk by chunk.
+
+    Gives the same result as batched_spectrogram(..., bands=bands), but only a
+    (trials x freqs x windows_per_chunk) part of the spectrogram is in memory at a time.
+
+    Yields:
+    - (times, powers) per chunk, times in s, powers a dict name -> array (trials x windows)
+    """
+    lfps = stack_lfps(lfps)
+    if noverlap is None:
+        noverlap = nperseg // 8  # scipy default
+    step = nperseg - noverlap
+    n_windows = (lfps.shape[-1] - noverlap) // step
+
+    for first in range(0, n_windows, windows_per_chunk):
+        last = min(first + windows_per_chunk, n_windows)
+        chunk = lfps[:, first * step : (last - 1) * step + nperseg]
+        frequencies, times, Sxx = spectrogram(
+            chunk, fs=sampling_rate, nperseg=nperseg, noverlap=noverlap, axis=-1
+        )
+        yield times + first * step / sampling_rate, band_power(Sxx, frequencies, bands, reduce)
+
+
+def band_power_timecourses(lfps, sampling_rate, bands=BANDS, **kwargs):
+    """
+    Band power time courses of all trials without keeping the spectrogram, see stream_band_power.
+
+    Returns:
+    - times: array (windows,), s
+    - powers: dict, name -> array (trials x windows)
+    """
+    times = []
+    powers = {name: [] for name in bands}
+    for chunk_times, chunk_powers in stream_band_power(lfps, sampling_rate, bands, **kwargs):
+        times.append(chunk_times)
+        for name in bands:
+            powers[name].append(chunk_powers[name])
+    if not times:
+        return np.array([]), {name: np.empty((stack_lfps(lfps).shape[0], 0)) for name in bands}
+    return np.concatenate(times), {
+        name: np.concatenate(chunks, axis=-1) for name, chunks in powers.items()
+    }
@@ -1,3 +1,4 @@
+from .Layout import *
 from .SanjayUtilities import *
 from .Plots import *
 from .SanjayTrials import *
@@ -7,6 +8,16 @@ from .BatchPlots import *
 from .BatchDataframe import *
 from .BatchPlotsGrid import *
 from .Spectrals import *
+from .TimeFrequency import *
+from .Multitaper import *
+from .SpectralStream import *
+from .LfpPyramid import *
+from .SpectralSummary import *
+from .EventSpectra import *
+from .Coherence import *
+from .FilterBank import *
+from .PhaseAmplitude import *
+from .SpectralSidecar import *
 from .Convolutions import *
 from .Spikes import *
 from .SanjayVoltage import *
@@ -0,0 +1,183 @@
+####################################################################################################
+# Adaptive refinement of the gna x gk x noise sweep around the depolarization block boundary.
+#
+# The sweep starts from a coarse grid. After every level, each (gna, gk) square whose corners
+# disagree on the DPB probability is split in four at half the conductance step. Only the new
+# points are simulated, so the compute goes to the transition region and not to the plateaus.
+####################################################################################################
+
+import numpy as np
+
+DECIMALS = 4  # Rounding of the grid coordinates, keeps the dictionary keys stable
+
+
+def _round_point(point):
+    return tuple(round(float(value), DECIMALS) for value in point)
+
+
+def format_variant(gna, gk, noise):
+    """
+    Create the variant (folder) name of a condition.
+
+    Uses the two decimal format of the existing data folders, and only switches to more
+    decimals for the finer points created by the adaptive refinement.
+    """
+    decimals = 2
+    for value in (gna, gk, noise):
+        while decimals < DECIMALS and round(value, decimals) != round(value, DECIMALS):
+            decimals += 1
+    return f"gna_{gna:.{decimals}f}_gk_{gk:.{decimals}f}_noise_{noise:.{decimals}f}"
+
+
+def coarse_grid(gna_values, gk_values, noise_values):
+    """
+    Return all (gna, gk, noise) points of the starting grid.
+    """
+    return [
+        _round_point((gna, gk, noise))
+        for gk in gk_values
+        for gna in gna_values
+        for noise in noise_values
+    ]
+
+
+def is_boundary_square(corner_probabilities, low=0.1, high=0.9, min_jump=0.2):
+    """
+    Decide if a (gna, gk) square lies on the depolarization block boundary.
+
+    Parameters:
+    - corner_probabilities: list, DPB probability at the four corners of the square
+    - low, high: float, a corner with a probability between low and high is uncertain
+    - min_jump: float, minimal difference between the corners to call it a transition
+
+    Returns:
+    - bool, True if the square needs to be refined
+    """
+    corner_probabilities = np.asarray(corner_probabilities, dtype=float)
+    if np.any(np.isnan(corner_probabilities)):
+        return False
+    uncertain = np.any((corner_probabilities > low) & (corner_probabilities < high))
+    jump = np.ptp(corner_probabilities) >= min_jump
+    return bool(uncertain or jump)
+
+
+def refine_points(probabilities, step, low=0.1, high=0.9, min_jump=0.2):
+    """
+    Find the new points for the next refinement level.
+
+    Parameters:
+    - probabilities: dict, (gna, gk, noise) -> DPB probability of every evaluated point
+    - step: float, conductance step of the current level
+    - low, high, min_jump: float, see is_boundary_square
+
+    Returns:
+    - list of (gna, gk, noise) points at half the step that have not been evaluated yet
+    """
+    probabilities = {_round_point(k): v for k, v in probabilities.items()}
+    half = step / 2
+    new_points = set()
+
+    for gna, gk, noise in probabilities:
+        corners = [
+            _round_point((gna + dx, gk + dy, noise))
+            for dx in (0, step)
+            for dy in (0, step)
+        ]
+        if not all(corner in probabilities for corner in corners):
+            continue  # Square is not (yet) fully evaluated at this level
+
+        if not is_boundary_square(
+            [probabilities[corner] for corner in corners], low, high, min_jump
+        ):
+            continue
+
+        # Edge midpoints and the centre of the square
+        for dx, dy in [(half, 0), (0, half), (half, half), (step, half), (half, step)]:
+            point = _round_point((gna + dx, gk + dy, noise))
+            if point not in probabilities:
+                new_points.add(point)
+
+    return sorted(new_points)
+
+
+def adaptive_sweep(
+    evaluate,
+    gna_values,
+    gk_values,
+    noise_values,
+    levels=2,
+    low=0.1,
+    high=0.9,
+    min_jump=0.2,
+):
+    """
+    Run the adaptive sweep.
+
+    Parameters:
+    - evaluate: callable, takes a list of (gna, gk, noise) points, simulates them and returns
+      a dict point -> DPB probability
+    - gna_values, gk_values, noise_values: arrays, the coarse grid (equally spaced conductances)
+    - levels: int, number of refinement levels after the coarse grid (step / 2**levels at the end)
+    - low, high, min_jump: float, see is_boundary_square
+
+    Returns:
+    - probabilities: dict, (gna, gk, noise) -> DPB probability for all evaluated points
+    - step: float, conductance step of the finest level
+    """
+    step = round(float(np.diff(gna_values)[0]), DECIMALS)
+    if not np.isclose(step, np.diff(gk_values)[0]):
+        raise ValueError("gna and gk need the same coarse step for the refinement")
+
+    points = coarse_grid(gna_values, gk_values, noise_values)
+    print(f"Adaptive sweep: level 0, {len(points)} points (step {step})")
+    probabilities = {_round_point(k): v for k, v in evaluate(points).items()}
+
+    for level in range(1, levels + 1):
+        points = refine_points(probabilities, step, low, high, min_jump)
+        step = step / 2
+        print(f"Adaptive sweep: level {level}, {len(points)} points (step {step})")
+        if not points:
+            break
+        probabilities.update(
+            {_round_point(k): v for k, v in evaluate(points).items()}
+        )
+
+    return probabilities, step
+
+
+def transition_map(probabilities, noise, step):
+    """
+    Build a dense (gk x gna) probability matrix at the finest step for one noise level.
+
+    Points that were never simulated lie inside a square without transition and get the
+    probability of the nearest evaluated point.
+
+    Returns:
+    - gna_axis, gk_axis: arrays, the axes of the map
+    - matrix: array (len(gk_axis), len(gna_axis)), the DPB probability
+    """
+    known = np.array(
+        [
+            (gna, gk, p)
+            for (gna, gk, n), p in probabilities.items()
+            if np.isclose(n, noise)
+        ]
+    )
+    if known.size == 0:
+        raise ValueError(f"No evaluated points for noise level {noise}")
+
+    gna_axis = np.round(
+        np.arange(known[:, 0].min(), known[:, 0].max() + step / 2, step), DECIMALS
+    )
+    gk_axis = np.round(
+        np.arange(known[:, 1].min(), known[:, 1].max() + step / 2, step), DECIMALS
+    )
+    grid_gna, grid_gk = np.meshgrid(gna_axis, gk_axis)
+
+    # Nearest evaluated point for every cell of the map (distance in grid units)
+    distances = (grid_gna[..., None] - known[:, 0]) ** 2 + (
+        grid_gk[..., None] - known[:, 1]
+    ) ** 2
+    matrix = known[np.argmin(distances, axis=-1), 2]
+
+    return gna_axis, gk_axis, matrix
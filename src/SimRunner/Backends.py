@@ -0,0 +1,113 @@
+####################################################################################################
+# CoreNEURON (CPU) execution mode with an equivalence check against the standard NEURON backend.
+#
+# Before switching a sweep to CoreNEURON, run the same trial (same seeds, fresh build) with both
+# backends and compare the spike rasters and the LFP. The report also contains the wall-clock
+# time of both runs.
+#
+# Every backend runs in its own worker process (as the network scales of benchmark_scaling), so
+# the second network is never built next to the cells, gids and CoreNEURON data of the first.
+####################################################################################################
+
+import time
+from multiprocessing import Pool
+
+import numpy as np
+from neuron import h, coreneuron
+
+from .NetworkReuse import spike_raster
+
+
+def configure_coreneuron(enable):
+    """
+    Prepare NEURON for a CPU CoreNEURON run (or switch it off again).
+
+    The Simulator enables CoreNEURON itself when created with coreneuron=True, this makes sure
+    it runs on the CPU and that the data layout CoreNEURON needs is used.
+    """
+    if enable:
+        h.cvode.cache_efficient(1)
+        coreneuron.gpu = False
+    coreneuron.enable = enable
+
+
+def _timed_trial(run_trial, use_coreneuron):
+    t0 = time.time()
+    simData = run_trial(use_coreneuron)
+    return simData, time.time() - t0
+
+
+def compare_backends(
+    run_trial, lfp_from_simData, spike_tol=0.0, lfp_tol=1e-6, initializer=None, initargs=()
+):
+    """
+    Run one trial with both backends and compare the results.
+
+    Parameters:
+    - run_trial: callable (picklable), run_trial(coreneuron) builds a fresh network with fixed
+      seeds, simulates it with the chosen backend and returns simData
+    - lfp_from_simData: callable, returns the LFP of a simData (e.g. calc_lfp of the Pyr cells)
+    - spike_tol: float, maximum allowed difference in spike times (ms)
+    - lfp_tol: float, maximum allowed absolute difference of the LFP (mV)
+    - initializer, initargs: initializer of the worker processes (e.g. the NEURON setup)
+
+    Returns:
+    - report: dict with the comparison and the timing of both backends (build and simulation
+      inside the worker, without the start of the process)
+    """
+    results = {}
+    for name, use_coreneuron in [("neuron", False), ("coreneuron", True)]:
+        # A fresh process per backend, nothing of the first run is left in the second
+        with Pool(processes=1, initializer=initializer, initargs=initargs) as pool:
+            results[name] = pool.apply(_timed_trial, (run_trial, use_coreneuron))
+
+    (simData_nrn, time_nrn), (simData_core, time_core) = (
+        results["neuron"],
+        results["coreneuron"],
+    )
+    gids_nrn, times_nrn = spike_raster(simData_nrn)
+    gids_core, times_core = spike_raster(simData_core)
+
+    same_count = gids_nrn.size == gids_core.size and np.array_equal(
+        gids_nrn, gids_core
+    )
+    max_spike_diff = (
+        float(np.max(np.abs(times_nrn - times_core)))
+        if same_count and times_nrn.size
+        else (0.0 if same_count else np.inf)
+    )
+
+    lfp_nrn = np.asarray(lfp_from_simData(simData_nrn))
+    lfp_core = np.asarray(lfp_from_simData(simData_core))
+    if lfp_nrn.shape == lfp_core.shape:
+        max_lfp_diff = float(np.max(np.abs(lfp_nrn - lfp_core)))
+    else:
+        max_lfp_diff = np.inf
+
+    return {
+        "spikes_neuron": int(times_nrn.size),
+        "spikes_coreneuron": int(times_core.size),
+        "max_spike_time_diff": max_spike_diff,
+        "spikes_equivalent": bool(same_count and max_spike_diff <= spike_tol),
+        "max_lfp_diff": max_lfp_diff,
+        "lfp_equivalent": bool(max_lfp_diff <= lfp_tol),
+        "time_neuron": time_nrn,
+        "time_coreneuron": time_core,
+        "speedup": time_nrn / time_core if time_core > 0 else np.nan,
+    }
+
+
+def print_backend_report(report):
+    print(
+        f"Spikes     :: NEURON {report['spikes_neuron']} | CoreNEURON {report['spikes_coreneuron']}"
+        f" | max diff {report['max_spike_time_diff']:.3g} ms"
+        f" -> {'equivalent' if report['spikes_equivalent'] else 'DIFFERENT'}"
+    )
+    print(
+        f"LFP        :: max diff {report['max_lfp_diff']:.3g} mV"
+        f" -> {'equivalent' if report['lfp_equivalent'] else 'DIFFERENT'}"
+    )
+    print(
+        f"Wall clock :: NEURON {report['time_neuron']:.1f} s | CoreNEURON {report['time_coreneuron']:.1f} s"
+        f" | speedup {report['speedup']:.2f}x"
+    )
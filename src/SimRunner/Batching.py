@@ -0,0 +1,125 @@
+####################################################################################################
+# Multi-trial batching inside one NEURON process.
+#
+# K independent copies of the network (one per trial) are built in the same NEURON instance and
+# simulated together by a single psolve. Afterwards the recordings are split into K trial
+# outputs. The fixed costs per task (process start, mechanism loading, finitialize, ...) are
+# then paid once per K trials.
+#
+# Every copy gets its own gid range: copy k registers its cells with the ParallelContext under
+# gid + k * gid_stride, its BulkNoise (if any) has to use virtual gids in the same range (see
+# batch_gid_offset). The spikes of all copies are recorded with one pc.spike_record and split
+# by range. The gids are released (pc.gid_clear) after the run, the copies are not run again.
+#
+# The copies share one run, so options that stop or change the run (early stopping) cannot be
+# batched. CoreNEURON runs the whole batch if coreneuron=True.
+####################################################################################################
+
+import time
+from neuron import h
+
+from .Backends import configure_coreneuron
+from .Recording import NetworkRecorder
+
+# Size of the gid range of every copy of a batch (cells and BulkNoise virtual gids)
+BATCH_GID_STRIDE = 1_000_000
+
+
+def batch_gid_offset(k, gid_stride=BATCH_GID_STRIDE):
+    """First gid of copy k of a batch, e.g. the base of the virtual gids of its BulkNoise."""
+    return k * gid_stride
+
+
+def _registered_gids(net, offset):
+    # Gids copy k uses: its cells under gid + offset and the virtual gids of its BulkNoise
+    gids = [gid + offset for pop in net.populations.values() for gid in pop.cells]
+    bulk_noise = getattr(net, "bulk_noise", None)
+    if bulk_noise is not None:
+        gids.extend(range(*bulk_noise.gid_range))
+    return gids
+
+
+def run_batch(
+    networks, tstop, v_init=-65, traces=None, gid_stride=BATCH_GID_STRIDE, coreneuron=False
+):
+    """
+    Simulate several independent networks in one run.
+
+    Parameters:
+    - networks: list of created Networks, one per trial
+    - tstop: float, simulation time (ms)
+    - v_init: float, initial membrane potential (mV)
+    - traces: dict, voltage traces to record, see NetworkRecorder
+    - gid_stride: int, size of the gid range of every copy
+    - coreneuron: bool, run the batch with CoreNEURON (CPU)
+
+    Returns:
+    - list of simData-like dicts (gid -> RecordedCell), one per network, with the original gids
+    """
+    pc = h.ParallelContext()
+    for k, net in enumerate(networks):
+        offset = batch_gid_offset(k, gid_stride)
+        gids = _registered_gids(net, offset)
+        if not gids:
+            continue
+        if min(gids) < offset or max(gids) >= offset + gid_stride:
+            raise ValueError(
+                f"Copy {k} uses gids outside its range {offset} .. {offset + gid_stride - 1}"
+            )
+        if len(set(gids)) != len(gids):
+            raise ValueError(f"The virtual gids of copy {k} overlap with its cells")
+        registered = [gid for gid in gids if pc.gid_exists(gid)]
+        if registered:
+            raise ValueError(
+                f"{len(registered)} gids of copy {k} (e.g. {registered[0]}) are already "
+                "registered with the ParallelContext"
+            )
+
+    recorders = [
+        NetworkRecorder(net, gid_offset=batch_gid_offset(k, gid_stride), traces=traces, pc=pc)
+        for k, net in enumerate(networks)
+    ]
+    spike_times = h.Vector()
+    spike_gids = h.Vector()
+    pc.spike_record(-1, spike_times, spike_gids)
+
+    configure_coreneuron(coreneuron)
+    try:
+        pc.set_maxstep(10)  # ms, same as the experiment scripts
+        h.finitialize(v_init)
+        pc.psolve(tstop)
+    finally:
+        if coreneuron:
+            configure_coreneuron(False)
+
+    spikes = (spike_times.as_numpy().copy(), spike_gids.as_numpy().astype(int))
+    simDatas = [recorder.collect(tstop, spikes) for recorder in recorders]
+    pc.gid_clear()  # The next batch of this process registers the same gids
+    return simDatas
+
+
+def benchmark_batch_throughput(run_k, Ks=(1, 2, 4, 8)):
+    """
+    Throughput per core as a function of the batch size K.
+
+    Parameters:
+    - run_k: callable, run_k(K) builds and simulates a batch of K trials in this process
+    - Ks: batch sizes to measure
+
+    The time includes the build of the K networks, not the start of the process and the loading
+    of the mechanisms that batching saves.
+
+    Returns:
+    - dict, K -> {"time": wall-clock time (s), "trials_per_hour": throughput of one core}
+    """
+    results = {}
+    for K in Ks:
+        t0 = time.time()
+        run_k(K)
+        elapsed = time.time() - t0
+        results[K] = {"time": elapsed, "trials_per_hour": K / elapsed * 3600}
+        print(
+            f"K = {K:3d} :: {elapsed:8.1f} s | {elapsed / K:8.1f} s per trial"
+            f" | {results[K]['trials_per_hour']:8.1f} trials per hour per core"
+        )
+    return results
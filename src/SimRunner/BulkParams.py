@@ -0,0 +1,77 @@
+####################################################################################################
+# Bulk modification of mechanism parameters across a population.
+#
+# Scaling a conductance with `for sect in cell.all: for seg in sect: seg.mech.param *= factor`
+# makes several Python -> NEURON calls per segment. scale_population does the same multiplication
+# in one hoc procedure call over a SectionList of the whole population, the loop over the
+# segments runs inside NEURON. The result is identical (the same double multiplication per
+# segment, for (x, 0) visits the same segments as `for seg in sect`). Sections without the
+# mechanism (ismembrane) are skipped, e.g. the dendrites of a cell that only has the channel
+# in the soma and the axon.
+####################################################################################################
+
+import time
+from neuron import h
+
+# hoc procedures per tuple of (mechanism, parameter), defined once per process
+_procedures = {}
+
+
+def _scale_procedure(params):
+    params = tuple(params)
+    if params not in _procedures:
+        name = f"bulk_scale_{len(_procedures)}"
+        body = " ".join(
+            f'if (ismembrane("{mech}")) {{ for (x, 0) {{ {param}_{mech}(x) *= ${i + 2} }} }}'
+            for i, (mech, param) in enumerate(params)
+        )
+        h(f"proc {name}() {{ forsec $o1 {{ {body} }} }}")
+        _procedures[params] = getattr(h, name)
+    return _procedures[params]
+
+
+def population_sections(cells):
+    """SectionList with all sections of the cells."""
+    sections = h.SectionList()
+    for cell in cells:
+        for sect in cell.all:
+            sections.append(sec=sect)
+    return sections
+
+
+def scale_population(cells, factors):
+    """
+    Multiply mechanism parameters in every segment of a population that has the mechanism.
+
+    Parameters:
+    - cells: iterable of cells (e.g. net.populations["Pyr"].cells.values())
+    - factors: dict, (mechanism, parameter) -> multiplicative factor,
+      e.g. {("nacurrent", "g"): 1.2, ("kacurrent", "g"): 0.8}
+    """
+    if not factors:
+        return
+    params = list(factors.keys())
+    _scale_procedure(params)(
+        population_sections(cells), *[float(factors[p]) for p in params]
+    )
+
+
+def time_setup(setup, repeats=3):
+    """
+    Wall-clock time of a per-trial setup step.
+
+    Parameters:
+    - setup: callable, setup() prepares a fresh network and returns a callable that runs the
+      step to time (so the network build is not part of the measurement)
+    - repeats: int, number of fresh networks
+
+    Returns:
+    - list of float, seconds per repeat
+    """
+    times = []
+    for _ in range(repeats):
+        step = setup()
+        t0 = time.time()
+        step()
+        times.append(time.time() - t0)
+    return times
@@ -0,0 +1,97 @@
+####################################################################################################
+# Warm-up checkpoint and branched execution of conditions.
+#
+# The first part of every trial is a transient that the analysis discards (calc_psd skips the
+# first 200 ms). Conditions with the same seeds can share it: the warm-up is simulated once,
+# its state is saved with SaveState, and every condition continues from the saved state after
+# its parameters are applied. Only parameters that can be changed mid-run may differ between
+# the branches, see BRANCHABLE_PARAMETERS.
+#
+# Notes:
+#   - The warm-up runs with the parameters of the first condition, the condition of a branch
+#     only applies from the branch point on. The spikes of the warm-up are therefore not part
+#     of a branch (collect drops them and sets t_start, the firing rates count from there),
+#     the traces are kept whole for the LFP analyses, which discard the first 200 ms anyway.
+#   - SaveState does not contain the random streams of the NetStims. The caller restarts them
+#     after every branch with ReusableNetwork.apply_condition (branch does not touch them), so
+#     all branches of a checkpoint get the same noise after the branch point. It differs from
+#     the noise of an unbranched run, the trials are tagged with BRANCHED_STREAMS.
+#   - The recording vectors are cut back to their length at the checkpoint.
+####################################################################################################
+
+from neuron import h
+
+# Parameters of a condition (keys of nps) that can be changed at the branch point, and why
+BRANCHABLE_PARAMETERS = {
+    "cell_mod": "conductances (range PARAMETERs, no state), set on the segments at the branch",
+    "olm_pyr_weight": "NetCon weights, used for the events delivered after the branch",
+    "pyr_noise_scale": "NetCon weights of the external noise, as olm_pyr_weight",
+}
+
+# trial_meta["noise_streams"] of branched trials: restarted at the branch point, not at t = 0
+BRANCHED_STREAMS = "random123_restarted_at_branch"
+
+# Keys of nps that do not change the simulation
+BOOKKEEPING_PARAMETERS = {"data_path", "profile", "trials", "start_seed", "output"}
+
+
+def check_branchable(nps_reference, nps):
+    """
+    Raise a ValueError if nps differs from nps_reference in a parameter that cannot be branched.
+
+    Not branchable are e.g. the network size (scale), the seeds, the stimulus timing, early
+    stopping and the backend: they change the network or need to be set before finitialize.
+    """
+    keys = set(nps_reference) | set(nps)
+    different = [
+        key
+        for key in sorted(keys - BOOKKEEPING_PARAMETERS - set(BRANCHABLE_PARAMETERS))
+        if nps_reference.get(key) != nps.get(key)
+    ]
+    if different:
+        raise ValueError(f"Cannot branch conditions that differ in {different}")
+
+
+class WarmupCheckpoint:
+    """
+    Simulate a warm-up once and branch conditions from its final state.
+
+    Parameters:
+    - t_warmup: float, ms, end of the shared warm-up
+    - recorder: NetworkRecorder of the network, its vectors are cut back at every branch
+    """
+
+    def __init__(self, t_warmup, recorder):
+        self.t_warmup = t_warmup
+        self.recorder = recorder
+        self.state = None
+        self._sizes = None
+
+    def _vectors(self):
+        vectors = [self.recorder.spike_times, self.recorder.spike_gids]
+        for traces in self.recorder._vectors.values():
+            vectors.extend(traces.values())
+        return vectors
+
+    def run_warmup(self, v_init=-65):
+        """Simulate until t_warmup and save the state."""
+        h.finitialize(v_init)
+        h.continuerun(self.t_warmup)
+        self.state = h.SaveState()
+        self.state.save()
+        self._sizes = [int(vec.size()) for vec in self._vectors()]
+
+    def branch(self):
+        """
+        Restore the checkpoint. Apply the condition afterwards (ReusableNetwork.apply_condition,
+        which also restarts the NetStim streams) and continue with h.continuerun.
+        """
+        if self.state is None:
+            raise RuntimeError("run_warmup has to be called before branch")
+        self.state.restore()
+        for vec, size in zip(self._vectors(), self._sizes):
+            vec.resize(size)
+
+    def collect(self, tstop):
+        """simData of the current branch, without the spikes of the shared warm-up."""
+        return self.recorder.collect(tstop, t_start=self.t_warmup)
@@ -0,0 +1,225 @@
+####################################################################################################
+# MPI-distributed single-network runs with the ParallelContext.
+#
+# Every rank creates only its own cells (round-robin: gid % nhost == rank) from the netParams,
+# nothing of the cells of the other ranks is built, so the build time and the memory per rank
+# drop with the number of ranks:
+#   - the gids are assigned per population in the order of the cellParams (as the Network),
+#     the cell positions of all cells are drawn on every rank (one array per population),
+#   - the local gids are registered with the ParallelContext,
+#   - "many_to_one" connections draw the sources of every target cell from a stream of
+#     (conn seed, connection, target gid), so the rank of the target alone creates them, with
+#     pc.gid_connect (the spikes of cells on other ranks come through the spike exchange),
+#   - the NetStims of a cell use the Random123 ids (gid, stim seed, stimulus seed).
+# All streams are per gid, the trial is the same for any number of ranks. The connectivity and
+# the noise follow the rules of the netParams, but are not the realization of Network.create
+# (whose draws depend on the build order), so the trials are written apart from serial trials.
+#
+# The spikes and the summed LFP of the ranks are gathered on rank 0, which writes the trial in
+# the usual format (RecordedCell objects plus the reduced "lfp").
+#
+# Run with e.g. `mpirun -n 4 python Exp05_External_noise.py`.
+####################################################################################################
+
+import numpy as np
+from neuron import h
+
+from .NetworkReuse import _conn_populations, _point_process
+from .Recording import RecordedCell, split_spikes
+
+# trial_meta["noise_streams"] of distributed trials
+DISTRIBUTED_STREAMS = "random123_per_gid"
+
+
+class LocalPopulation:
+    """The cells of a population that live on this rank, gid -> cell (as Network populations)."""
+
+    def __init__(self, name, start, size):
+        self.name = name
+        self.start = start
+        self.size = size
+        self.cells = {}
+
+
+class LocalNetwork:
+    """
+    The part of the network of netParams that lives on one rank.
+
+    Parameters:
+    - netParams: the NetParams of the trial (cellParams, connParams, stimParams, seeds)
+    - pc: the ParallelContext
+    - spike_threshold: float, mV, threshold of the spike detectors
+    """
+
+    def __init__(self, netParams, pc, spike_threshold=0):
+        self.netParams = netParams
+        self.pc = pc
+        self.rank = int(pc.id())
+        self.nhost = int(pc.nhost())
+        self.spike_threshold = spike_threshold
+        self.detectors = []
+        self.netcons = []
+        self.netstims = []
+
+        self.populations = {}
+        start = 0
+        for name, params in netParams.cellParams.items():
+            self.populations[name] = LocalPopulation(name, start, params["nCells"])
+            start += params["nCells"]
+        self.n_cells = start
+
+        self._create_cells()
+        self._connect()
+        self._stimulate()
+
+    def owner(self, gid):
+        return gid % self.nhost  # Round-robin over the ranks
+
+    def _create_cells(self):
+        for k, (name, params) in enumerate(self.netParams.cellParams.items()):
+            pop = self.populations[name]
+            rng = np.random.default_rng([int(self.netParams.seeds["cell"]), k])
+            positions = np.column_stack(
+                [rng.uniform(*params[axis], pop.size) for axis in ("xrange", "yrange", "zrange")]
+            )
+            for i in range(pop.size):
+                gid = pop.start + i
+                if self.owner(gid) != self.rank:
+                    continue
+                x, y, z = positions[i]
+                cell = params["Cell"](x=x, y=y, z=z, id=gid)
+                pop.cells[gid] = cell
+
+                if self.pc.gid_exists(gid):
+                    raise RuntimeError(f"gid {gid} is already registered with the ParallelContext")
+                self.pc.set_gid2node(gid, self.rank)
+                detector = h.NetCon(cell.soma(0.5)._ref_v, None, sec=cell.soma)
+                detector.threshold = self.spike_threshold
+                self.pc.cell(gid, detector)
+                self.detectors.append(detector)
+
+    def _connect(self):
+        for k, (name, conn) in enumerate(self.netParams.connParams.items()):
+            if conn.get("method", "many_to_one") != "many_to_one":
+                raise ValueError(f"{name}: only many_to_one connections can be distributed")
+            source, target = _conn_populations(name)
+            source = self.populations[source]
+            count = min(conn["count"], source.size)
+            for gid, cell in self.populations[target].cells.items():
+                rng = np.random.default_rng([int(self.netParams.seeds["conn"]), k, gid])
+                syn = _point_process(cell.__dict__[conn["synapse"]])
+                for source_gid in source.start + rng.choice(source.size, count, replace=False):
+                    nc = self.pc.gid_connect(int(source_gid), syn)
+                    nc.weight[0] = conn["weight"]
+                    nc.delay = conn.get("delay", 1)
+                    self.netcons.append(nc)
+
+    def _stimulate(self):
+        cells = {gid: cell for pop in self.populations.values() for gid, cell in pop.cells.items()}
+        stim_seed = int(self.netParams.seeds["stim"])
+        for name in sorted(self.netParams.stimParams):
+            params = self.netParams.stimParams[name]
+            if params.get("source", "NetStim") != "NetStim":
+                raise ValueError(f"{name}: only NetStim stimuli can be distributed")
+            stim, conn = params["stim"], params["conn"]
+            for gid in sorted(set(params["targets"]) & set(cells)):
+                netstim = h.NetStim()
+                netstim.interval = stim["interval"]
+                netstim.number = stim["number"]
+                netstim.start = stim.get("start", 0)
+                netstim.noise = stim.get("noise", 0)
+                netstim.noiseFromRandom123(gid, stim_seed, int(params.get("seed", 0)))
+                nc = h.NetCon(netstim, _point_process(cells[gid].__dict__[conn["target"]]))
+                nc.weight[0] = conn["weight"]
+                nc.delay = conn.get("delay", 1)
+                self.netstims.append(netstim)
+                self.netcons.append(nc)
+
+
+class DistributedNetwork:
+    """
+    Build the network of netParams distributed over the MPI ranks.
+
+    Parameters:
+    - netParams: the NetParams of the trial (the same on every rank)
+    - spike_threshold: float, mV, threshold of the spike detectors
+    - pc: the ParallelContext, a new handle is made if None
+
+    The created part of the network is self.net (populations with the local cells only), the
+    condition independent modifications (clamps, scaled conductances) are applied to it as to
+    a created Network.
+    """
+
+    def __init__(self, netParams, spike_threshold=0, pc=None):
+        self.pc = pc if pc is not None else h.ParallelContext()
+        self.rank = int(self.pc.id())
+        self.nhost = int(self.pc.nhost())
+        self.net = LocalNetwork(netParams, self.pc, spike_threshold)
+        self.cells = {
+            gid: cell
+            for pop in self.net.populations.values()
+            for gid, cell in pop.cells.items()
+        }
+        self.local_gids = sorted(self.cells)
+
+    def run(self, tstop, v_init=-65, lfp_population="Pyr"):
+        """
+        Simulate the distributed network and gather the results on rank 0.
+
+        Returns:
+        - on rank 0: (simData, lfp), simData is gid -> RecordedCell with the spikes of all
+          cells, lfp the mean Adend3 - Bdend voltage over all cells of lfp_population
+        - on the other ranks: (None, None)
+        """
+        pc = self.pc
+        spike_times = h.Vector()
+        spike_gids = h.Vector()
+        pc.spike_record(-1, spike_times, spike_gids)
+
+        traces = []
+        for cell in self.net.populations[lfp_population].cells.values():
+            adend3, bdend = h.Vector(), h.Vector()
+            adend3.record(cell.Adend3(0.5)._ref_v)
+            bdend.record(cell.Bdend(0.5)._ref_v)
+            traces.append((adend3, bdend))
+
+        pc.set_maxstep(10)  # ms, same as the experiment scripts
+        h.finitialize(v_init)
+        pc.psolve(tstop)
+
+        # Local part of the LFP, reduced on rank 0
+        lfp_sum = None
+        for adend3, bdend in traces:
+            if lfp_sum is None:
+                lfp_sum = np.zeros(int(adend3.size()))
+            lfp_sum += adend3.as_numpy() - bdend.as_numpy()
+
+        gathered = pc.py_gather(
+            (
+                self.local_gids,
+                spike_times.as_numpy().copy(),
+                spike_gids.as_numpy().copy(),
+                lfp_sum,
+                len(traces),
+            ),
+            0,
+        )
+        pc.barrier()
+        if self.rank != 0:
+            return None, None
+
+        all_gids = sorted(gid for part in gathered for gid in part[0])
+        times = np.concatenate([part[1] for part in gathered])
+        gids = np.concatenate([part[2] for part in gathered])
+        spikes = split_spikes(times, gids, all_gids)
+        simData = {gid: RecordedCell(gid, spikes[gid], tstop) for gid in all_gids}
+
+        lfp = sum(part[3] for part in gathered if part[3] is not None)
+        lfp = lfp / sum(part[4] for part in gathered)
+        return simData, lfp
+
+    def clear(self):
+        """Release the gids, so the next trial can be distributed."""
+        self.pc.gid_clear()
+        self.net = None
+        self.cells = {}
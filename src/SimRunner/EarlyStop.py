@@ -0,0 +1,143 @@
+####################################################################################################
+# Early termination of a trial once the outcome is decided.
+#
+# The monitor records the spikes of the monitored populations while the simulation runs and
+# checks a streaming criterion every `interval` ms with a cvode event. When a criterion holds,
+# h.stoprun is set, which ends the run of the standard run system (run/continuerun) at the
+# current time step. The truncation is written to the trial metadata.
+#
+# hoc keeps the FInitializeHandler (and through it the monitor) alive, so a monitor has to be
+# closed after its run, otherwise it would stop the runs of the next trials in the same process.
+#
+# Example policy, stored in nps["early_stop"]:
+#   {"criteria": ["dpb"], "interval": 100, "window": 500, "min_time": 500}
+####################################################################################################
+
+import numpy as np
+from neuron import h
+
+DEFAULT_POLICY = {
+    "criteria": ["dpb"],  # Any of "dpb", "quiescent", "burst"
+    "interval": 100,  # ms between two checks
+    "window": 500,  # ms of silence before the DPB / quiescent outcome is decided
+    "min_time": 500,  # ms, no checks before this time (transient)
+    "dpb_population": "Bwb",  # Population that goes silent in depolarization block
+    "burst_population": "Pyr",
+    "burst_window": 5,  # ms, see Burst.detect_bursts
+    "burst_cells": 3,  # Minimum number of active cells in burst_window
+    "spike_threshold": 0,  # mV, same threshold as the connections
+}
+
+# Outcomes after which the monitored population stays silent until the end of the trial.
+# For these the unsimulated tail can be treated as silence by the analysis.
+SILENT_TAIL_REASONS = ("dpb", "quiescent")
+
+
+class EarlyStopMonitor:
+    """
+    Streaming DPB / burst criterion that stops the run once the outcome of the trial is known.
+
+    Create the monitor after the network is built and before the simulation is run, and
+    close it after the run.
+    """
+
+    def __init__(self, net, policy=None):
+        self.policy = dict(DEFAULT_POLICY)
+        self.policy.update(policy or {})
+        self.stopped_at = None
+        self.reason = None
+        self.closed = False
+
+        self.populations = {}  # population name -> set of gids
+        self._netcons = []
+        self.spike_times = h.Vector()
+        self.spike_gids = h.Vector()
+
+        for popname, pop in net.populations.items():
+            self.populations[popname] = set(pop.cells.keys())
+            for gid, cell in pop.cells.items():
+                nc = h.NetCon(cell.soma(0.5)._ref_v, None, sec=cell.soma)
+                nc.threshold = self.policy["spike_threshold"]
+                nc.record(self.spike_times, self.spike_gids, gid)
+                self._netcons.append(nc)
+
+        self._fih = h.FInitializeHandler(1, self._init)
+
+    def close(self):
+        """
+        Detach the monitor from NEURON: the init handler, the spike NetCons and the pending
+        checks (the cvode events stay in the queue until the next finitialize, but no longer
+        stop the run). The results (stopped_at, reason, metadata) stay available.
+        """
+        self.closed = True
+        self._fih = None
+        for nc in self._netcons:
+            nc.record()  # Stop recording into the vectors
+            nc.active(False)
+        self._netcons = []
+
+    def _init(self):
+        if self.closed:
+            return
+        self.stopped_at = None
+        self.reason = None
+        h.cvode.event(max(self.policy["min_time"], self.policy["interval"]), self._check)
+
+    def _spikes_since(self, t_from, popname):
+        times = self.spike_times.as_numpy()
+        gids = self.spike_gids.as_numpy()
+        recent = times > t_from
+        if popname is None:
+            return times[recent], gids[recent]
+        in_pop = np.isin(gids[recent], list(self.populations[popname]))
+        return times[recent][in_pop], gids[recent][in_pop]
+
+    def evaluate(self, t):
+        """Return the name of the first criterion that holds at time t, None otherwise."""
+        window = self.policy["window"]
+        for criterion in self.policy["criteria"]:
+            if criterion == "dpb":
+                times, _ = self._spikes_since(t - window, self.policy["dpb_population"])
+                if t >= window and times.size == 0:
+                    return criterion
+            elif criterion == "quiescent":
+                times, _ = self._spikes_since(t - window, None)
+                if t >= window and times.size == 0:
+                    return criterion
+            elif criterion == "burst":
+                burst_window = self.policy["burst_window"]
+                times, gids = self._spikes_since(
+                    t - self.policy["interval"], self.policy["burst_population"]
+                )
+                # Number of distinct active cells in every sliding window of burst_window ms
+                order = np.argsort(times)
+                times, gids = times[order], gids[order]
+                ends = np.searchsorted(times, times + burst_window)
+                for start, end in zip(range(len(times)), ends):
+                    if np.unique(gids[start:end]).size >= self.policy["burst_cells"]:
+                        return criterion
+            else:
+                raise ValueError(f"Unknown early stop criterion: {criterion}")
+        return None
+
+    def _check(self):
+        if self.closed:
+            return
+        reason = self.evaluate(h.t)
+        if reason is not None:
+            self.stopped_at = h.t
+            self.reason = reason
+            h.stoprun = 1
+            print(f"Early stop at {h.t:.1f} ms: {reason}")
+            return
+        h.cvode.event(h.t + self.policy["interval"], self._check)
+
+    def metadata(self, tstop):
+        """Trial metadata describing the (possibly truncated) duration of the run."""
+        return {
+            "tstop": tstop,
+            "t_end": self.stopped_at if self.stopped_at is not None else tstop,
+            "truncated": self.stopped_at is not None,
+            "reason": self.reason,
+            "early_stop": self.policy,
+        }
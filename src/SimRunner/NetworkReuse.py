@@ -0,0 +1,244 @@
+####################################################################################################
+# Reuse a built network across conditions that share the same seeds.
+#
+# Trial e gets the same (cell_seed, conn_seed, stim_seed) in every condition of a sweep, only the
+# conductances and the connection / noise weights differ. Instead of rebuilding the network for
+# every condition, the network is built once per seed tuple and for every condition:
+#   - the scaled conductances are set from the stored baseline values (base * factor, the same
+#     floating point operation as the `*=` on a fresh network),
+#   - the NetCon weights are set to the weight of their netParams entry for the new condition,
+#   - the random streams of the NetStims are restarted with fixed ids (noiseFromRandom123, also
+#     after every WarmupCheckpoint.branch), so every condition gets the same noise and no
+#     stream continues from the previous condition,
+#   - the state is reset by finitialize when the simulation is run.
+#
+# A NetCon belongs to the netParams entry of its source population, target population and target
+# synapse. Entries that share all three (e.g. "OLM->Pyr GABA" and "OLM->Pyr GABA 2") are told
+# apart by the order of creation: on every target synapse the first `count` NetCons belong to the
+# first entry, the next ones to the second entry, etc.
+#
+# The restarted streams differ from the streams of the build. Every fresh build that should give
+# the same trial as a reused network restarts its streams in the same way (restart_noise), the
+# trials are tagged with NOISE_STREAMS. Use verify_reuse to check that the spikes are
+# bit-identical.
+####################################################################################################
+
+import numpy as np
+from neuron import h
+
+# trial_meta["noise_streams"] of trials whose NetStim streams were restarted by reseed_netstims
+NOISE_STREAMS = "random123_restarted"
+
+
+def _point_process(synapse):
+    """The NEURON point process of a synapse of a cell (wrapper objects keep it in .syn)."""
+    return getattr(synapse, "syn", synapse)
+
+
+def _conn_populations(conn_name):
+    """Source and target population from a connParams name, e.g. "Pyr->Bwb NMDA"."""
+    source, rest = conn_name.split("->")
+    return source.strip(), rest.split()[0]
+
+
+class ReusableNetwork:
+    """
+    A built network that can be switched to another condition without rebuilding it.
+
+    Parameters:
+    - net: the created Network
+    - netParams: the NetParams the network was created with
+    - conductances: dict, population -> list of (mechanism, parameter) that are scaled per condition
+    """
+
+    def __init__(self, net, netParams, conductances):
+        self.net = net
+        self.netParams = netParams
+        self._index_conductances(conductances)
+        self._index_netcons()
+
+    def _index_conductances(self, conductances):
+        # Baseline values of the unscaled network, per population and (mechanism, parameter)
+        self.baselines = {}
+        for popname, params in conductances.items():
+            for mech, param in params:
+                segments = [
+                    seg
+                    for cell in self.net.populations[popname].cells.values()
+                    for sect in cell.all
+                    if sect.has_membrane(mech)  # As scale_population
+                    for seg in sect
+                ]
+                base = [getattr(getattr(seg, mech), param) for seg in segments]
+                self.baselines[(popname, mech, param)] = (segments, base)
+
+    def _index_netcons(self):
+        # Which population / synapse every point process and section belongs to
+        synapse_names = {conn["synapse"] for conn in self.netParams.connParams.values()}
+        synapse_names |= {
+            stim["conn"]["target"] for stim in self.netParams.stimParams.values()
+        }
+        targets = {}
+        sections = {}
+        for popname, pop in self.net.populations.items():
+            for cell in pop.cells.values():
+                for sect in cell.all:
+                    sections[sect.name()] = popname
+                for syn in synapse_names:
+                    if syn in cell.__dict__:
+                        targets[_point_process(cell.__dict__[syn]).hname()] = (
+                            popname,
+                            syn,
+                        )
+
+        # netParams entries and their NetCons per target synapse, per
+        # (kind, source population, target population, synapse), in creation order
+        candidates = {}
+        for name, conn in self.netParams.connParams.items():
+            source, target = _conn_populations(name)
+            key = ("conn", source, target, conn["synapse"])
+            candidates.setdefault(key, []).append((name, conn.get("count", 1)))
+        for name, stim in self.netParams.stimParams.items():
+            target = None
+            for popname, pop in self.net.populations.items():
+                if set(stim["targets"]) & set(pop.cells.keys()):
+                    target = popname
+            key = ("stim", None, target, stim["conn"]["target"])
+            candidates.setdefault(key, []).append((name, 1))
+
+        # NetCons of the network per key and target point process (h.List is in creation order)
+        groups = {}
+        for nc in h.List("NetCon"):
+            syn = nc.syn()
+            if syn is None or syn.hname() not in targets:
+                continue
+            target, synname = targets[syn.hname()]
+            preseg = nc.preseg()
+            if preseg is None and nc.pre() is None:
+                continue  # Connected to a gid (BulkNoise), the weights are set by its owner
+            if preseg is not None:
+                key = ("conn", sections.get(preseg.sec.name()), target, synname)
+            else:
+                key = ("stim", None, target, synname)
+            groups.setdefault(key, {}).setdefault(syn.hname(), []).append(nc)
+
+        # Match every NetCon to the netParams entry it was created from
+        self.netcons = []
+        self.netstims = []
+        for key, per_synapse in groups.items():
+            entries = candidates.get(key, [])
+            if not entries:
+                raise ValueError(f"NetCons {key} have no netParams entry")
+            for netcons in per_synapse.values():
+                if len(entries) == 1:
+                    names = [entries[0][0]] * len(netcons)
+                else:
+                    names = [name for name, count in entries for _ in range(count)]
+                    if len(names) != len(netcons):
+                        raise ValueError(
+                            f"Cannot split the {len(netcons)} NetCons {key} of a synapse "
+                            f"over the entries {[name for name, _ in entries]}"
+                        )
+                self.netcons.extend(
+                    (nc, key[0], name) for nc, name in zip(netcons, names)
+                )
+
+        # NetStims of the network, in the order of their NetCons
+        seen = set()
+        for nc, kind, _ in self.netcons:
+            stim = nc.pre()
+            if kind == "stim" and stim is not None and stim.hname() not in seen:
+                seen.add(stim.hname())
+                self.netstims.append(stim)
+
+    @staticmethod
+    def _weight(netParams, kind, name):
+        if kind == "conn":
+            return netParams.connParams[name]["weight"]
+        return netParams.stimParams[name]["conn"]["weight"]
+
+    def apply_condition(self, netParams, cell_mod, stream_seed=None):
+        """
+        Switch the network to another condition.
+
+        Parameters:
+        - netParams: the NetParams of the new condition (only the weights are used)
+        - cell_mod: dict, (population, mechanism, parameter) -> multiplicative factor
+        - stream_seed: int, id of the NetStim random streams (default the stim seed of netParams)
+        """
+        for key, (segments, base) in self.baselines.items():
+            popname, mech, param = key
+            factor = cell_mod.get(key, 1.0)
+            for seg, value in zip(segments, base):
+                setattr(getattr(seg, mech), param, value * factor)
+
+        for nc, kind, name in self.netcons:
+            nc.weight[0] = self._weight(netParams, kind, name)
+
+        bulk_noise = getattr(self.net, "bulk_noise", None)
+        if bulk_noise is not None:
+            bulk_noise.set_weights(netParams.stimParams)
+
+        if stream_seed is None:
+            stream_seed = netParams.seeds["stim"]
+        reseed_netstims(self.netstims, stream_seed)
+
+        self.netParams = netParams
+
+
+def reseed_netstims(netstims, stream_seed):
+    """
+    Restart the random streams of the NetStims with the ids (index, stream_seed, 1).
+
+    Parameters:
+    - netstims: list of NetStims, e.g. ReusableNetwork.netstims
+    - stream_seed: int, e.g. the stim seed of the trial
+    """
+    for i, stim in enumerate(netstims):
+        stim.noiseFromRandom123(i, int(stream_seed), 1)
+
+
+def restart_noise(net, netParams, stream_seed=None):
+    """
+    Restart the NetStim streams of a freshly built network as apply_condition does.
+
+    Parameters:
+    - net: the created Network
+    - netParams: the NetParams the network was created with
+    - stream_seed: int, id of the streams (default the stim seed of netParams)
+    """
+    if stream_seed is None:
+        stream_seed = netParams.seeds["stim"]
+    reseed_netstims(ReusableNetwork(net, netParams, {}).netstims, stream_seed)
+
+
+def spike_raster(simData):
+    """All spikes of a trial as (gids, times) arrays, sorted by gid and time."""
+    gids = []
+    times = []
+    for gid in sorted(simData.keys()):
+        spike_times = np.asarray(simData[gid].spike_times)
+        gids.append(np.full(spike_times.shape, gid))
+        times.append(spike_times)
+    if not gids:
+        return np.array([]), np.array([])
+    return np.concatenate(gids), np.concatenate(times)
+
+
+def verify_reuse(simData_fresh, simData_reused):
+    """
+    Check that a reused network gives bit-identical spikes to a freshly built network.
+
+    Returns:
+    - bool, True if the spike rasters are identical
+    """
+    gids_fresh, times_fresh = spike_raster(simData_fresh)
+    gids_reused, times_reused = spike_raster(simData_reused)
+    identical = np.array_equal(gids_fresh, gids_reused) and np.array_equal(
+        times_fresh, times_reused
+    )
+    if not identical:
+        print(
+            f"Reused network differs: {len(times_fresh)} vs {len(times_reused)} spikes"
+        )
+    return identical
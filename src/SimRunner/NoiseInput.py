@@ -0,0 +1,157 @@
+####################################################################################################
+# Bulk injection of the external synaptic noise.
+#
+# Instead of one NetStim (and its Python setup) per cell and stimulus, the event times of a
+# whole population are drawn as one array with numpy and all events of the network are played
+# by a single PatternStim. The targets are connected to virtual gids (one per cell and stimulus,
+# above the gids of the network) with pc.gid_connect, PatternStim delivers the events of a
+# virtual gid to its NetCons (fake_output).
+#
+# The intervals follow the NetStim definition (interval, number, start, noise), the draws come
+# from numpy instead of the Random123 streams of the NetStims, so the noise is statistically
+# the same but not bit-identical to the NetStim input.
+#
+# pc.gid_clear (e.g. SpikeRecorder.clear after a spike-only run) also removes the gid_connect
+# NetCons, call connect to restore the noise of a network that is run again.
+#
+# Memory: all events of the run are played from one event list, PatternStim takes its copy at
+# play and ends its event chain when the list is used up, so the list cannot be refilled in
+# chunks during the run. The events are instead drawn in blocks of CELLS_PER_BLOCK cells (the
+# float64 draws of a block are the only full precision arrays) and kept as float32 times
+# (< 1 us rounding at 5 s, far below dt) and int32 gids until they are handed to the
+# PatternStim vectors, about 20 instead of 80 bytes per event at the peak.
+####################################################################################################
+
+import numpy as np
+from neuron import h
+
+from .NetworkReuse import _point_process
+
+# Cells per block of draws in netstim_event_times
+CELLS_PER_BLOCK = 64
+
+
+def netstim_event_times(n_cells, stim, tstop, rng):
+    """
+    Event times of n_cells independent NetStims with the parameters stim, until tstop.
+
+    Parameters:
+    - n_cells: int
+    - stim: dict with interval, number, start and noise (as in the stimParams)
+    - tstop: float, ms
+    - rng: numpy Generator
+
+    Returns:
+    - (times, cell_index): flat arrays of the event times (float32) and the cell of every
+      event (int32), in the order of the cells
+    """
+    interval = float(stim["interval"])
+    noise = float(stim.get("noise", 0))
+    start = float(stim.get("start", 0))
+    number = int(stim.get("number", 1e9))
+    t_end = min(float(stim.get("end", tstop)), tstop)
+    if n_cells == 0 or number <= 0 or start > t_end:
+        return np.array([], dtype=np.float32), np.array([], dtype=np.int32)
+
+    # Enough draws per cell to pass t_end, extended in the rare case some cell is short
+    expected = (t_end - start) / interval
+    n_draw = int(min(number, np.ceil(expected + 6 * np.sqrt(expected) + 10)))
+    all_times = []
+    all_cells = []
+    for first in range(0, n_cells, CELLS_PER_BLOCK):
+        n_block = min(CELLS_PER_BLOCK, n_cells - first)
+        intervals = (1 - noise) * interval + noise * rng.exponential(interval, (n_block, n_draw))
+        intervals[:, 0] -= (1 - noise) * interval  # First event as NetStim: start + noise part
+        times = start + np.cumsum(intervals, axis=1)
+        while times.shape[1] < number and np.any(times[:, -1] < t_end):
+            n_more = min(number - times.shape[1], n_draw)
+            more = (1 - noise) * interval + noise * rng.exponential(interval, (n_block, n_more))
+            times = np.hstack([times, times[:, -1:] + np.cumsum(more, axis=1)])
+
+        times = times[:, :number]
+        cell_index, column = np.nonzero(times <= t_end)
+        all_times.append(times[cell_index, column].astype(np.float32))
+        all_cells.append((cell_index + first).astype(np.int32))
+    return np.concatenate(all_times), np.concatenate(all_cells)
+
+
+class BulkNoise:
+    """
+    External noise of a network from its stimParams, played by one PatternStim.
+
+    Parameters:
+    - net: the created Network (created without the stimParams)
+    - stimParams: dict, the NetStim stimuli (targets, stim, conn) of the netParams
+    - seed: int, seed of the event times (e.g. the stim seed of the trial)
+    - tstop: float, ms
+    - gid_offset: int, first virtual gid, default is one above the largest gid of the network
+    - pc: the ParallelContext, a new handle is made if None
+    """
+
+    def __init__(self, net, stimParams, seed, tstop, gid_offset=None, pc=None):
+        self.pc = pc if pc is not None else h.ParallelContext()
+        cells = {
+            gid: cell for pop in net.populations.values() for gid, cell in pop.cells.items()
+        }
+        next_gid = max(cells) + 1 if gid_offset is None else gid_offset
+        first_gid = next_gid
+
+        all_times = []
+        all_gids = []
+        self._inputs = {}  # stimulus name -> (conn, [(virtual gid, point process)])
+        for k, name in enumerate(sorted(stimParams)):
+            stim = stimParams[name]
+            targets = sorted(gid for gid in stim["targets"] if gid in cells)
+            rng = np.random.default_rng([int(seed), int(stim.get("seed", k))])
+            times, cell_index = netstim_event_times(len(targets), stim["stim"], tstop, rng)
+
+            conn = dict(stim["conn"])
+            self._inputs[name] = (
+                conn,
+                [
+                    (next_gid + i, _point_process(cells[gid].__dict__[conn["target"]]))
+                    for i, gid in enumerate(targets)
+                ],
+            )
+
+            all_times.append(times)
+            all_gids.append((cell_index + next_gid).astype(np.int32))
+            next_gid += len(targets)
+
+        self.gid_range = (first_gid, next_gid)  # Virtual gids, end exclusive
+        times = np.concatenate(all_times) if all_times else np.array([], dtype=np.float32)
+        gids = np.concatenate(all_gids) if all_gids else np.array([], dtype=np.int32)
+        del all_times, all_gids
+        order = np.argsort(times, kind="stable")
+        self.n_events = times.size
+        self.tvec = h.Vector(times[order])
+        self.idvec = h.Vector(gids[order])
+        del times, gids, order  # Only the vectors of the PatternStim are kept
+        self.pattern = h.PatternStim()
+        self.pattern.fake_output = 1
+        self.pattern.play(self.tvec, self.idvec)
+        self.connect()
+
+    def connect(self):
+        """
+        Connect the targets to their virtual gids, with the current weights.
+
+        Called on creation, and again after a pc.gid_clear, which removes the connections.
+        """
+        self.netcons = {}  # stimulus name -> NetCons of the targets
+        for name, (conn, targets) in self._inputs.items():
+            netcons = []
+            for virtual_gid, syn in targets:
+                nc = self.pc.gid_connect(virtual_gid, syn)
+                nc.weight[0] = conn["weight"]
+                nc.delay = conn.get("delay", 1)
+                netcons.append(nc)
+            self.netcons[name] = netcons
+
+    def set_weights(self, stimParams):
+        """Set the weights of the stimuli, e.g. for another condition on the same network."""
+        for name, netcons in self.netcons.items():
+            weight = stimParams[name]["conn"]["weight"]
+            self._inputs[name][0]["weight"] = weight  # Kept by connect
+            for nc in netcons:
+                nc.weight[0] = weight
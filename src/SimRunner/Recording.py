@@ -0,0 +1,218 @@
+####################################################################################################
+# Recording of a network without the Simulator.
+#
+# Used by the run modes that drive NEURON themselves (batching, MPI, spike-only output). The
+# recorded data is written as RecordedCell objects, which have the attributes the analysis
+# functions use on the cells of simData (_gid, spike_times, Adend3_v, Bdend_v, ...), so the
+# trial files of these run modes can be processed by the same analysis code.
+####################################################################################################
+
+import json
+import numpy as np
+from neuron import h
+
+# Voltage traces recorded per population, attribute name -> section name.
+# Adend3_v and Bdend_v are needed for calc_lfp.
+DEFAULT_TRACES = {"Pyr": {"Adend3_v": "Adend3", "Bdend_v": "Bdend"}}
+
+
+class RecordedCell:
+    """
+    Picklable stand-in for a cell in simData, holding only the recorded data.
+    """
+
+    def __init__(self, gid, spike_times, tstop, t_start=0, **traces):
+        self._gid = gid
+        self.spike_times = np.asarray(spike_times)
+        self.tstop = tstop
+        self.t_start = t_start  # Start of the recorded spikes, e.g. the end of a shared warm-up
+        for name, trace in traces.items():
+            setattr(self, name, np.asarray(trace))
+
+    def compute_firing_rate(self):
+        t_start = getattr(self, "t_start", 0)  # Older pickles have no t_start
+        return len(self.spike_times) / ((self.tstop - t_start) / 1000)
+
+
+def split_spikes(times, gids, gid_list):
+    """
+    Split contiguous (time, gid) spike vectors into the spike times per gid.
+
+    One argsort instead of a Python loop over the spikes, the spike times stay in time order.
+    """
+    times = np.asarray(times)
+    gids = np.asarray(gids).astype(int)
+    order = np.lexsort((times, gids))
+    times, gids = times[order], gids[order]
+    gid_list = np.asarray(sorted(gid_list))
+    starts = np.searchsorted(gids, gid_list, side="left")
+    ends = np.searchsorted(gids, gid_list, side="right")
+    return {
+        int(gid): times[start:end] for gid, start, end in zip(gid_list, starts, ends)
+    }
+
+
+class NetworkRecorder:
+    """
+    Record the spikes (and selected voltage traces) of a network.
+
+    Parameters:
+    - net: the created Network
+    - gid_offset: int, added to the gids in the spike vectors, to keep several networks in
+      one NEURON instance apart
+    - traces: dict, population -> {attribute: section}, voltage traces to record
+    - spike_threshold: float, mV
+    - pc: a ParallelContext to register the cells with under gid + gid_offset (e.g. run_batch),
+      the spikes are then recorded with pc.spike_record by the caller and passed to collect
+    """
+
+    def __init__(self, net, gid_offset=0, traces=None, spike_threshold=0, pc=None):
+        self.net = net
+        self.gid_offset = gid_offset
+        self.traces = DEFAULT_TRACES if traces is None else traces
+        self.spike_times = h.Vector()
+        self.spike_gids = h.Vector()
+        self._netcons = []
+        self._vectors = {}  # gid -> {attribute: Vector}
+
+        rank = int(pc.id()) if pc is not None else 0
+        for popname, pop in net.populations.items():
+            for gid, cell in pop.cells.items():
+                nc = h.NetCon(cell.soma(0.5)._ref_v, None, sec=cell.soma)
+                nc.threshold = spike_threshold
+                if pc is not None:
+                    pc.set_gid2node(gid + gid_offset, rank)
+                    pc.cell(gid + gid_offset, nc)
+                else:
+                    nc.record(self.spike_times, self.spike_gids, gid + gid_offset)
+                self._netcons.append(nc)
+
+                for name, section in self.traces.get(popname, {}).items():
+                    vec = h.Vector()
+                    vec.record(getattr(cell, section)(0.5)._ref_v)
+                    self._vectors.setdefault(gid, {})[name] = vec
+
+    @property
+    def gids(self):
+        return [gid for pop in self.net.populations.values() for gid in pop.cells]
+
+    def collect(self, tstop, spikes=None, t_start=0):
+        """
+        Return simData-like dict gid -> RecordedCell with the recorded data.
+
+        spikes: (times, gids) arrays with the offset gids, e.g. from pc.spike_record, default
+        the spikes recorded by the recorder
+        t_start: float, ms, spikes before t_start are dropped (the traces are kept whole)
+        """
+        times, gids = (
+            (self.spike_times.as_numpy(), self.spike_gids.as_numpy())
+            if spikes is None
+            else spikes
+        )
+        if t_start > 0:
+            keep = np.asarray(times) >= t_start
+            times, gids = np.asarray(times)[keep], np.asarray(gids)[keep]
+        spikes = split_spikes(times, np.asarray(gids) - self.gid_offset, self.gids)
+        return {
+            gid: RecordedCell(
+                gid,
+                spikes[gid],
+                tstop,
+                t_start,
+                **{
+                    name: vec.as_numpy().copy()
+                    for name, vec in self._vectors.get(gid, {}).items()
+                },
+            )
+            for gid in self.gids
+        }
+
+
+class SpikeRecorder:
+    """
+    Record all spikes of a network with pc.spike_record into two contiguous vectors.
+
+    The cells that are not registered with the ParallelContext yet get their gid and a spike
+    detector on the soma. No per-cell recording vectors are made, so this is the fast path
+    for trials where only the spikes are analysed.
+
+    NEURON can only release all gids at once (pc.gid_clear), which also removes the
+    gid_connect inputs of the network. clear reconnects the BulkNoise of the network
+    (net.bulk_noise), so the network can be run again.
+
+    Parameters:
+    - net: the created Network
+    - pc: the ParallelContext, a new handle is made if None
+    - spike_threshold: float, mV
+    """
+
+    def __init__(self, net, pc=None, spike_threshold=0):
+        self.net = net
+        self.pc = pc if pc is not None else h.ParallelContext()
+        self.spike_times = h.Vector()
+        self.spike_gids = h.Vector()
+        self._detectors = []
+
+        rank = int(self.pc.id())
+        for pop in net.populations.values():
+            for gid, cell in pop.cells.items():
+                if self.pc.gid_exists(gid):
+                    continue
+                self.pc.set_gid2node(gid, rank)
+                nc = h.NetCon(cell.soma(0.5)._ref_v, None, sec=cell.soma)
+                nc.threshold = spike_threshold
+                self.pc.cell(gid, nc)
+                self._detectors.append(nc)
+        self.pc.spike_record(-1, self.spike_times, self.spike_gids)
+
+    def arrays(self):
+        """The recorded spikes as (times, gids) arrays, in the order they occurred."""
+        return (
+            self.spike_times.as_numpy().copy(),
+            self.spike_gids.as_numpy().astype(np.int32),
+        )
+
+    def clear(self):
+        """Release the gids, so the next network can be recorded, and restore the noise input."""
+        self.pc.gid_clear()
+        self._detectors = []
+        bulk_noise = getattr(self.net, "bulk_noise", None)
+        if bulk_noise is not None:
+            bulk_noise.connect()
+
+
+def save_spike_trial(path, times, gids, meta):
+    """
+    Write a spike-only trial as .npz with the arrays "time" and "gid".
+
+    meta (trial_meta, population sizes, nps, ...) is stored as a JSON string, so the file can
+    be read without pickle.
+    """
+    np.savez(
+        path,
+        time=np.asarray(times, dtype=np.float64),
+        gid=np.asarray(gids, dtype=np.int32),
+        meta=np.array(json.dumps(meta, default=float)),
+    )
+
+
+def load_spike_trial(path):
+    """
+    Read a spike-only trial in the format of the trial pickles.
+
+    Returns:
+    - dict with "spikes" (times, gids), "simData" (gid -> RecordedCell with the spike times,
+      for the analysis functions that take simData) and the stored meta entries
+    """
+    with np.load(path) as f:
+        times, gids = f["time"], f["gid"]
+        meta = json.loads(str(f["meta"]))
+
+    tstop = meta.get("trial_meta", {}).get("tstop", 0)
+    n_cells = sum(meta.get("population_sizes", {}).values())
+    gid_list = range(n_cells) if n_cells else np.unique(gids)
+    spikes = split_spikes(times, gids, gid_list)
+    data = dict(meta)
+    data["spikes"] = (times, gids)
+    data["simData"] = {gid: RecordedCell(gid, spikes[gid], tstop) for gid in spikes}
+    return data
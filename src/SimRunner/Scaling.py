@@ -0,0 +1,49 @@
+####################################################################################################
+# Scaling benchmark: simulation time, memory and analysis time against the number of cells.
+#
+# Every network size runs in a fresh worker process, so the peak memory (ru_maxrss) belongs to
+# that size only and does not carry over from a larger network.
+####################################################################################################
+
+import resource
+from multiprocessing import Pool
+
+
+def peak_memory_mb():
+    """Peak resident memory of this process in MB (ru_maxrss is in kB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure(run_scale, scale):
+    result = dict(run_scale(scale))
+    result["scale"] = scale
+    result["peak_memory_mb"] = peak_memory_mb()
+    return result
+
+
+def benchmark_scaling(run_scale, scales=(0.25, 1, 4), initializer=None, initargs=()):
+    """
+    Run one trial per network scale and report the cost against the cell count.
+
+    Parameters:
+    - run_scale: callable (picklable), run_scale(scale) builds, simulates and analyses a network
+      of the given scale and returns a dict with n_cells, build_time, sim_time, analysis_time (s)
+    - scales: list of float, network scales relative to the 1x network
+    - initializer, initargs: initializer of the worker processes (e.g. the NEURON setup)
+
+    Returns:
+    - results: list of dicts, one per scale, with the peak memory (MB) of the worker added
+    """
+    results = []
+    for scale in scales:
+        with Pool(processes=1, initializer=initializer, initargs=initargs) as pool:
+            results.append(pool.apply(_measure, (run_scale, scale)))
+
+    print(" scale |  cells | build (s) |   sim (s) | analysis (s) | memory (MB) | sim per cell (ms)")
+    for result in results:
+        print(
+            f"{result['scale']:6g} | {result['n_cells']:6d} | {result['build_time']:9.1f} |"
+            f" {result['sim_time']:9.1f} | {result['analysis_time']:12.1f} |"
+            f" {result['peak_memory_mb']:11.0f} | {1e3 * result['sim_time'] / result['n_cells']:.2f}"
+        )
+    return results
@@ -0,0 +1,157 @@
+####################################################################################################
+# Sequential trial allocation with statistical stopping per condition.
+#
+# Instead of a fixed number of trials per condition, every condition starts with min_trials and
+# gets batches of extra trials while the confidence interval of its DPB probability (Wilson) or
+# of its mean DPB delay (t interval) is wider than the threshold, up to max_trials. Conditions
+# with a clear outcome (DPB in none or all trials) stop early, the budget goes to the uncertain
+# conditions near the transition.
+#
+# The result of a trial is the DPB delay in ms, or None if the trial has no depolarization block.
+# Trials without results (missing or unreadable files) are FAILED and left out of the statistics.
+####################################################################################################
+
+import numpy as np
+from scipy import stats
+
+FAILED = "failed"  # Result of a trial without results
+
+
+def wilson_interval(successes, n, confidence=0.95):
+    """Wilson score interval of a binomial proportion, (low, high)."""
+    if n == 0:
+        return 0.0, 1.0
+    z = stats.norm.ppf(0.5 + confidence / 2)
+    p = successes / n
+    denominator = 1 + z**2 / n
+    centre = (p + z**2 / (2 * n)) / denominator
+    half_width = z * np.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / denominator
+    return max(0.0, centre - half_width), min(1.0, centre + half_width)
+
+
+def mean_interval(values, confidence=0.95):
+    """t interval of the mean, (low, high), (nan, nan) for less than two values."""
+    values = np.asarray(values, dtype=float)
+    if values.size < 2:
+        return np.nan, np.nan
+    half_width = stats.t.ppf(0.5 + confidence / 2, values.size - 1) * stats.sem(values)
+    return values.mean() - half_width, values.mean() + half_width
+
+
+def summarize_trials(results, confidence=0.95):
+    """
+    DPB probability and mean delay of the trials of a condition, with confidence intervals.
+
+    Parameters:
+    - results: list, per trial the DPB delay (ms), None or FAILED
+    """
+    valid = [result for result in results if not isinstance(result, str)]
+    delays = [delay for delay in valid if delay is not None]
+    n = len(valid)
+    return {
+        "n_trials": n,
+        "n_failed": len(results) - n,
+        "n_dpb": len(delays),
+        "dpb_probability": len(delays) / n if n else np.nan,
+        "dpb_ci": wilson_interval(len(delays), n, confidence),
+        "mean_delay": float(np.mean(delays)) if delays else np.nan,
+        "delay_ci": mean_interval(delays, confidence),
+    }
+
+
+def stop_reason(
+    results,
+    min_trials=5,
+    max_trials=50,
+    max_width=0.3,
+    max_delay_width=None,
+    confidence=0.95,
+):
+    """
+    Why a condition needs no more trials, None if it does.
+
+    Returns:
+    - "max_trials", "converged" or None
+    """
+    n = len(results)
+    if n >= max_trials:
+        return "max_trials"
+    if n < min_trials:
+        return None
+
+    summary = summarize_trials(results, confidence)
+    low, high = summary["dpb_ci"]
+    if high - low > max_width:
+        return None
+    if max_delay_width is not None and summary["n_dpb"] >= 2:
+        low, high = summary["delay_ci"]
+        if high - low > max_delay_width:
+            return None
+    return "converged"
+
+
+def sequential_trials(
+    evaluate,
+    conditions,
+    min_trials=5,
+    max_trials=50,
+    batch=5,
+    max_width=0.3,
+    max_delay_width=None,
+    confidence=0.95,
+):
+    """
+    Run trials per condition until its confidence intervals are narrow enough.
+
+    Parameters:
+    - evaluate: callable, evaluate(requests) with requests a dict condition -> range of trial
+      numbers to run, returns a dict condition -> list of trial results (delay, None or FAILED)
+    - conditions: list of hashable condition keys (e.g. (gna, gk, noise))
+    - min_trials: int, trials of the first round
+    - max_trials: int, cap per condition
+    - batch: int, trials added per round to the conditions that are not decided
+    - max_width: float, maximum width of the CI of the DPB probability
+    - max_delay_width: float, ms, maximum width of the CI of the mean delay (None to ignore)
+    - confidence: float, confidence level of the intervals
+
+    Returns:
+    - summary: dict condition -> summarize_trials of the condition plus the stop reason
+    """
+    results = {condition: [] for condition in conditions}
+    reasons = {}
+    open_conditions = list(conditions)
+    while open_conditions:
+        requests = {}
+        for condition in open_conditions:
+            n = len(results[condition])
+            n_new = min_trials if n == 0 else batch
+            requests[condition] = range(n, min(n + n_new, max_trials))
+        new_results = evaluate(requests)
+
+        still_open = []
+        for condition in open_conditions:
+            results[condition].extend(new_results[condition])
+            reason = stop_reason(
+                results[condition],
+                min_trials,
+                max_trials,
+                max_width,
+                max_delay_width,
+                confidence,
+            )
+            if reason is None:
+                still_open.append(condition)
+            else:
+                reasons[condition] = reason
+        print(
+            f"{len(open_conditions) - len(still_open)} conditions decided, "
+            f"{len(still_open)} need more trials"
+        )
+        open_conditions = still_open
+
+    summary = {}
+    for condition in conditions:
+        summary[condition] = summarize_trials(results[condition], confidence)
+        summary[condition]["stop_reason"] = reasons[condition]
+        summary[condition]["results"] = results[condition]
+    return summary
@@ -0,0 +1,184 @@
+####################################################################################################
+# Cross-experiment trial cache keyed by a canonical parameter hash.
+#
+# Every experiment (Exp02 - Exp06) has its own init_network and createRun, but many trials are
+# the same simulation, e.g. the gna = gk = 1.0 baseline. parameter_hash turns the netParams of a
+# trial (cells, connections, stimuli, simulation settings and seeds) plus a description of what
+# createRun changes after the network is built (NMDA, current clamps, scaled conductances,
+# early stopping, backend) into one sha256 key. Equal keys mean the same simulation, whatever
+# experiment, folder or profile name it belongs to.
+#
+# TrialCache keeps one file per key in a shared folder. Stored trials are hard linked into the
+# cache and a trial that is found in the cache is hard linked into the data folder of the
+# experiment instead of being simulated (copied only where the file system has no hard links).
+#
+# Notes:
+#   - The bookkeeping of a trial (nps: data path, profile, trial number) is not part of the key.
+#     Pass the nps of the requesting experiment to fetch, it is written to a small sidecar next
+#     to the linked trial (01.pkl -> 01.nps.json), the trial file keeps the nps it was
+#     simulated with. Read the bookkeeping of a trial with trial_nps.
+#   - A linked trial file is shared with the cache and the other experiments: never rewrite it
+#     in place, delete it or replace it (os.replace) to write a new trial.
+#   - The modifications have to describe everything createRun does to the network that is not
+#     in the netParams, a change of the protocol that is not described gives wrong cache hits.
+####################################################################################################
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+
+import numpy as np
+
+
+def canonical(obj):
+    """
+    JSON-serializable form of a parameter structure with a stable order.
+
+    Dict keys become strings, sets are sorted, numpy values become Python values and classes
+    or functions (e.g. the Cell class of a population) are replaced by their qualified name.
+    """
+    if isinstance(obj, dict):
+        return {str(key): canonical(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [canonical(value) for value in obj]
+    if isinstance(obj, (set, frozenset)):
+        return sorted((canonical(value) for value in obj), key=repr)
+    if isinstance(obj, np.ndarray):
+        return canonical(obj.tolist())
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if obj is None or isinstance(obj, (bool, int, float, str)):
+        return obj
+    if isinstance(obj, type) or callable(obj):
+        return f"{obj.__module__}.{obj.__qualname__}"
+    if hasattr(obj, "__dict__"):
+        return {"__type__": type(obj).__name__, **canonical(vars(obj))}
+    return repr(obj)
+
+
+def scaled_factors(factors):
+    """Multiplicative factors of a trial without the factors that are 1 (no change)."""
+    return {str(name): float(f) for name, f in factors.items() if float(f) != 1.0}
+
+
+def parameter_hash(netParams, modifications=None):
+    """
+    Canonical hash of a trial.
+
+    Parameters:
+    - netParams: the NetParams of the trial (netParams.nps is ignored)
+    - modifications: dict, what createRun does after the network is built,
+      e.g. {"nmda_r": 1, "scaled": scaled_factors({...}), "early_stop": None}
+
+    Returns:
+    - str, hex sha256
+    """
+    params = {key: value for key, value in vars(netParams).items() if key != "nps"}
+    description = {"netParams": canonical(params), "modifications": canonical(modifications or {})}
+    text = json.dumps(description, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+NPS_SUFFIX = ".nps.json"
+
+
+def nps_path(trial_path):
+    """Path of the nps sidecar of a trial file, e.g. 01.pkl -> 01.nps.json."""
+    return os.path.splitext(trial_path)[0] + NPS_SUFFIX
+
+
+def trial_nps(trial_path):
+    """
+    The bookkeeping (nps) of a trial file: the sidecar of a trial served from the cache, else
+    the nps stored in the trial (netParams.nps of a .pkl, the "nps" meta entry of a .npz).
+    """
+    sidecar = nps_path(trial_path)
+    if os.path.exists(sidecar):
+        with open(sidecar) as f:
+            return json.load(f)
+    if os.path.splitext(trial_path)[1] == ".npz":
+        with np.load(trial_path) as f:
+            return json.loads(str(f["meta"])).get("nps")
+    with open(trial_path, "rb") as f:
+        return getattr(pickle.load(f)["netParams"], "nps", None)
+
+
+def _link(source, destination):
+    # Hard link, copy only where the file system has none, atomic for parallel workers
+    tmp = f"{destination}.{os.getpid()}.tmp"
+    try:
+        os.link(source, tmp)
+    except OSError:
+        shutil.copy2(source, tmp)  # Other file system or no hard links
+    os.replace(tmp, destination)
+
+
+def _write_nps(trial_path, nps):
+    path = nps_path(trial_path)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(canonical(nps), f)
+    os.replace(tmp, path)
+
+
+class TrialCache:
+    """
+    Shared folder of simulated trials, one file per parameter hash.
+
+    Parameters:
+    - cache_dir: str, the folder (e.g. on the shared data disk), created if needed
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+
+    def path(self, key, extension="pkl"):
+        # Two level layout, so no folder gets all the files
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{extension.lstrip('.')}")
+
+    def fetch(self, key, destination, nps=None):
+        """
+        Link the cached trial to destination (same extension), True if the trial was cached.
+
+        Parameters:
+        - key: str, the parameter_hash of the trial
+        - destination: str, the trial file to write (.pkl or .npz)
+        - nps: dict, the bookkeeping of the requesting trial, written to the nps sidecar
+        """
+        source = self.path(key, os.path.splitext(destination)[1])
+        if not os.path.exists(source):
+            return False
+        _link(source, destination)
+        if nps is not None:
+            _write_nps(destination, nps)
+        elif os.path.exists(nps_path(destination)):
+            os.remove(nps_path(destination))  # Bookkeeping of an older trial at this path
+        print(f"Trial {key[:12]} served from the cache: {destination}")
+        return True
+
+    def store(self, key, source):
+        """Link a trial file into the cache (the first stored file of a key is kept)."""
+        target = self.path(key, os.path.splitext(source)[1])
+        if os.path.exists(target):
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        _link(source, target)
+
+    def load(self, key):
+        """The cached pickle of a trial ({"netParams", "simData", ...}), None if not cached."""
+        path = self.path(key, "pkl")
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    def save(self, key, out):
+        """Pickle a trial into the cache, for experiments that do not write trial files."""
+        target = self.path(key, "pkl")
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(out, f)
+        os.replace(tmp, target)
@@ -0,0 +1,122 @@
+####################################################################################################
+# One-time NEURON initialization per worker process.
+#
+# The mechanisms, hoc library files and global settings are the same for every trial, so they are
+# set up once per process by init_worker (passed as initializer to multiprocessing.Pool) instead of
+# as a side effect of importing the experiment module. The tasks then only build and run the
+# network of their trial.
+#
+# init_worker loads the mechanisms, hoc files and modules once per process: a second call (or a
+# worker forked from a process that was already initialized, which inherits the NEURON state)
+# skips them. The settings are applied on every call, so e.g. the tstop of the pool is used
+# even in a forked worker.
+# Wrap the task in TimedTask to measure the startup cost per worker against the time per task.
+####################################################################################################
+
+import os
+import time
+import importlib
+from neuron import h
+
+# Initialization state of this process
+_state = {"pid": None, "startup_time": None}
+
+
+def _apply_settings(settings):
+    for name, value in (settings or {}).items():
+        setattr(h, name, value)
+
+
+def init_worker(mechanisms=None, hoc_files=(), settings=None, modules=()):
+    """
+    Initialize NEURON in this process, once, and apply the settings (on every call).
+
+    Parameters:
+    - mechanisms: str, path of the compiled mechanisms (libnrnmech.so), None to skip
+    - hoc_files: list of str, hoc files / templates to load after stdrun.hoc
+    - settings: dict, NEURON globals to set, e.g. {"celsius": 6.3, "dt": 0.1}
+    - modules: list of str, python modules to import (e.g. the cell templates)
+
+    Returns:
+    - bool, True if the initialization was done by this call
+    """
+    pid = os.getpid()
+    if _state["pid"] is not None:
+        if _state["pid"] != pid:
+            # Forked from an initialized process, the NEURON state is inherited
+            _state["pid"] = pid
+            _state["startup_time"] = 0.0
+        _apply_settings(settings)
+        return False
+
+    t0 = time.time()
+    if mechanisms is not None:
+        h.nrn_load_dll(mechanisms)
+    h.load_file("stdrun.hoc")
+    for hoc_file in hoc_files:
+        h.load_file(hoc_file)
+    _apply_settings(settings)
+    for module in modules:
+        importlib.import_module(module)
+
+    _state["pid"] = pid
+    _state["startup_time"] = time.time() - t0
+    return True
+
+
+class TimedTask:
+    """
+    Wrap a task function to also return the timing of the call.
+
+    Calling the wrapped task returns (result, record), record is a dict with the pid of the
+    worker, its startup time (from init_worker) and the time of the task. Picklable as long as
+    func is a module level function, so it can be passed to Pool.map.
+    """
+
+    def __init__(self, func):
+        self.func = func
+
+    def __call__(self, *args, **kwargs):
+        t0 = time.time()
+        result = self.func(*args, **kwargs)
+        record = {
+            "pid": os.getpid(),
+            "startup_time": _state["startup_time"],
+            "task_time": time.time() - t0,
+        }
+        return result, record
+
+
+def summarize_worker_timing(records, verbose=True):
+    """
+    Startup cost per worker versus time per task, from the records of TimedTask.
+
+    Returns:
+    - summary: dict with the number of workers and tasks, the mean startup time per worker,
+      the mean time per task and the startup time as a fraction of the total worker time
+    """
+    workers = {}
+    for record in records:
+        worker = workers.setdefault(
+            record["pid"], {"startup_time": record["startup_time"] or 0.0, "task_times": []}
+        )
+        worker["task_times"].append(record["task_time"])
+
+    startup = [worker["startup_time"] for worker in workers.values()]
+    tasks = [t for worker in workers.values() for t in worker["task_times"]]
+    total = sum(startup) + sum(tasks)
+    summary = {
+        "workers": len(workers),
+        "tasks": len(tasks),
+        "startup_per_worker": sum(startup) / len(startup) if startup else 0.0,
+        "time_per_task": sum(tasks) / len(tasks) if tasks else 0.0,
+        "startup_fraction": sum(startup) / total if total > 0 else 0.0,
+    }
+    if verbose:
+        print(
+            f"{summary['workers']} workers, {summary['tasks']} tasks :: "
+            f"startup {summary['startup_per_worker']:.2f} s per worker, "
+            f"{summary['time_per_task']:.2f} s per task "
+            f"({100 * summary['startup_fraction']:.1f}% of the worker time is startup)"
+        )
+    return summary
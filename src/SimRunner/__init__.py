@@ -0,0 +1,16 @@
+# Import all the modules from their folders
+# Each __init__.py file specififies what is actually public from the module
+from .AdaptiveSweep import *
+from .EarlyStop import *
+from .NetworkReuse import *
+from .Backends import *
+from .Recording import *
+from .Batching import *
+from .Distributed import *
+from .Worker import *
+from .Scaling import *
+from .BulkParams import *
+from .Checkpoint import *
+from .NoiseInput import *
+from .Sequential import *
+from .TrialCache import *
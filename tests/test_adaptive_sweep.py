@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+
+from src.SanjayCode.NoiseMatrix import NO_DPB, compute_dpb_probability
+from src.SimRunner.AdaptiveSweep import (
+    adaptive_sweep,
+    coarse_grid,
+    format_variant,
+    refine_points,
+    transition_map,
+)
+from src.SimRunner.Sequential import FAILED, summarize_trials
+
+
+def step_probability(point, boundary=1.0):
+    """DPB in all trials above the gna boundary, in none below it."""
+    gna, gk, noise = point
+    return 1.0 if gna > boundary else 0.0
+
+
+def test_format_variant_keeps_two_decimals_on_the_coarse_grid():
+    assert format_variant(0.5, 1.1, 0.65) == "gna_0.50_gk_1.10_noise_0.65"
+    assert format_variant(0.525, 1.1, 0.65) == "gna_0.525_gk_1.100_noise_0.650"
+
+
+def test_refine_points_splits_only_boundary_squares():
+    points = coarse_grid([0.8, 0.9, 1.0, 1.1], [0.8, 0.9], [1.0])
+    probabilities = {point: step_probability(point) for point in points}
+
+    new_points = refine_points(probabilities, 0.1)
+
+    # Only the squares between gna 1.0 and 1.1 cross the boundary
+    assert new_points == [
+        (1.0, 0.85, 1.0),
+        (1.05, 0.8, 1.0),
+        (1.05, 0.85, 1.0),
+        (1.05, 0.9, 1.0),
+        (1.1, 0.85, 1.0),
+    ]
+
+
+def test_refine_points_ignores_incomplete_and_nan_squares():
+    probabilities = {
+        (0.8, 0.8, 1.0): 0.0,
+        (0.9, 0.8, 1.0): 1.0,  # Square without its upper corners
+        (0.8, 0.9, 1.0): np.nan,
+    }
+    assert refine_points(probabilities, 0.1) == []
+
+
+def test_adaptive_sweep_evaluates_new_points_only():
+    evaluated = []
+
+    def evaluate(points):
+        evaluated.extend(points)
+        return {point: step_probability(point, boundary=1.02) for point in points}
+
+    gna_values = np.round(np.arange(0.8, 1.25, 0.1), 2)
+    probabilities, step = adaptive_sweep(
+        evaluate, gna_values, gna_values, [1.0], levels=2
+    )
+
+    assert step == pytest.approx(0.025)
+    assert len(evaluated) == len(set(evaluated))
+    assert set(probabilities) == set(evaluated)
+    assert len(evaluated) < len(np.arange(0.8, 1.21, 0.025)) ** 2
+
+
+def test_adaptive_sweep_needs_equal_steps():
+    with pytest.raises(ValueError):
+        adaptive_sweep(lambda points: {}, [0.8, 0.9], [0.8, 1.0], [1.0])
+
+
+def test_transition_map_fills_the_finest_grid_from_the_nearest_point():
+    probabilities = {
+        (1.0, 1.0, 1.0): 0.0,
+        (1.1, 1.0, 1.0): 1.0,
+        (1.0, 1.1, 1.0): 0.0,
+        (1.1, 1.1, 1.0): 1.0,
+        (1.05, 1.0, 1.0): 0.5,
+        (1.0, 1.0, 0.8): 1.0,  # Other noise level
+    }
+
+    gna_axis, gk_axis, matrix = transition_map(probabilities, 1.0, 0.05)
+
+    np.testing.assert_allclose(gna_axis, [1.0, 1.05, 1.1])
+    np.testing.assert_allclose(gk_axis, [1.0, 1.05, 1.1])
+    np.testing.assert_allclose(matrix[0], [0.0, 0.5, 1.0])
+    np.testing.assert_allclose(matrix[:, 0], [0.0, 0.0, 0.0])
+    np.testing.assert_allclose(matrix[:, 2], [1.0, 1.0, 1.0])
+
+
+def test_transition_map_without_points_raises():
+    with pytest.raises(ValueError):
+        transition_map({(1.0, 1.0, 1.0): 0.0}, 0.5, 0.05)
+
+
+def test_dpb_probability_leaves_out_trials_without_results(capsys):
+    block = ([1200.0], [1500.0], 0.1, 300.0)
+    trials = {"00": block, "01": NO_DPB, "02": None, "03": block}
+
+    assert compute_dpb_probability(trials) == pytest.approx(2 / 3)
+    assert "Skipped 1 of 4" in capsys.readouterr().out
+
+
+def test_dpb_probability_counts_left_out_trials_as_without_block():
+    block = ([1200.0], [1500.0], 0.1, 300.0)
+    assert compute_dpb_probability({"00": block}, total_trials=4) == pytest.approx(0.25)
+    assert np.isnan(compute_dpb_probability({"00": None}))
+
+
+def test_summarize_trials_leaves_out_failed_trials():
+    summary = summarize_trials([1200.0, None, FAILED, 1400.0])
+    assert summary["n_trials"] == 3
+    assert summary["n_failed"] == 1
+    assert summary["dpb_probability"] == pytest.approx(2 / 3)
+    assert summary["mean_delay"] == pytest.approx(1300.0)
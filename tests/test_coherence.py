@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from src.SanjayCode.Coherence import condition_coherence
+from src.SanjayCode.SanjayVariants import stackable_trials
+
+SIZES = {"Pyr": 4, "Bwb": 2, "OLM": 2}
+
+
+class Cell:
+    def __init__(self, gid, spike_times):
+        self._gid = gid
+        self.spike_times = spike_times
+
+
+def _trial(t_end, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(t_end / 0.1)) * 0.1
+    simData = {gid: Cell(gid, np.sort(rng.uniform(0, t_end, 40))) for gid in range(8)}
+    return {
+        "simData": simData,
+        "lfp": np.sin(2 * np.pi * 8 * t / 1000) + 0.1 * rng.normal(size=t.size),
+        "population_sizes": SIZES,
+        "trial_meta": {"tstop": 5000.0, "t_end": t_end, "truncated": t_end < 5000},
+    }
+
+
+def test_stackable_trials_leaves_out_short_trials():
+    assert stackable_trials([4800, 4800, 1000]) == [0, 1]
+    assert stackable_trials([4800, 1000], min_length=500) == [0, 1]
+    with pytest.raises(ValueError, match="no trials"):
+        stackable_trials([])
+    with pytest.raises(ValueError, match="shorter than 5000"):
+        stackable_trials([4800], min_length=5000)
+
+
+def test_a_truncated_trial_does_not_shorten_the_condition():
+    trials = [_trial(5000, 0), _trial(5000, 1), _trial(600, 2)]
+    result = condition_coherence(trials)
+    assert result["trials"] == [0, 1]
+    assert result["csd"].shape[0] == 2
+    assert result["frequencies"].size == 1024 // 2 + 1  # nperseg is not cut to 400 samples
+
+    result = condition_coherence(trials, min_duration=500)
+    assert result["trials"] == [0, 1, 2]
+    assert result["frequencies"].size == 400 // 2 + 1
+
+
+def test_empty_condition_raises():
+    with pytest.raises(ValueError, match="at least one trial"):
+        condition_coherence([])
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from src.SanjayCode.FilterBank import FilterBank, band_sos
+
+
+def test_band_above_nyquist_raises():
+    with pytest.raises(ValueError, match="sampling rate above 500"):
+        band_sos(150.0, 250.0, 400.0)
+    assert band_sos(150.0, 250.0, 1000.0) is band_sos(150.0, 250.0, 1000.0)
+
+
+def test_sine_is_passed_in_its_band_only():
+    t = np.arange(4000) / 1000
+    sine = np.sin(2 * np.pi * 8 * t)
+    bank = FilterBank(1000, {"theta": (4, 12), "gamma": (30, 80)})
+    filtered = bank.filter(np.array([sine, 2 * sine]))
+    middle = slice(1000, 3000)  # Away from the edges
+    assert filtered["theta"].shape == (2, 4000)
+    assert np.allclose(filtered["theta"][:, middle], [sine[middle], 2 * sine[middle]], atol=0.02)
+    assert np.abs(filtered["gamma"][:, middle]).max() < 0.01
+
+    envelope = bank.envelope(sine[np.newaxis], ["theta"])["theta"]
+    assert np.allclose(envelope[0, middle], 1, atol=0.02)
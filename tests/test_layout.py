@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+
+from src.SanjayCode.Layout import DEFAULT_LAYOUT, PopulationLayout
+
+
+def test_default_gid_ranges():
+    assert DEFAULT_LAYOUT.n_cells == 1200
+    assert (DEFAULT_LAYOUT.start("Bwb"), DEFAULT_LAYOUT.end("Bwb")) == (800, 999)
+    assert DEFAULT_LAYOUT.end("OLM") == 1199
+    assert [DEFAULT_LAYOUT.population_of(gid) for gid in (0, 799, 800, 1000, 1200)] == [
+        "Pyr",
+        "Pyr",
+        "Bwb",
+        "OLM",
+        None,
+    ]
+
+
+def test_scaled_layout_keeps_every_population():
+    layout = PopulationLayout.scaled(0.001)
+    assert layout.sizes == {"Pyr": 1, "Bwb": 1, "OLM": 1}
+    assert PopulationLayout.scaled(0.25).sizes == {"Pyr": 200, "Bwb": 50, "OLM": 50}
+    assert PopulationLayout.scaled(0.25).start("OLM") == 250
+
+
+def test_layout_from_trials():
+    netParams = SimpleNamespace(cellParams={"Pyr": {"nCells": 4}, "Bwb": {"nCells": 2}})
+    assert PopulationLayout.from_data({"netParams": netParams}).sizes == {"Pyr": 4, "Bwb": 2}
+    assert PopulationLayout.from_data({"population_sizes": {"Pyr": 3}}).n_cells == 3
+    assert PopulationLayout.from_data({"simData": {}}).n_cells == 1200
+
+
+def test_split_by_gid_and_scale_count():
+    layout = PopulationLayout({"Pyr": 2, "Bwb": 1})
+    cells = {gid: SimpleNamespace(_gid=gid) for gid in range(4)}
+    split = layout.split(cells)
+    assert [cell._gid for cell in split["Pyr"]] == [0, 1]
+    assert [cell._gid for cell in split["Bwb"]] == [2]
+    assert layout.scale_count(10, "Pyr") == 2
+    assert layout.scale_count(1, "Pyr") == 1
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from src.SanjayCode.Multitaper import dpss_tapers, multitaper_psd
+
+
+@pytest.mark.parametrize("n_samples", [2000, 2001])
+def test_psd_integrates_to_the_variance(n_samples):
+    lfps = np.random.default_rng(0).normal(0, 2, (3, n_samples))
+    frequencies, psd = multitaper_psd(lfps, 1000)
+    df = frequencies[1] - frequencies[0]
+    assert psd.shape == (3, n_samples // 2 + 1)
+    assert psd.sum(axis=-1) * df == pytest.approx(lfps.var(axis=-1), rel=0.05)
+
+
+def test_sine_peak_and_single_lfp():
+    t = np.arange(5000) / 1000
+    frequencies, psd = multitaper_psd(np.sin(2 * np.pi * 40 * t), 1000, fmax=100)
+    assert psd.ndim == 1 and frequencies[-1] == 100
+    assert frequencies[np.argmax(psd)] == pytest.approx(40)
+
+
+def test_tapers_are_cached_and_read_only():
+    tapers = dpss_tapers(512, 4)
+    assert tapers.shape == (7, 512)
+    assert dpss_tapers(512, 4) is tapers
+    assert np.allclose((tapers**2).sum(axis=-1), 1)
+    with pytest.raises(ValueError):
+        tapers[0, 0] = 1
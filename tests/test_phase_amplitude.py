@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from src.SanjayCode.PhaseAmplitude import (
+    condition_pac,
+    modulation_index,
+    phase_amplitude_coupling,
+)
+
+
+def test_modulation_index_of_flat_and_single_bin_amplitude():
+    phase = np.linspace(-np.pi, np.pi, 1800, endpoint=False)[np.newaxis, np.newaxis]
+    flat = np.ones((1, 1, 1800))
+    peaked = np.where(np.abs(phase) < np.pi / 18, 1.0, 0.0)
+    mi, P = modulation_index(phase, np.concatenate([flat, peaked], axis=1), n_bins=18)
+    assert mi.shape == (1, 1, 2) and P.shape == (1, 1, 2, 18)
+    assert mi[0, 0, 0] == pytest.approx(0, abs=1e-12)
+    assert np.allclose(P[0, 0, 0], 1 / 18)
+    assert mi[0, 0, 1] > 0.5
+
+
+def test_coupled_signal_has_a_higher_mi():
+    rng = np.random.default_rng(0)
+    t = np.arange(40000) / 10000  # 4 s at 10 kHz
+    theta = np.sin(2 * np.pi * 8 * t)
+    gamma = np.sin(2 * np.pi * 60 * t)
+    coupled = theta + 0.5 * (1 + theta) * gamma + 0.1 * rng.normal(size=t.size)
+    uncoupled = theta + 0.5 * gamma + 0.1 * rng.normal(size=t.size)
+
+    result = phase_amplitude_coupling(
+        [coupled, uncoupled], phase_bands=[(7, 9)], amplitude_bands=[(50, 70)]
+    )
+    mi = result["mi"][:, 0, 0]
+    assert result["phase_frequencies"].tolist() == [8]
+    assert mi[0] > 10 * mi[1]
+
+
+def test_short_lfps_raise_instead_of_nan():
+    lfp = np.random.default_rng(0).normal(size=11000)  # 1.1 s at 10 kHz
+    with pytest.raises(ValueError, match="too short"):
+        phase_amplitude_coupling([lfp])
+
+
+def test_condition_pac_leaves_out_short_trials():
+    rng = np.random.default_rng(1)
+    trials = [{"lfp": rng.normal(size=n)} for n in (30000, 30000, 11000)]
+    result = condition_pac(trials, phase_bands=[(7, 9)], amplitude_bands=[(50, 70)])
+    assert result["trials"] == [0, 1]
+    assert np.isfinite(result["mi"]).all() and result["mi"].shape == (2, 1, 1)
+
+    with pytest.raises(ValueError, match="too short"):
+        condition_pac(trials, min_duration=1000)
+    with pytest.raises(ValueError, match="at least one trial"):
+        condition_pac([])
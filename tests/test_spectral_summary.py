@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from src.SanjayCode.SpectralSummary import band_table, power_ratio, spectral_table, stack_psds
+
+FREQUENCIES = np.linspace(0, 200, 129)  # pylab.psd of the Welch default at 400 Hz
+BANDS = {"theta": (3, 12), "gamma": (30, 80)}
+
+
+def _trial(psd, frequencies=FREQUENCIES):
+    return {"Pxx": np.asarray(psd, dtype=float), "psd_frequencies": frequencies}
+
+
+def test_band_table_power_and_peak():
+    psd = np.ones(FREQUENCIES.size)
+    psd[np.argmin(np.abs(FREQUENCIES - 7.8))] = 5
+    power, peak = band_table(psd[np.newaxis], FREQUENCIES, BANDS)
+    theta = (FREQUENCIES >= 3) & (FREQUENCIES <= 12)
+    assert power[0, 0] == pytest.approx((theta.sum() + 4) / theta.sum() * 9)
+    assert power[0, 1] == pytest.approx(50)
+    assert peak[0, 0] == FREQUENCIES[np.argmin(np.abs(FREQUENCIES - 7.8))]
+
+    summed, _ = band_table(psd[np.newaxis], FREQUENCIES, BANDS, reduce="sum")
+    assert summed[0, 0] == pytest.approx(theta.sum() + 4)
+
+
+def test_missing_trials_are_nan():
+    dataset = {
+        "a": {"1": _trial(np.ones(129)), "2": _trial(np.ones(129))},
+        "b": {"1": _trial(np.ones(129))},
+    }
+    table = spectral_table(dataset, BANDS)
+    assert table["power"].shape == (2, 2, 2)
+    assert np.isnan(table["power"][1, 1]).all() and np.isnan(table["peak_frequency"][1, 1]).all()
+    assert power_ratio(table)[0, 0] == pytest.approx(9 / 50)
+
+
+def test_stack_psds_refuses_other_frequencies():
+    short = np.linspace(0, 200, 100)
+    dataset = {"a": {"1": _trial(np.ones(129)), "2": _trial(np.ones(100), short)}}
+    with pytest.raises(ValueError, match="common grid"):
+        stack_psds(dataset)
+    with pytest.raises(ValueError, match="100 PSD values and 129 frequencies"):
+        stack_psds({"a": {"1": _trial(np.ones(100))}})
+
+
+def test_stack_psds_requires_frequencies():
+    with pytest.raises(ValueError, match="no psd_frequencies"):
+        stack_psds({"a": {"1": {"Pxx": np.ones(129)}}})
+
+
+def test_stack_psds_interpolates_onto_a_common_grid():
+    short = np.linspace(0, 100, 51)
+    dataset = {"a": {"1": _trial(FREQUENCIES), "2": _trial(short, short)}}
+    _, frequencies, psds = stack_psds(dataset, frequencies=FREQUENCIES)
+    assert np.allclose(psds[0, 0], FREQUENCIES)
+    inside = FREQUENCIES <= 100
+    assert np.allclose(psds[0, 1, inside], FREQUENCIES[inside])
+    assert np.isnan(psds[0, 1, ~inside]).all()
@@ -0,0 +1,93 @@
+import json
+import os
+import pickle
+
+import numpy as np
+
+from src.SimRunner.TrialCache import (
+    TrialCache,
+    canonical,
+    nps_path,
+    parameter_hash,
+    scaled_factors,
+    trial_nps,
+)
+
+
+class NetParams:
+    def __init__(self, seeds, connParams, nps=None):
+        self.seeds = seeds
+        self.connParams = connParams
+        self.nps = nps
+
+
+def _netParams(nps=None, weight=1e-3):
+    return NetParams(
+        {"cell": 1, "conn": 2, "stim": 3},
+        {"Pyr->Bwb AMPA": {"weight": weight, "synapse": "somaAMPA"}},
+        nps,
+    )
+
+
+def test_hash_ignores_dict_order_and_nps():
+    a = _netParams({"data_path": "a", "trial": 1})
+    b = _netParams({"data_path": "b", "trial": 7})
+    b.seeds = {"stim": 3, "conn": 2, "cell": 1}
+    assert parameter_hash(a, {"x": 1, "y": 2}) == parameter_hash(b, {"y": 2, "x": 1})
+
+
+def test_hash_depends_on_parameters_and_modifications():
+    base = parameter_hash(_netParams(), {"scaled": {}})
+    assert parameter_hash(_netParams(weight=2e-3), {"scaled": {}}) != base
+    assert parameter_hash(_netParams(), {"scaled": {"Pyr.nacurrent.g": 0.5}}) != base
+
+
+def test_canonical_of_numpy_sets_and_classes():
+    assert canonical({1: np.float64(0.5), "s": {3, 1}, "a": np.arange(2)}) == {
+        "1": 0.5,
+        "s": [1, 3],
+        "a": [0, 1],
+    }
+    assert canonical(NetParams) == f"{__name__}.NetParams"
+
+
+def test_scaled_factors_drops_unchanged():
+    assert scaled_factors({"gna": 1, "gk": np.float64(0.5)}) == {"gk": 0.5}
+    assert scaled_factors({"gna": 1.0}) == {}
+
+
+def test_store_and_fetch_link_with_an_nps_sidecar(tmp_path):
+    cache = TrialCache(str(tmp_path / "cache"))
+    key = parameter_hash(_netParams())
+    source = tmp_path / "first.pkl"
+    with open(source, "wb") as f:
+        pickle.dump({"netParams": _netParams({"trial": 1}), "simData": {}}, f)
+    cache.store(key, str(source))
+    assert os.path.samefile(source, cache.path(key))
+
+    destination = tmp_path / "second.pkl"
+    assert cache.fetch(key, str(destination), {"trial": 2})
+    assert os.path.samefile(destination, source)
+    assert trial_nps(str(destination)) == {"trial": 2}
+    assert trial_nps(str(source)) == {"trial": 1}
+    assert not cache.fetch("0" * 64, str(tmp_path / "missing.pkl"), {"trial": 3})
+
+
+def test_fetch_of_npz_keeps_the_stored_meta(tmp_path):
+    cache = TrialCache(str(tmp_path / "cache"))
+    source = tmp_path / "first.npz"
+    meta = {"nps": {"trial": 1}, "population_sizes": {"Pyr": 2}}
+    np.savez(source, time=np.array([1.0]), gid=np.array([0]), meta=np.array(json.dumps(meta)))
+    cache.store("ab" * 32, str(source))
+
+    destination = tmp_path / "second.npz"
+    assert cache.fetch("ab" * 32, str(destination), {"trial": 2})
+    assert trial_nps(str(destination)) == {"trial": 2}
+    with np.load(destination) as f:
+        assert json.loads(str(f["meta"])) == meta
+        assert f["time"].tolist() == [1.0]
+
+    # Served again without bookkeeping, the sidecar of the earlier trial is removed
+    assert cache.fetch("ab" * 32, str(destination))
+    assert not os.path.exists(nps_path(str(destination)))
+    assert trial_nps(str(destination)) == {"trial": 1}
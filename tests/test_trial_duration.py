@@ -0,0 +1,17 @@
+from src.SanjayCode.SanjayVariants import get_trial_duration
+
+
+def _meta(reason, t_end=800.0, truncated=True):
+    meta = {"tstop": 5000.0, "t_end": t_end, "truncated": truncated, "reason": reason}
+    return {"trial_meta": meta}
+
+
+def test_silent_early_stops_count_until_tstop():
+    assert get_trial_duration(_meta("dpb")) == 5000
+    assert get_trial_duration(_meta("quiescent")) == 5000
+
+
+def test_other_early_stops_end_at_the_stop():
+    assert get_trial_duration(_meta("burst")) == 800
+    assert get_trial_duration(_meta(None, 5000.0, truncated=False)) == 5000
+    assert get_trial_duration({"simData": {}}) == 5000
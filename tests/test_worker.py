@@ -0,0 +1,23 @@
+from multiprocessing import get_context
+
+from neuron import h
+
+from src.SimRunner.Worker import init_worker
+
+
+def _tstop(_):
+    return h.tstop
+
+
+def test_settings_are_applied_on_every_call():
+    init_worker(settings={"tstop": 5000})
+    assert init_worker(settings={"tstop": 1000}) is False
+    assert h.tstop == 1000
+
+
+def test_forked_worker_applies_its_settings():
+    init_worker(settings={"tstop": 5000})
+    with get_context("fork").Pool(
+        1, initializer=init_worker, initargs=(None, (), {"tstop": 1000})
+    ) as pool:
+        assert pool.map(_tstop, [0]) == [1000]